@@ -0,0 +1,229 @@
+# analytics.py
+"""时间序列聚合
+
+把资产记录按日/月/季度/年重采样：每个周期取周期结束前最后一条记录的金额
+（没有新记录的周期沿用上一次的金额），得到各账本及总资产在规则日历网格上的余额。
+全部计算用 NumPy 向量化完成（searchsorted 做 as-of 查找），不逐条循环记录。
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# 频率 -> 显示名称
+FREQUENCIES = {
+    "day": "按日",
+    "month": "按月",
+    "quarter": "按季度",
+    "year": "按年",
+}
+
+# 频率 -> (datetime64 单位, 步长)
+_UNITS = {
+    "day": ("D", 1),
+    "month": ("M", 1),
+    "quarter": ("M", 3),
+    "year": ("Y", 1),
+}
+
+
+@dataclass
+class ResampledBalances:
+    """按日历周期重采样的余额"""
+    freq: str
+    periods: np.ndarray     # datetime64[s]，各周期的起始时间
+    ledger_ids: np.ndarray  # int64，values 每行对应的账本
+    values: np.ndarray      # float64 (账本数, 周期数)，周期结束时的金额；账本还没有记录时为 NaN
+    totals: np.ndarray      # float64 (周期数,)，各周期的总资产
+
+    def __len__(self) -> int:
+        return len(self.periods)
+
+    def labels(self) -> List[str]:
+        """周期的显示文本，如 2024-01-05、2024-01、2024Q1、2024"""
+        if self.freq == "quarter":
+            months = self.periods.astype("datetime64[M]").astype(np.int64)
+            return [f"{1970 + m // 12}Q{m % 12 // 3 + 1}" for m in months.tolist()]
+        unit = _UNITS[self.freq][0]
+        return np.datetime_as_string(self.periods, unit=unit).tolist()
+
+    def for_ledger(self, ledger_id: int) -> np.ndarray:
+        """单个账本各周期的金额，账本不存在时抛出 KeyError"""
+        rows = np.flatnonzero(self.ledger_ids == ledger_id)
+        if not len(rows):
+            raise KeyError(ledger_id)
+        return self.values[rows[0]]
+
+
+@dataclass
+class LedgerSeries:
+    """单个账本的全部记录（按时间升序）"""
+    ledger_id: int
+    times: np.ndarray    # datetime64[s]
+    amounts: np.ndarray  # float64
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+
+@dataclass
+class NetWorthCurve:
+    """总资产随时间的变化：每个记录时间点上各账本最新金额之和"""
+    times: np.ndarray   # datetime64[s]，升序，不重复
+    totals: np.ndarray  # float64，该时间点所有记录写入后的总资产
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+
+def _floor(epochs: np.ndarray, freq: str) -> np.ndarray:
+    """时间戳（秒）所在周期的起始，返回对应单位的 datetime64"""
+    unit, step = _UNITS[freq]
+    periods = epochs.astype("datetime64[s]").astype(f"datetime64[{unit}]")
+    if step > 1:
+        counts = periods.astype(np.int64)
+        periods = (counts - counts % step).astype(f"datetime64[{unit}]")
+    return periods
+
+
+def period_starts(first: int, last: int, freq: str) -> np.ndarray:
+    """覆盖时间戳 first 到 last 的所有周期的起始时间（datetime64[s]）"""
+    if freq not in _UNITS:
+        raise ValueError(f"不支持的频率: {freq}")
+    step = _UNITS[freq][1]
+    first_period, last_period = _floor(np.array([first, last], dtype=np.int64), freq)
+    return np.arange(first_period, last_period + step, step).astype("datetime64[s]")
+
+
+def resample(ledger_ids: np.ndarray, amounts: np.ndarray, created_at: np.ndarray, freq: str = "month",
+             start: Optional[int] = None, end: Optional[int] = None) -> ResampledBalances:
+    """重采样各账本余额
+
+    输入为按 (created_at, id) 升序排列的记录列（created_at 为秒级时间戳，
+    同一时间的多条记录以后写入的为准）。start/end 为时间戳，结果覆盖二者所在的周期，
+    默认取第一条和最后一条记录所在的周期。start 之前的记录仍参与计算，
+    作为第一个周期的起始余额。
+    """
+    if freq not in _UNITS:
+        raise ValueError(f"不支持的频率: {freq}")
+    ledger_ids = np.asarray(ledger_ids, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    created_at = np.asarray(created_at, dtype=np.int64)
+
+    if not len(created_at) and (start is None or end is None):
+        empty = np.empty(0, dtype=np.float64)
+        return _freeze(ResampledBalances(freq, np.empty(0, dtype="datetime64[s]"), np.empty(0, dtype=np.int64),
+                                         np.empty((0, 0), dtype=np.float64), empty))
+
+    first = int(created_at[0]) if start is None else start
+    last = int(created_at[-1]) if end is None else end
+    periods = period_starts(first, max(first, last), freq)
+    step = _UNITS[freq][1]
+    unit = _UNITS[freq][0]
+    # 每个周期的结束边界（下一周期的起始），取边界之前的最后一条记录
+    bounds = (periods.astype(f"datetime64[{unit}]") + step).astype("datetime64[s]").astype(np.int64)
+
+    # 账本编号化后按 (账本, 时间) 排序：稳定排序保持同一账本内原有的时间顺序
+    ledgers, index = np.unique(ledger_ids, return_inverse=True)
+    order = np.argsort(index, kind="stable")
+    index = index[order]
+    sorted_amounts = amounts[order]
+
+    # 把 (账本, 时间) 合成单个递增的整数键，一次 searchsorted 完成所有账本、所有周期的 as-of 查找
+    origin = min(int(created_at.min()) if len(created_at) else bounds[0], int(bounds[0]))
+    span = max(int(created_at.max()) if len(created_at) else bounds[-1], int(bounds[-1])) - origin + 1
+    keys = index * span + (created_at[order] - origin)
+    rows = np.arange(len(ledgers), dtype=np.int64)
+    queries = rows[:, None] * span + (bounds - origin)[None, :]
+    positions = np.searchsorted(keys, queries.ravel(), side="left").reshape(queries.shape) - 1
+
+    # 位置落在本账本第一条记录之前说明该周期结束时账本还没有记录
+    first_positions = np.searchsorted(index, rows, side="left")
+    valid = positions >= first_positions[:, None]
+    values = np.where(valid, sorted_amounts[np.clip(positions, 0, None)], np.nan)
+    totals = np.where(valid, values, 0.0).sum(axis=0)
+    return _freeze(ResampledBalances(freq, periods, ledgers, values, totals))
+
+
+def net_worth(ledger_ids: np.ndarray, amounts: np.ndarray, created_at: np.ndarray) -> NetWorthCurve:
+    """计算每个记录时间点的总资产
+
+    输入要求同 resample。每条记录使总资产变化 (本条金额 - 该账本上一条金额)，
+    对变化量做一次累加即得到每条记录写入后的总资产，不需要在每个时间点重新汇总所有账本。
+    同一时间点有多条记录时取最后一条写入后的值。
+    """
+    ledger_ids = np.asarray(ledger_ids, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    created_at = np.asarray(created_at, dtype=np.int64)
+    if not len(created_at):
+        return _freeze(NetWorthCurve(np.empty(0, dtype="datetime64[s]"), np.empty(0, dtype=np.float64)))
+
+    # 按账本分组（组内保持时间顺序），组内错位一位得到同账本的上一条金额
+    order = np.argsort(ledger_ids, kind="stable")
+    grouped = amounts[order]
+    previous = np.empty_like(grouped)
+    previous[0] = 0.0
+    previous[1:] = grouped[:-1]
+    group_ids = ledger_ids[order]
+    previous[1:][group_ids[1:] != group_ids[:-1]] = 0.0  # 账本的第一条记录
+
+    deltas = np.empty_like(amounts)
+    deltas[order] = grouped - previous
+    totals = np.cumsum(deltas)
+
+    # 每个时间点只保留最后一条记录之后的总资产
+    last = np.empty(len(created_at), dtype=bool)
+    last[:-1] = created_at[1:] != created_at[:-1]
+    last[-1] = True
+    return _freeze(NetWorthCurve(created_at[last].astype("datetime64[s]"), totals[last]))
+
+
+def split_by_ledger(ledger_ids: np.ndarray, amounts: np.ndarray, created_at: np.ndarray) -> List[LedgerSeries]:
+    """按账本拆分记录列，输入要求同 resample，结果按账本 id 排序"""
+    ledger_ids = np.asarray(ledger_ids, dtype=np.int64)
+    order = np.argsort(ledger_ids, kind="stable")
+    grouped_ids = ledger_ids[order]
+    starts = np.flatnonzero(np.r_[True, grouped_ids[1:] != grouped_ids[:-1]]) if len(order) else []
+    times = np.asarray(created_at, dtype=np.int64)[order].astype("datetime64[s]")
+    amounts = np.asarray(amounts, dtype=np.float64)[order]
+    bounds = list(starts[1:]) + [len(order)]
+    return [_freeze(LedgerSeries(int(grouped_ids[start]), times[start:stop], amounts[start:stop]))
+            for start, stop in zip(starts, bounds)]
+
+
+def decimate(x: np.ndarray, y: np.ndarray, start: float, end: float, buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    """折线抽稀：只保留绘制到 buckets 个像素列时看得出差别的点
+
+    x 为升序数组，只处理 [start, end] 范围内的点（两侧各多留一个点，保证折线延伸到边界外）。
+    每个像素列保留第一个、最后一个、最小值和最大值四个点（M4 算法），
+    这样画出的折线与画全部点在像素上一致，点数最多为 4 * buckets。
+    """
+    lo = max(int(np.searchsorted(x, start, side="left")) - 1, 0)
+    hi = min(int(np.searchsorted(x, end, side="right")) + 1, len(x))
+    x, y = x[lo:hi], y[lo:hi]
+    if len(x) <= 4 * buckets or end <= start:
+        return x, y
+
+    columns = np.clip(((x - start) / (end - start) * buckets).astype(np.int64), -1, buckets)
+    firsts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    lasts = np.r_[firsts[1:] - 1, len(x) - 1]
+    counts = lasts - firsts + 1
+    # 每列的最小/最大值，再找出它们在列内第一次出现的位置
+    column_index = np.repeat(np.arange(len(firsts)), counts)
+    keep = np.zeros(len(x), dtype=bool)
+    keep[firsts] = True
+    keep[lasts] = True
+    for reduce in (np.minimum, np.maximum):
+        extremes = np.repeat(reduce.reduceat(y, firsts), counts)
+        hits = np.flatnonzero(y == extremes)
+        _, first_hits = np.unique(column_index[hits], return_index=True)
+        keep[hits[first_hits]] = True
+    return x[keep], y[keep]
+
+
+def _freeze(result):
+    """结果会被查询缓存共享，数组设为只读，避免调用方误改"""
+    for array in vars(result).values():
+        if isinstance(array, np.ndarray):
+            array.flags.writeable = False
+    return result
@@ -0,0 +1,430 @@
+# backup.py
+"""在线备份、快照轮换、恢复与对比
+
+备份使用 SQLite 在线备份接口（sqlite3.Connection.backup）分步复制数据页：
+源连接先开启读事务固定一个 WAL 快照再开始复制，得到的是开始时刻的一致快照，
+复制期间其他连接照常写入（WAL 模式下读不阻塞写），也不会因为有新的提交而从头重来。
+代价是备份期间 WAL 文件无法检查点回卷，会随写入增长，备份结束后恢复正常。
+
+快照保存为 <备份目录>/<数据库名>-YYYYmmdd-HHMMSS.db（压缩时为 .db.gz），
+默认保存在数据库所在目录的 backups 子目录中，只保留最新的若干份。
+
+命令行用法:
+    python backup.py create [--db accounting.db] [--dir backups] [--keep 10] [--compress]
+    python backup.py list [--db accounting.db]
+    python backup.py diff SNAPSHOT [--db accounting.db]
+    python backup.py restore SNAPSHOT [--db accounting.db]
+"""
+import argparse
+import contextlib
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import migrations
+from database import Database
+
+# 每步复制的页数（默认页大小 4KB 时约 4MB）；每步之间检查取消并报告进度
+PAGES_PER_STEP = 1024
+DEFAULT_KEEP = 10
+BACKUP_DIR = "backups"
+COMPRESS_LEVEL = 6
+BUFFER_SIZE = 1 << 20
+
+_TIME_FORMAT = "%Y%m%d-%H%M%S"
+_SUFFIXES = (".db", ".db.gz")
+
+
+class BackupError(Exception):
+    """快照无效或无法恢复"""
+
+
+@dataclass
+class Snapshot:
+    """一份快照文件"""
+    path: str
+    created: datetime
+    size: int
+    compressed: bool
+
+
+@dataclass
+class BackupResult:
+    """备份结果"""
+    path: str
+    pages: int
+    size: int
+    elapsed: float
+    removed: List[str] = field(default_factory=list)  # 轮换时删除的旧快照
+
+
+@dataclass
+class SnapshotDiff:
+    """快照与当前数据库的差异（以快照为旧、当前数据库为新）"""
+    ledgers_added: List[str] = field(default_factory=list)
+    ledgers_removed: List[str] = field(default_factory=list)
+    ledgers_renamed: List[Tuple[str, str]] = field(default_factory=list)  # (快照中的名称, 当前名称)
+    records_added: int = 0
+    records_removed: int = 0
+    records_changed: int = 0
+    # 当前金额有变化的账本: (名称, 快照中的金额, 当前金额)，账本不存在或没有记录时金额为 None
+    balances: List[Tuple[str, Optional[float], Optional[float]]] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (self.ledgers_added or self.ledgers_removed or self.ledgers_renamed
+                    or self.records_added or self.records_removed or self.records_changed)
+
+
+def default_directory(db_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), BACKUP_DIR)
+
+
+def _stem(db_path: str) -> str:
+    return os.path.splitext(os.path.basename(db_path))[0]
+
+
+def list_snapshots(db_path: str, directory: Optional[str] = None) -> List[Snapshot]:
+    """列出数据库的快照，最新的在前"""
+    directory = directory or default_directory(db_path)
+    if not os.path.isdir(directory):
+        return []
+    pattern = re.compile(re.escape(_stem(db_path)) + r"-(\d{8}-\d{6})(?:-(\d+))?(\.db(?:\.gz)?)$")
+    found = []
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if not match:
+            continue
+        path = os.path.join(directory, name)
+        snapshot = Snapshot(path=path, created=datetime.strptime(match.group(1), _TIME_FORMAT),
+                            size=os.path.getsize(path), compressed=match.group(3).endswith(".gz"))
+        found.append((snapshot.created, int(match.group(2) or 1), snapshot))
+    found.sort(key=lambda item: item[:2], reverse=True)
+    return [snapshot for _, _, snapshot in found]
+
+
+def prune(db_path: str, directory: Optional[str] = None, keep: int = DEFAULT_KEEP) -> List[str]:
+    """只保留最新的 keep 份快照，返回删除的文件"""
+    removed = []
+    for snapshot in list_snapshots(db_path, directory)[keep:]:
+        os.remove(snapshot.path)
+        removed.append(snapshot.path)
+    return removed
+
+
+def copy_database(source: sqlite3.Connection, target_path: str, pages: int = PAGES_PER_STEP,
+                  progress: Optional[Callable[[int, int], None]] = None, token=None) -> int:
+    """把 source 的一致快照分步复制到新文件 target_path，返回复制的页数
+
+    progress(已复制页数, 总页数) 在每步之后调用；token 为 workers.CancelToken，取消时中止并删除目标文件。
+    """
+    def step(status, remaining, total):
+        if token is not None:
+            token.check()
+        if progress is not None:
+            progress(total - remaining, total)
+
+    # 先开启读事务：各步都从同一个 WAL 快照读取，其他连接提交不会导致备份重来
+    source.execute("BEGIN")
+    source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=pages, progress=step)
+        total = target.execute("PRAGMA page_count").fetchone()[0]
+        # 快照是独立的单个文件，不使用 WAL
+        target.execute("PRAGMA journal_mode = DELETE")
+    except BaseException:
+        target.close()
+        with contextlib.suppress(OSError):
+            os.remove(target_path)
+        raise
+    finally:
+        source.rollback()
+    target.close()
+    return total
+
+
+def _compress(path: str, target: str, token=None):
+    with open(path, "rb") as src, gzip.open(target, "wb", compresslevel=COMPRESS_LEVEL) as dst:
+        while True:
+            if token is not None:
+                token.check()
+            block = src.read(BUFFER_SIZE)
+            if not block:
+                break
+            dst.write(block)
+
+
+def backup(db_path: str, directory: Optional[str] = None, keep: Optional[int] = DEFAULT_KEEP,
+           compress: bool = False, pages: int = PAGES_PER_STEP,
+           progress: Optional[Callable[[int, int], None]] = None, token=None) -> BackupResult:
+    """为数据库创建一份带时间戳的快照，并轮换旧快照（keep 为 None 时不删除）
+
+    可以在程序运行、其他连接写入时执行。先写入 .part 临时文件，完成后再改名，
+    中途失败或取消不会留下不完整的快照。
+    """
+    if not os.path.isfile(db_path):
+        raise BackupError(f"数据库不存在: {db_path}")
+    started = time.perf_counter()
+    directory = directory or default_directory(db_path)
+    os.makedirs(directory, exist_ok=True)
+
+    base = os.path.join(directory, f"{_stem(db_path)}-{datetime.now().strftime(_TIME_FORMAT)}")
+    if any(os.path.exists(base + suffix) for suffix in _SUFFIXES):
+        # 同一秒内的多次备份加序号
+        index = 2
+        while any(os.path.exists(f"{base}-{index}{suffix}") for suffix in _SUFFIXES):
+            index += 1
+        base = f"{base}-{index}"
+    path = base + (".db.gz" if compress else ".db")
+
+    partial = base + ".db.part"
+    source = sqlite3.connect(db_path)
+    try:
+        page_count = copy_database(source, partial, pages, progress, token)
+    finally:
+        source.close()
+    try:
+        if compress:
+            _compress(partial, path + ".part", token)
+            os.replace(path + ".part", path)
+            os.remove(partial)
+        else:
+            os.replace(partial, path)
+    except BaseException:
+        for leftover in (partial, path + ".part"):
+            with contextlib.suppress(OSError):
+                os.remove(leftover)
+        raise
+
+    removed = prune(db_path, directory, keep) if keep is not None else []
+    return BackupResult(path=path, pages=page_count, size=os.path.getsize(path),
+                        elapsed=time.perf_counter() - started, removed=removed)
+
+
+@contextlib.contextmanager
+def open_snapshot(snapshot: str) -> Iterator[str]:
+    """返回可直接用 sqlite3 打开的快照路径：压缩快照先解压到临时文件"""
+    if not os.path.isfile(snapshot):
+        raise BackupError(f"快照不存在: {snapshot}")
+    if not snapshot.endswith(".gz"):
+        yield snapshot
+        return
+    fd, path = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(os.path.abspath(snapshot)))
+    try:
+        with os.fdopen(fd, "wb") as dst, gzip.open(snapshot, "rb") as src:
+            shutil.copyfileobj(src, dst, BUFFER_SIZE)
+        yield path
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(path)
+
+
+def _check_snapshot(conn: sqlite3.Connection):
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+        version = migrations.get_version(conn)
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f"不是有效的数据库快照: {e}") from e
+    if result != "ok":
+        raise BackupError(f"快照已损坏: {result}")
+    if version > migrations.SCHEMA_VERSION:
+        raise BackupError(f"快照版本 {version} 高于程序支持的版本 {migrations.SCHEMA_VERSION}")
+
+
+def restore(snapshot: str, db_path: str, safety_backup: bool = True, directory: Optional[str] = None,
+            pages: int = PAGES_PER_STEP, progress: Optional[Callable[[int, int], None]] = None) -> Optional[BackupResult]:
+    """用快照替换数据库内容，返回恢复前自动创建的备份（safety_backup 为 False 或数据库不存在时为 None）
+
+    通过备份接口写入目标数据库而不是直接覆盖文件，WAL 和其他连接都能正确看到恢复后的内容。
+    恢复后升级到最新结构并重新生成数据库标识（见 sync.py），现有数据在下次同步时完整发送一次。
+    正在运行的程序中的查询缓存和数据库标识不会自动更新，建议关闭程序后再恢复。
+    """
+    with open_snapshot(snapshot) as path:
+        source = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+        try:
+            _check_snapshot(source)
+            saved = None
+            if safety_backup and os.path.isfile(db_path):
+                # 不参与轮换，避免恢复前的备份被立刻删掉
+                saved = backup(db_path, directory, keep=None)
+            target = sqlite3.connect(db_path)
+            try:
+                source.backup(target, pages=pages,
+                              progress=None if progress is None else
+                              lambda status, remaining, total: progress(total - remaining, total))
+            finally:
+                target.close()
+        finally:
+            source.close()
+    # 恢复后的数据库相当于另一份数据：沿用原标识时，之后新写的修改会与对方已收到的 seq 重叠而被跳过
+    with Database(db_path, read_pool_size=1, cache_size=0) as db:
+        db.reset_database_id()
+    return saved
+
+
+@contextlib.contextmanager
+def _comparable(snapshot: str, version: int) -> Iterator[str]:
+    """与当前数据库结构版本相同的快照路径：版本较旧时复制一份升级后再比较，不修改快照本身"""
+    with open_snapshot(snapshot) as path:
+        conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+        try:
+            _check_snapshot(conn)
+            snapshot_version = migrations.get_version(conn)
+            if snapshot_version == version:
+                conn.close()
+                yield path
+                return
+            if snapshot_version > version:
+                raise BackupError(f"快照版本 {snapshot_version} 高于当前数据库版本 {version}")
+            fd, upgraded = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(os.path.abspath(path)))
+            os.close(fd)
+            try:
+                target = sqlite3.connect(upgraded)
+                conn.backup(target)
+                conn.close()
+                migrations.migrate(target)
+                target.close()
+                yield upgraded
+            finally:
+                with contextlib.suppress(OSError):
+                    os.remove(upgraded)
+        finally:
+            conn.close()
+
+
+def diff(snapshot: str, db_path: str) -> SnapshotDiff:
+    """比较快照与当前数据库：账本按 id 对应，记录按 id 对应
+
+    快照以只读方式附加到当前数据库的连接上，用 SQL 按主键连接比较，不把记录读入内存。
+    """
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        version = migrations.get_version(conn)
+        with _comparable(snapshot, version) as path:
+            conn.execute("ATTACH DATABASE ? AS snap", (f"file:{os.path.abspath(path)}?mode=ro",))
+            try:
+                result = SnapshotDiff()
+                result.ledgers_added = [row[0] for row in conn.execute('''
+                    SELECT name FROM main.ledgers
+                    WHERE id NOT IN (SELECT id FROM snap.ledgers) ORDER BY id''')]
+                result.ledgers_removed = [row[0] for row in conn.execute('''
+                    SELECT name FROM snap.ledgers
+                    WHERE id NOT IN (SELECT id FROM main.ledgers) ORDER BY id''')]
+                result.ledgers_renamed = conn.execute('''
+                    SELECT s.name, m.name FROM main.ledgers m JOIN snap.ledgers s ON s.id = m.id
+                    WHERE s.name != m.name ORDER BY m.id''').fetchall()
+
+                # 当前数据库一遍 LEFT JOIN 统计新增和修改，再一遍反连接统计删除
+                added, changed = conn.execute('''
+                    SELECT COALESCE(SUM(s.id IS NULL), 0),
+                           COALESCE(SUM(s.id IS NOT NULL AND (
+                               m.ledger_id IS NOT s.ledger_id OR m.amount IS NOT s.amount
+                               OR m.note IS NOT s.note OR m.period IS NOT s.period
+                               OR m.created_at IS NOT s.created_at)), 0)
+                    FROM main.asset_records m LEFT JOIN snap.asset_records s ON s.id = m.id''').fetchone()
+                removed = conn.execute('''
+                    SELECT COUNT(*) FROM snap.asset_records s
+                    WHERE NOT EXISTS (SELECT 1 FROM main.asset_records m WHERE m.id = s.id)''').fetchone()[0]
+                result.records_added, result.records_changed, result.records_removed = added, changed, removed
+
+                # 各账本的当前金额取自余额快照表
+                result.balances = conn.execute('''
+                    WITH ids AS (SELECT id FROM main.ledgers UNION SELECT id FROM snap.ledgers)
+                    SELECT COALESCE(ml.name, sl.name), sb.amount, mb.amount
+                    FROM ids
+                    LEFT JOIN main.ledgers ml ON ml.id = ids.id
+                    LEFT JOIN snap.ledgers sl ON sl.id = ids.id
+                    LEFT JOIN main.ledger_balances mb ON mb.ledger_id = ids.id
+                    LEFT JOIN snap.ledger_balances sb ON sb.ledger_id = ids.id
+                    WHERE mb.amount IS NOT sb.amount
+                    ORDER BY ids.id''').fetchall()
+                return result
+            finally:
+                conn.execute("DETACH DATABASE snap")
+    finally:
+        conn.close()
+
+
+def _size(size: int) -> str:
+    return f"{size / 1e6:.1f} MB"
+
+
+def _amount(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:,.2f}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="easyAccounting backup", description="数据库备份、恢复与对比")
+    parser.add_argument("--db", default="accounting.db", help="数据库文件")
+    parser.add_argument("--dir", help=f"备份目录，默认为数据库所在目录下的 {BACKUP_DIR}")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create = commands.add_parser("create", help="创建快照")
+    create.add_argument("--keep", type=int, default=DEFAULT_KEEP, help="保留的快照数量，0 表示不删除旧快照")
+    create.add_argument("--compress", action="store_true", help="用 gzip 压缩快照")
+    create.add_argument("--pages", type=int, default=PAGES_PER_STEP, help="每步复制的页数")
+
+    commands.add_parser("list", help="列出快照")
+
+    compare = commands.add_parser("diff", help="对比快照与当前数据库")
+    compare.add_argument("snapshot")
+
+    back = commands.add_parser("restore", help="用快照恢复数据库（请先关闭程序）")
+    back.add_argument("snapshot")
+    back.add_argument("--no-safety-backup", action="store_true", help="恢复前不备份当前数据库")
+
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "create":
+            def progress(copied, total):
+                print(f"\r已复制 {copied}/{total} 页", end="", file=sys.stderr, flush=True)
+
+            result = backup(args.db, args.dir, keep=args.keep or None, compress=args.compress,
+                            pages=args.pages, progress=progress)
+            print(file=sys.stderr)
+            print(f"已创建快照 {result.path}（{result.pages} 页，{_size(result.size)}，用时 {result.elapsed:.1f} 秒）")
+            for path in result.removed:
+                print(f"已删除旧快照 {path}")
+        elif args.command == "list":
+            snapshots = list_snapshots(args.db, args.dir)
+            if not snapshots:
+                print("没有快照")
+            for snapshot in snapshots:
+                print(f"{snapshot.created:%Y-%m-%d %H:%M:%S}  {_size(snapshot.size):>10}  {snapshot.path}")
+        elif args.command == "diff":
+            result = diff(args.snapshot, args.db)
+            if result.is_empty():
+                print("快照与当前数据库没有差异")
+                return 0
+            for name in result.ledgers_added:
+                print(f"+ 账本 {name}")
+            for name in result.ledgers_removed:
+                print(f"- 账本 {name}")
+            for old, new in result.ledgers_renamed:
+                print(f"* 账本 {old} -> {new}")
+            print(f"记录: 新增 {result.records_added} 条，删除 {result.records_removed} 条，"
+                  f"修改 {result.records_changed} 条")
+            for name, old, new in result.balances:
+                print(f"  {name}: {_amount(old)} -> {_amount(new)}")
+        else:
+            saved = restore(args.snapshot, args.db, safety_backup=not args.no_safety_backup, directory=args.dir)
+            if saved:
+                print(f"恢复前的数据已备份到 {saved.path}")
+            print(f"已从 {args.snapshot} 恢复 {args.db}")
+    except (BackupError, sqlite3.Error, OSError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,533 @@
+# benchmark.py
+"""性能基准测试
+
+生成可复现的合成数据库（同样的参数和随机种子得到完全相同的数据），测量 Database
+各公开方法以及无界面（Qt offscreen 平台）下 refresh_data / refresh_statistics 的耗时，
+输出 p50/p95 与峰值内存，结果保存为 JSON，便于在不同提交之间对比。
+
+命令行用法:
+    python benchmark.py generate bench.db --ledgers 100 --records 1000000
+    python benchmark.py run bench.db                         测量已有的数据库（在副本上执行，不修改原文件）
+    python benchmark.py run --preset large                   按预设规模生成（已生成过则复用）并测量
+    python benchmark.py run bench.db --only "get_*" --no-ui  只测量部分项目
+    python benchmark.py compare old.json new.json            对比两次结果的 p50
+
+预设规模: small 10 账本/1 千条, medium 100/10 万, large 1000/100 万, huge 10000/1000 万。
+耗时按冷缓存测量（每次运行前清空 QueryCache），带缓存的方法另测一项“缓存命中”；
+峰值内存用 tracemalloc 在计时之外单独运行一次统计，只包含 Python 分配（NumPy 数组也计入）。
+"""
+import argparse
+import fnmatch
+import itertools
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import migrations
+from database import Database, from_epoch, to_epoch
+from models import Ledger, AssetRecord, RecordFilter
+
+PRESETS = {
+    "small": (10, 1_000),
+    "medium": (100, 100_000),
+    "large": (1_000, 1_000_000),
+    "huge": (10_000, 10_000_000),
+}
+
+DATA_DIR = "benchmark_data"
+RESULTS_DIR = "benchmark_results"
+
+# 合成数据的时间范围：START 起 YEARS 年
+START = datetime(2015, 1, 1)
+YEARS = 10
+
+NOTES = ["", "", "", "工资入账", "房租", "信用卡还款", "买基金", "理财收益", "年终奖", "定投",
+         "转账", "股票分红", "year-end bonus", "salary", "月度盘点", "季度盘点"]
+
+# 超过该记录数时跳过需要读出全部记录的项目（如 get_all_records），避免内存不足
+FULL_SCAN_LIMIT = 2_000_000
+
+# 不访问数据库或只修改同步状态的公开方法，不需要测量
+NOT_MEASURED = {"close", "subscribe", "unsubscribe", "cache_stats", "save_sync_peer", "reset_database_id"}
+
+
+def generate(path: str, ledgers: int, records: int, seed: int = 0, chunk_size: int = 1_000_000):
+    """生成合成数据库
+
+    记录按时间顺序均匀分布在 START 起的 YEARS 年内，随机分配到各账本；
+    每个账本的金额围绕各自的基数按年周期波动并带少量噪声。
+    """
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF")
+        migrations.migrate(conn)
+        start = to_epoch(START)
+        conn.executemany("INSERT INTO ledgers (name, description, created_at) VALUES (?, ?, ?)",
+                         ((f"账本{i:05d}", f"合成数据 #{i}", start) for i in range(1, ledgers + 1)))
+        ledger_ids = np.array([row[0] for row in conn.execute("SELECT id FROM ledgers ORDER BY id")])
+        bases = rng.lognormal(mean=10, sigma=1.5, size=ledgers)
+        phases = rng.uniform(0, 2 * np.pi, size=ledgers)
+
+        # 全文索引在全部插入后一次建立
+        fts = migrations.has_fts(conn)
+        if fts:
+            conn.execute("UPDATE search_index_state SET deferred = 1")
+        span = YEARS * 365 * 86400
+        chunks = max(1, -(-records // chunk_size))
+        for chunk in range(chunks):
+            count = records // chunks + (1 if chunk < records % chunks else 0)
+            # 每块覆盖一段连续时间，块内排序，整体按时间顺序插入
+            lo = start + span * chunk // chunks
+            hi = start + span * (chunk + 1) // chunks
+            times = np.sort(rng.integers(lo, hi, size=count))
+            owners = rng.integers(0, ledgers, size=count)
+            years = (times - start) / (365 * 86400)
+            amounts = bases[owners] * (1 + 0.3 * np.sin(2 * np.pi * years + phases[owners]))
+            amounts = np.round(amounts * rng.lognormal(0, 0.02, size=count), 2)
+            notes = np.array(NOTES, dtype=object)[rng.integers(0, len(NOTES), size=count)]
+            months = times.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+            quarters, quarter_index = np.unique(months // 3, return_inverse=True)
+            labels = np.array([f"{1970 + q // 4}年Q{q % 4 + 1}" for q in quarters.tolist()], dtype=object)
+            conn.executemany(
+                "INSERT INTO asset_records (ledger_id, amount, note, period, created_at) VALUES (?, ?, ?, ?, ?)",
+                zip(ledger_ids[owners].tolist(), amounts.tolist(), notes.tolist(),
+                    labels[quarter_index].tolist(), times.tolist()))
+            conn.commit()
+        if fts:
+            migrations.rebuild_fts(conn.cursor())
+            conn.execute("UPDATE search_index_state SET deferred = 0")
+        # 与迁移已有数据库时一样，把生成的数据记为本机修改，生成的数据库可以直接同步
+        migrations.log_existing_data(conn.cursor())
+        # migrate 时表还是空的，重新收集统计信息，避免查询优化器按空表选择执行计划
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+
+def preset_path(ledgers: int, records: int, seed: int) -> str:
+    return os.path.join(DATA_DIR, f"bench_{ledgers}x{records}_s{seed}.db")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """线性插值的百分位数（与 numpy.percentile 默认方式相同）"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+@dataclass
+class Case:
+    """一个测量项目：fn 为被测操作，setup 在每次运行前执行，不计入耗时"""
+    name: str
+    group: str
+    fn: Callable[[], object]
+    setup: Optional[Callable[[], None]] = None
+    full_scan: bool = False  # 需要读出全部记录
+
+
+@dataclass
+class Result:
+    name: str
+    group: str
+    times: List[float] = field(default_factory=list)  # 秒
+    peak_bytes: Optional[int] = None
+    skipped: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        data = {"name": self.name, "group": self.group}
+        if self.skipped:
+            data["skipped"] = self.skipped
+            return data
+        data.update({
+            "runs": len(self.times),
+            "p50_ms": percentile(self.times, 50) * 1000,
+            "p95_ms": percentile(self.times, 95) * 1000,
+            "min_ms": min(self.times) * 1000,
+            "mean_ms": sum(self.times) / len(self.times) * 1000,
+            "peak_kb": None if self.peak_bytes is None else self.peak_bytes / 1024,
+        })
+        return data
+
+
+def measure(case: Case, repeat: int, warmup: int = 1, memory: bool = True) -> Result:
+    result = Result(case.name, case.group)
+    for i in range(warmup + repeat):
+        if case.setup:
+            case.setup()
+        started = time.perf_counter()
+        case.fn()
+        elapsed = time.perf_counter() - started
+        if i >= warmup:
+            result.times.append(elapsed)
+    if memory:
+        # tracemalloc 会明显拖慢分配，单独运行一次，不影响计时
+        if case.setup:
+            case.setup()
+        tracemalloc.start()
+        try:
+            case.fn()
+            result.peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def database_cases(db: Database, records: int) -> List[Case]:
+    """Database 公开方法的测量项目（先读后写，写操作在测量用的副本上执行）"""
+    cold = db.cache.clear
+    with db._read() as cursor:
+        cursor.execute("SELECT ledger_id FROM asset_records GROUP BY ledger_id ORDER BY COUNT(*) DESC LIMIT 1")
+        row = cursor.fetchone()
+        busiest = row[0] if row else None
+        cursor.execute("SELECT created_at, id FROM asset_records ORDER BY created_at DESC, id DESC "
+                       "LIMIT 1 OFFSET ?", (records // 2,))
+        row = cursor.fetchone()
+    middle = None if row is None else (from_epoch(row[0]), row[1])
+    search = RecordFilter(text="工资入账")
+    short_search = RecordFilter(text="定投")
+    ranged = RecordFilter(ledger_id=busiest, start=START + timedelta(days=365), end=START + timedelta(days=730))
+
+    cases = [
+        Case("get_all_ledgers", "读取", db.get_all_ledgers, cold),
+        Case("get_latest_asset_records", "读取", db.get_latest_asset_records, cold),
+        Case("get_ledger_history", "读取", lambda: db.get_ledger_history(busiest), cold),
+        Case("get_recent_history", "读取", db.get_recent_history, cold),
+        Case("get_ledger_summaries", "读取", db.get_ledger_summaries, cold),
+        Case("get_all_records", "读取", db.get_all_records, cold, full_scan=True),
+        Case("iter_records 第一页", "读取", lambda: list(db.iter_records(limit=100))),
+        Case("iter_records 中间页", "读取", lambda: list(db.iter_records(after=middle, limit=100))),
+        Case("iter_records 全文搜索", "读取", lambda: list(db.iter_records(limit=100, record_filter=search))),
+        Case("iter_records 短词搜索", "读取", lambda: list(db.iter_records(limit=100, record_filter=short_search))),
+        Case("iter_records 账本+日期", "读取", lambda: list(db.iter_records(limit=100, record_filter=ranged))),
+        Case("count_records", "读取", db.count_records, cold),
+        Case("count_records 全文搜索", "读取", lambda: db.count_records(search), cold),
+        Case("get_periods", "读取", db.get_periods, cold),
+        Case("get_record_batch", "读取", db.get_record_batch, full_scan=True),
+        Case("iter_record_chunks", "读取", lambda: sum(len(rows) for rows in db.iter_record_chunks()), full_scan=True),
+        Case("iter_record_range", "读取", lambda: sum(len(rows) for rows in db.iter_record_range(1, records)),
+             full_scan=True),
+        Case("get_changes", "读取", db.get_changes),
+        Case("get_last_change_seq", "读取", db.get_last_change_seq),
+        Case("get_sync_peers", "读取", db.get_sync_peers),
+        Case("get_resampled_balances 按月", "读取", lambda: db.get_resampled_balances("month"), cold),
+        Case("get_resampled_balances 按日", "读取", lambda: db.get_resampled_balances("day"), cold),
+        Case("get_net_worth_curve", "读取", db.get_net_worth_curve, cold, full_scan=True),
+        Case("get_ledger_series", "读取", db.get_ledger_series, cold, full_scan=True),
+    ]
+    # 带缓存的读方法再测一次缓存命中
+    for case in list(cases):
+        if case.setup is cold and hasattr(getattr(Database, case.name.split()[0]), "cache_tags"):
+            cases.append(Case(case.name + " (缓存命中)", "缓存", case.fn, full_scan=case.full_scan))
+
+    ticks = itertools.count()
+
+    def next_time() -> datetime:
+        return START + timedelta(days=YEARS * 365, seconds=next(ticks))
+
+    target = busiest or 0
+    cases += [
+        Case("add_asset_record", "写入",
+             lambda: db.add_asset_record(AssetRecord(None, target, 1.0, "基准测试", "基准", next_time()))),
+        Case("add_asset_records x100", "写入",
+             lambda: db.add_asset_records([AssetRecord(None, target, 1.0, "基准测试", "基准", next_time())
+                                           for _ in range(100)])),
+        Case("add_asset_records_bulk x10000", "写入",
+             lambda: db.add_asset_records_bulk(AssetRecord(None, target, 1.0, "基准测试", "基准", next_time())
+                                               for _ in range(10_000))),
+        Case("create_ledger", "写入",
+             lambda: db.create_ledger(Ledger(None, f"基准账本{next(ticks)}", "", START))),
+    ]
+
+    doomed = []
+
+    def create_doomed():
+        ledger = db.create_ledger(Ledger(None, f"待删除账本{next(ticks)}", "", START))
+        db.add_asset_records_bulk(AssetRecord(None, ledger.id, 1.0, "", "", next_time()) for _ in range(1000))
+        doomed.append(ledger.id)
+
+    cases += [
+        Case("delete_ledger (1000 条记录)", "写入", lambda: db.delete_ledger(doomed.pop()), create_doomed),
+        Case("rebuild_ledger_balances", "写入", db.rebuild_ledger_balances),
+        Case("init_database", "写入", db.init_database),
+    ]
+    return cases
+
+
+def check_coverage(cases: List[Case]):
+    """新增的公开方法如果没有对应的测量项目，给出提示"""
+    measured = {case.name.split()[0] for case in cases}
+    public = {name for name in dir(Database) if not name.startswith("_") and callable(getattr(Database, name))}
+    missing = sorted(public - measured - NOT_MEASURED)
+    if missing:
+        print(f"提示: 以下 Database 方法没有测量项目: {', '.join(missing)}", file=sys.stderr)
+
+
+def run_ui(db_path: str, repeat: int, memory: bool, selected: Callable[[str], bool]) -> List[Result]:
+    """在 offscreen 平台上测量页面刷新：从发起刷新到后台加载、图表渲染全部完成"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtCore import QCoreApplication, QEventLoop
+    from PySide6.QtWidgets import QApplication
+    from workers import DatabaseEvents
+    from ui import AssetManagementPage, AssetStatisticsPage
+
+    app = QApplication.instance() or QApplication([])
+
+    def wait(runner):
+        while runner.is_busy():
+            QCoreApplication.processEvents(QEventLoop.AllEvents | QEventLoop.WaitForMoreEvents)
+        QCoreApplication.processEvents()
+
+    db = Database(db_path)
+    events = DatabaseEvents(db)
+    management = AssetManagementPage(db, events)
+    statistics = AssetStatisticsPage(db, events)
+    pages = (management, statistics)
+    for page in pages:
+        page.resize(1200, 800)
+        page.show()
+        wait(page.runner)
+
+    def cold_statistics(freq):
+        def setup():
+            db.cache.clear()
+            statistics.image_cache.clear()
+            statistics.trend_freq = freq
+        return setup
+
+    def refresh_statistics():
+        statistics.refresh_statistics(force=True)
+        wait(statistics.runner)
+
+    def refresh_data():
+        management.refresh_data()
+        wait(management.runner)
+
+    cases = [
+        Case("refresh_data", "界面", refresh_data, db.cache.clear),
+        Case("refresh_statistics 全部记录", "界面", refresh_statistics, cold_statistics(None)),
+        Case("refresh_statistics 按月", "界面", refresh_statistics, cold_statistics("month")),
+    ]
+    try:
+        return [measure(case, repeat, memory=memory) for case in cases if selected(case.name)]
+    finally:
+        for page in pages:
+            page.runner.shutdown()
+            page.close()
+        events.detach()
+        db.close()
+        app.processEvents()
+
+
+def _git(*args) -> Optional[str]:
+    try:
+        return subprocess.run(("git",) + args, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict:
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": None if status is None else bool(status),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def peak_rss_kb() -> Optional[float]:
+    """进程的峰值常驻内存（Windows 上没有 resource 模块时返回 None）"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform == "darwin" else float(peak)  # macOS 单位为字节
+
+
+def run(db_path: str, repeat: int = 5, ui: bool = True, memory: bool = True,
+        only: Optional[List[str]] = None, skip: Optional[List[str]] = None) -> Dict:
+    """在数据库副本上执行全部测量项目，返回结果字典"""
+    def selected(name: str) -> bool:
+        if only and not any(fnmatch.fnmatch(name, pattern) for pattern in only):
+            return False
+        return not (skip and any(fnmatch.fnmatch(name, pattern) for pattern in skip))
+
+    conn = sqlite3.connect(db_path)
+    try:
+        # 合并 WAL 后原文件即为完整的数据库，可以直接复制
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        ledgers, records = conn.execute("SELECT (SELECT COUNT(*) FROM ledgers), "
+                                        "(SELECT COUNT(*) FROM asset_records)").fetchone()
+    finally:
+        conn.close()
+    info = {"path": os.path.abspath(db_path), "ledgers": ledgers, "records": records,
+            "size_bytes": os.path.getsize(db_path)}
+
+    work_dir = tempfile.mkdtemp(prefix="easyAccounting-bench-")
+    try:
+        # 写操作会修改数据，在副本上测量，原文件保持不变，多次运行结果可比
+        work_path = os.path.join(work_dir, "accounting.db")
+        shutil.copyfile(db_path, work_path)
+        results = []
+        with Database(work_path) as db:
+            cases = database_cases(db, records)
+            check_coverage(cases)
+            for case in cases:
+                if not selected(case.name):
+                    continue
+                if case.full_scan and records > FULL_SCAN_LIMIT:
+                    results.append(Result(case.name, case.group, skipped=f"记录数超过 {FULL_SCAN_LIMIT}"))
+                else:
+                    results.append(measure(case, repeat, memory=memory))
+                _print_result(results[-1])
+        if ui:
+            # 写入项目会增加少量记录，界面测量使用一份新的副本
+            shutil.copyfile(db_path, work_path)
+            for path in (work_path + "-wal", work_path + "-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
+            for result in run_ui(work_path, repeat, memory, selected):
+                results.append(result)
+                _print_result(result)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "database": info,
+        "repeat": repeat,
+        "peak_rss_kb": peak_rss_kb(),
+        "results": [result.to_dict() for result in results],
+    }
+
+
+def _print_result(result: Result):
+    data = result.to_dict()
+    if result.skipped:
+        print(f"{result.name:<40} 跳过: {result.skipped}")
+        return
+    peak = "" if data["peak_kb"] is None else f"{data['peak_kb']:12,.0f} KB"
+    print(f"{result.name:<40} p50 {data['p50_ms']:10.2f} ms   p95 {data['p95_ms']:10.2f} ms {peak}")
+
+
+def compare(old: Dict, new: Dict, threshold: float = 0.1) -> List[str]:
+    """对比两次结果的 p50，变化超过 threshold 的项目加标记"""
+    before = {r["name"]: r for r in old["results"] if "p50_ms" in r}
+    lines = []
+    old_scale = (old["database"]["ledgers"], old["database"]["records"])
+    new_scale = (new["database"]["ledgers"], new["database"]["records"])
+    if old_scale != new_scale:
+        lines.append(f"注意: 两次测量的数据规模不同（账本, 记录）{old_scale} -> {new_scale}")
+    lines.append(f"{'项目':<40} {'旧 p50(ms)':>12} {'新 p50(ms)':>12} {'变化':>8}")
+    for result in new["results"]:
+        previous = before.get(result["name"])
+        if previous is None or "p50_ms" not in result:
+            continue
+        change = result["p50_ms"] / previous["p50_ms"] - 1 if previous["p50_ms"] else 0.0
+        mark = ("  慢" if change > 0 else "  快") if abs(change) > threshold else ""
+        lines.append(f"{result['name']:<40} {previous['p50_ms']:12.2f} {result['p50_ms']:12.2f} "
+                     f"{change:+8.1%}{mark}")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="benchmark.py", description="easyAccounting 性能基准测试")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="生成合成数据库")
+    gen.add_argument("path")
+    gen.add_argument("--ledgers", type=int, default=100)
+    gen.add_argument("--records", type=int, default=100_000)
+    gen.add_argument("--seed", type=int, default=0)
+
+    bench = commands.add_parser("run", help="执行基准测试")
+    bench.add_argument("path", nargs="?", help="数据库文件，省略时按 --preset 或 --ledgers/--records 生成")
+    bench.add_argument("--preset", choices=sorted(PRESETS))
+    bench.add_argument("--ledgers", type=int)
+    bench.add_argument("--records", type=int)
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--repeat", type=int, default=5)
+    bench.add_argument("--only", action="append", help="只测量名称匹配的项目（通配符，可重复）")
+    bench.add_argument("--skip", action="append", help="跳过名称匹配的项目（通配符，可重复）")
+    bench.add_argument("--no-ui", action="store_true", help="不测量界面刷新")
+    bench.add_argument("--no-memory", action="store_true", help="不统计峰值内存")
+    bench.add_argument("--output", help=f"结果 JSON 路径，默认写入 {RESULTS_DIR}/")
+
+    diff = commands.add_parser("compare", help="对比两次结果")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        started = time.perf_counter()
+        generate(args.path, args.ledgers, args.records, args.seed)
+        print(f"已生成 {args.path}（{args.ledgers} 个账本，{args.records} 条记录，"
+              f"用时 {time.perf_counter() - started:.1f} 秒）")
+        return 0
+
+    if args.command == "compare":
+        with open(args.old, encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        print("\n".join(compare(old, new, args.threshold)))
+        return 0
+
+    path = args.path
+    if path is None:
+        if args.preset:
+            ledgers, records = PRESETS[args.preset]
+        elif args.ledgers and args.records:
+            ledgers, records = args.ledgers, args.records
+        else:
+            parser.error("需要指定数据库文件、--preset 或 --ledgers/--records")
+        path = preset_path(ledgers, records, args.seed)
+        if not os.path.exists(path):
+            os.makedirs(DATA_DIR, exist_ok=True)
+            print(f"生成 {path} ...")
+            generate(path, ledgers, records, args.seed)
+
+    report = run(path, args.repeat, ui=not args.no_ui, memory=not args.no_memory,
+                 only=args.only, skip=args.skip)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        commit = (report["environment"]["commit"] or "unknown")[:8]
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{commit}_{os.path.splitext(os.path.basename(path))[0]}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
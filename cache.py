@@ -0,0 +1,138 @@
+# cache.py
+"""Database 读方法的查询缓存
+
+按 (方法名, 参数) 缓存解码后的结果，容量有限，按最近最少使用淘汰。
+每个缓存项带有依赖标签，写操作只使 相关标签 的缓存项失效，例如向账本 3 添加记录
+只影响 "records" 与 "records:3"，其他账本的历史记录缓存不受影响。
+"""
+import functools
+import inspect
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Iterable, Set, Tuple
+
+
+@dataclass
+class CacheStats:
+    """缓存命中统计"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    size: int = 0
+    capacity: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class QueryCache:
+    """线程安全的 LRU 缓存，支持按标签失效"""
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[object, Tuple[str, ...]]]" = OrderedDict()
+        self._tag_index: Dict[str, Set[Hashable]] = {}
+        # 每次失效加一；查询期间发生过失效的结果不会写入缓存，避免缓存旧数据
+        self.generation = 0
+        self._stats = CacheStats(capacity=capacity)
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def get(self, key: Hashable):
+        """返回 (是否命中, 值)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return True, entry[0]
+
+    def put(self, key: Hashable, value, tags: Iterable[str], generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return
+            tags = tuple(tags)
+            self._discard(key)
+            self._entries[key] = (value, tags)
+            for tag in tags:
+                self._tag_index.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.capacity:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self._stats.evictions += 1
+
+    def invalidate(self, *tags: str):
+        """使带有任一标签的缓存项失效"""
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                for key in self._tag_index.pop(tag, ()):
+                    if key in self._entries:
+                        self._discard(key)
+                        self._stats.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._stats.invalidations += len(self._entries)
+            self._entries.clear()
+            self._tag_index.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(hits=self._stats.hits, misses=self._stats.misses,
+                              evictions=self._stats.evictions,
+                              invalidations=self._stats.invalidations,
+                              size=len(self._entries), capacity=self.capacity)
+
+    def _discard(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_index[tag]
+
+
+def cached(*tags: str) -> Callable:
+    """缓存 Database 读方法的返回值
+
+    tags 为依赖标签，可以用 {参数名} 引用方法参数，如 "records:{ledger_id}"。
+    返回列表时给调用方一个浅拷贝，调用方修改列表不会影响缓存。
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache = self.cache
+            if not cache.enabled:
+                return method(self, *args, **kwargs)
+
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            del arguments['self']
+            key = (method.__name__,) + tuple(arguments.items())
+
+            hit, value = cache.get(key)
+            if not hit:
+                generation = cache.generation
+                value = method(self, *args, **kwargs)
+                cache.put(key, value, [tag.format(**arguments) for tag in tags], generation)
+            return list(value) if isinstance(value, list) else value
+        wrapper.cache_tags = tags
+        return wrapper
+    return decorator
@@ -0,0 +1,402 @@
+# charts.py
+"""图表绘制
+
+只依赖 matplotlib 的面向对象接口和 Agg 后端，不依赖 Qt，
+既可以在界面的后台线程中离屏渲染，也可以在命令行/批量导出中使用。
+"""
+import functools
+import io
+import math
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import matplotlib
+import matplotlib.dates as mdates
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import analytics
+import profiling
+from models import LedgerSummary
+
+# 按顺序尝试的中文字体
+CJK_FONTS = ['SimHei', 'Microsoft YaHei', 'PingFang SC', 'Noto Sans CJK SC', 'WenQuanYi Micro Hei']
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_cjk_font() -> Optional[str]:
+    """返回第一个已安装的中文字体名称（结果缓存），都没有时返回 None"""
+    from matplotlib import font_manager
+    installed = {font.name for font in font_manager.fontManager.ttflist}
+    for name in CJK_FONTS:
+        if name in installed:
+            return name
+    return None
+
+
+# matplotlib 不保证多线程安全：字体、mathtext、文字排版等缓存是进程内共享的，
+# 即使各线程使用各自的 Figure，绘制和 savefig 也要串行执行（包括界面线程中的趋势图）
+RENDER_LOCK = threading.RLock()
+
+
+def setup_fonts():
+    """设置matplotlib中文字体支持
+
+    只保留实际存在的字体，避免绘制每段文字时都去查找缺失的字体。
+    """
+    family = resolve_cjk_font()
+    with RENDER_LOCK:
+        matplotlib.rcParams['font.sans-serif'] = ([family] if family else []) + ['DejaVu Sans']
+        matplotlib.rcParams['axes.unicode_minus'] = False
+
+
+setup_fonts()
+
+# 颜色列表
+COLORS = ["#FF6B6B", "#4ECDC4", "#45B7D1", "#96CEB4", "#FFEAA7", "#DDA0DD", "#98D8C8",
+          "#FF9F68", "#A8E6CF", "#FFACAC", "#B5EAD7", "#C7CEEA"]
+
+
+@dataclass
+class _ChartState:
+    """draw_* 绘制后记录的图元，供 update_* 原地更新"""
+    kind: str
+    key: tuple  # 图表结构（账本、标签等），不同时不能原地更新
+    artists: object = None
+
+
+def _set_state(fig: Figure, state: Optional[_ChartState]):
+    # 状态引用了 Figure 中的图元，挂在 Figure 上随它一起释放
+    fig._chart_state = state
+
+
+def _state(fig: Figure, kind: str, key: tuple) -> Optional[_ChartState]:
+    """返回可以原地更新的图表状态，结构不一致时返回 None"""
+    state = getattr(fig, "_chart_state", None)
+    if state is None or state.kind != kind or state.key != key or not fig.axes:
+        return None
+    return state
+
+
+def draw_no_data(fig: Figure):
+    """绘制空数据提示"""
+    _set_state(fig, None)
+    ax = fig.add_subplot(111)
+    ax.text(0.5, 0.5, "暂无数据", ha='center', va='center', transform=ax.transAxes)
+
+
+@profiling.timed()
+def draw_pie_chart(fig: Figure, summaries: List[LedgerSummary]):
+    """绘制资产配置饼图"""
+    # 计算总金额
+    total = sum(s.current_amount for s in summaries)
+    if not summaries or total <= 0:
+        draw_no_data(fig)
+        return
+
+    # 创建子图
+    ax = fig.add_subplot(111)
+
+    # 准备数据
+    sizes = [s.current_amount for s in summaries]
+    labels = [s.ledger.name for s in summaries]
+
+    # 绘制饼图
+    wedges, texts, autotexts = ax.pie(sizes, labels=labels, autopct='%1.1f%%',
+                                      colors=COLORS[:len(sizes)], startangle=90)
+
+    # 设置标题
+    ax.set_title("资产配置分布")
+
+    # 调整标签字体大小
+    for text in texts:
+        text.set_fontsize(8)
+    for autotext in autotexts:
+        autotext.set_fontsize(8)
+
+    fig.tight_layout()
+    _set_state(fig, _ChartState("pie", tuple(labels), (wedges, texts, autotexts)))
+
+
+@profiling.timed()
+def update_pie_chart(fig: Figure, summaries: List[LedgerSummary]) -> bool:
+    """账本不变时原地调整扇区角度和标签位置，返回是否已更新"""
+    total = sum(s.current_amount for s in summaries)
+    state = _state(fig, "pie", tuple(s.ledger.name for s in summaries))
+    if state is None or total <= 0:
+        return False
+
+    # 与 Axes.pie 相同的几何计算（startangle=90，逆时针，labeldistance=1.1，pctdistance=0.6）
+    wedges, texts, autotexts = state.artists
+    theta1 = 90 / 360
+    for wedge, text, autotext, summary in zip(wedges, texts, autotexts, summaries):
+        fraction = summary.current_amount / total
+        theta2 = theta1 + fraction
+        wedge.set_theta1(360 * theta1)
+        wedge.set_theta2(360 * theta2)
+        angle = math.pi * (theta1 + theta2)
+        x, y = math.cos(angle), math.sin(angle)
+        text.set_position((1.1 * x, 1.1 * y))
+        text.set_horizontalalignment('left' if x > 0 else 'right')
+        autotext.set_position((0.6 * x, 0.6 * y))
+        autotext.set_text(f"{fraction * 100:.1f}%")
+        theta1 = theta2
+    return True
+
+
+# 点数不超过该值的折线标出数据点
+MARKER_LIMIT = 60
+
+
+class DecimatedLines:
+    """按坐标轴的像素宽度抽稀显示的一组折线，缩放/平移后按新的显示范围重新抽稀"""
+    def __init__(self, ax, series: List[Tuple[np.ndarray, np.ndarray, dict]]):
+        """series 为 (时间 datetime64, 数值, plot 参数) 列表，时间必须升序"""
+        self.ax = ax
+        self.lines = [ax.plot([], [], **style)[0] for _, _, style in series]
+        self.series = []
+        self.home = None  # 显示全部数据时的横轴范围
+        ax.xaxis_date()
+        # 回调注册表只保存方法的弱引用，本对象由 Figure 上的图表状态持有
+        ax.callbacks.connect('xlim_changed', self.redecimate)
+        self.set_series([(times, values) for times, values, _ in series])
+
+    def set_series(self, series: List[Tuple[np.ndarray, np.ndarray]]):
+        """原地替换各折线的数据；之前显示的是全部范围时扩展到新数据的全部范围，否则保持当前缩放"""
+        self.series = [(mdates.date2num(times), np.asarray(values, dtype=np.float64))
+                       for times, values in series]
+        starts = [x[0] for x, _ in self.series if len(x)]
+        ends = [x[-1] for x, _ in self.series if len(x)]
+        start, end = min(starts), max(ends)
+        margin = max((end - start) * 0.02, 1.0)
+        home = (start - margin, end + margin)
+
+        if self.home is None or tuple(self.ax.get_xlim()) == self.home:
+            self.ax.set_xlim(home)
+        self.home = home
+        self.redecimate(self.ax)
+        self.ax.relim()
+        self.ax.autoscale_view(scalex=False)
+
+    def redecimate(self, ax):
+        start, end = ax.get_xlim()
+        buckets = max(int(ax.bbox.width), 1)
+        for line, (x, y) in zip(self.lines, self.series):
+            line.set_data(*analytics.decimate(x, y, start, end, buckets))
+
+
+def dynamic_artists(fig: Figure) -> list:
+    """update_* 原地更新时只有数据会变化的图元（趋势图的折线），其余图元可以作为不变的背景缓存"""
+    state = getattr(fig, "_chart_state", None)
+    if state is None or not isinstance(state.artists, DecimatedLines):
+        return []
+    return state.artists.lines
+
+
+def plot_decimated(ax, series: List[Tuple[np.ndarray, np.ndarray, dict]]) -> DecimatedLines:
+    """在 ax 上绘制按像素宽度抽稀的折线，导航工具栏缩放、平移、还原后按新的显示范围重新抽稀
+
+    series 为 (时间 datetime64, 数值, plot 参数) 列表，时间必须升序。
+    xlim_changed 回调只保存弱引用，调用方需要持有返回的 DecimatedLines。
+    """
+    return DecimatedLines(ax, series)
+
+
+@profiling.timed()
+def draw_line_chart(fig: Figure, series: List["analytics.LedgerSeries"], names: Dict[int, str]):
+    """绘制各账本全部记录的变化趋势（时间坐标轴，点数按像素宽度抽稀），names 为账本 id -> 名称"""
+    series = [s for s in series if len(s)]
+    if not series:
+        draw_no_data(fig)
+        return
+
+    # 创建子图
+    ax = fig.add_subplot(111)
+
+    # 为每个账本绘制折线
+    lines = plot_decimated(ax, [(s.times, s.amounts,
+                                dict(marker='o' if len(s) <= MARKER_LIMIT else None, markersize=4, linewidth=2,
+                                     label=names.get(s.ledger_id, str(s.ledger_id)), color=COLORS[i % len(COLORS)]))
+                               for i, s in enumerate(series)])
+
+    # 设置图形属性
+    ax.set_xlabel("时间")
+    ax.set_ylabel("金额 (¥)")
+    ax.set_title("资产变化趋势")
+    ax.legend(fontsize=8)
+    ax.grid(True, alpha=0.3)
+
+    # 旋转x轴标签以避免重叠
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    _set_state(fig, _ChartState("line", _series_key(series, names), lines))
+
+
+def _series_key(series, names) -> tuple:
+    return tuple((s.ledger_id, names.get(s.ledger_id)) for s in series)
+
+
+@profiling.timed()
+def update_line_chart(fig: Figure, series: List["analytics.LedgerSeries"], names: Dict[int, str]) -> bool:
+    """账本不变时原地替换折线数据，返回是否已更新"""
+    series = [s for s in series if len(s)]
+    state = _state(fig, "line", _series_key(series, names))
+    if state is None or not series:
+        return False
+    for line, s in zip(state.artists.lines, series):
+        line.set_marker('o' if len(s) <= MARKER_LIMIT else 'None')
+    state.artists.set_series([(s.times, s.amounts) for s in series])
+    return True
+
+
+@profiling.timed()
+def draw_balance_chart(fig: Figure, balances: "analytics.ResampledBalances", names: Dict[int, str]):
+    """绘制重采样后的余额走势，names 为账本 id -> 名称"""
+    if not len(balances) or not len(balances.ledger_ids):
+        draw_no_data(fig)
+        return
+
+    ax = fig.add_subplot(111)
+    periods = balances.periods
+    marker = 'o' if len(periods) <= MARKER_LIMIT else None
+
+    lines = [(periods, values, dict(marker=marker, markersize=4, linewidth=1.5,
+                                    label=names.get(ledger_id, str(ledger_id)), color=COLORS[i % len(COLORS)]))
+             for i, (ledger_id, values) in enumerate(zip(balances.ledger_ids.tolist(), balances.values))]
+    lines.append((periods, balances.totals, dict(linewidth=2.5, color="#333333", label="总资产")))
+    lines = plot_decimated(ax, lines)
+
+    ax.set_xlabel("周期")
+    ax.set_ylabel("金额 (¥)")
+    ax.set_title("资产变化趋势")
+    ax.legend(fontsize=8)
+    ax.grid(True, alpha=0.3)
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    _set_state(fig, _ChartState("balance", _balance_key(balances, names), lines))
+
+
+def _balance_key(balances, names) -> tuple:
+    return (balances.freq,) + tuple((ledger_id, names.get(ledger_id)) for ledger_id in balances.ledger_ids.tolist())
+
+
+@profiling.timed()
+def update_balance_chart(fig: Figure, balances: "analytics.ResampledBalances", names: Dict[int, str]) -> bool:
+    """频率和账本不变时原地替换折线数据，返回是否已更新"""
+    state = _state(fig, "balance", _balance_key(balances, names))
+    if state is None or not len(balances):
+        return False
+    marker = 'o' if len(balances.periods) <= MARKER_LIMIT else 'None'
+    for line in state.artists.lines[:-1]:
+        line.set_marker(marker)
+    state.artists.set_series([(balances.periods, values) for values in balances.values]
+                             + [(balances.periods, balances.totals)])
+    return True
+
+
+@profiling.timed()
+def draw_net_worth_chart(fig: Figure, curve):
+    """绘制总资产走势（analytics.NetWorthCurve）"""
+    if not len(curve):
+        draw_no_data(fig)
+        return
+
+    ax = fig.add_subplot(111)
+    # 总资产在两次记录之间保持不变，用阶梯线表示
+    line, = ax.step(curve.times, curve.totals, where='post', linewidth=2, color=COLORS[2])
+    fill = ax.fill_between(curve.times, curve.totals, step='post', alpha=0.15, color=COLORS[2])
+
+    ax.set_xlabel("时间")
+    ax.set_ylabel("总资产 (¥)")
+    ax.set_title("总资产走势")
+    ax.grid(True, alpha=0.3)
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    _set_state(fig, _ChartState("net_worth", (), [line, fill]))
+
+
+@profiling.timed()
+def update_net_worth_chart(fig: Figure, curve) -> bool:
+    """原地替换总资产走势的数据，返回是否已更新"""
+    state = _state(fig, "net_worth", ())
+    if state is None or not len(curve):
+        return False
+    line, fill = state.artists
+    ax = line.axes
+    line.set_data(curve.times, curve.totals)
+    # 填充区域的多边形随数据点数变化，直接替换
+    fill.remove()
+    state.artists[1] = ax.fill_between(curve.times, curve.totals, step='post', alpha=0.15, color=COLORS[2])
+    ax.relim()
+    ax.autoscale_view()
+    return True
+
+
+class ChartRenderer:
+    """持久的离屏图表
+
+    数据变化时优先用 update（本模块的 update_* 函数）原地更新已有图元，
+    不重新创建坐标轴、不重新计算 tight_layout；尺寸变化或图表结构变化时才清空后用 draw 重绘。
+    同一个实例可以在多个线程中使用（如界面刷新和导出），渲染时持有 RENDER_LOCK。
+    """
+    def __init__(self, draw: Callable[..., None], update: Optional[Callable[..., bool]] = None):
+        self.draw = draw
+        self.update = update
+        self.figure = None
+        self.canvas = None
+        self.size = None
+
+    def _prepare(self, args, width: int, height: int, dpi: float):
+        """把数据更新到图表上（调用方持有 RENDER_LOCK）"""
+        if self.figure is None:
+            self.figure = Figure()
+            self.canvas = FigureCanvasAgg(self.figure)
+        size = (width, height, dpi)
+        if size != self.size or self.update is None or not self.update(self.figure, *args):
+            self.figure.set_dpi(dpi)
+            self.figure.set_size_inches(width / dpi, height / dpi)
+            self.figure.clear()
+            self.draw(self.figure, *args)
+            self.size = size
+
+    def render(self, *args, width: int, height: int, dpi: float = 100) -> Tuple[int, int, bytes]:
+        """渲染图表，返回 (宽, 高, RGBA 像素数据)"""
+        with RENDER_LOCK, profiling.section(f"charts.render:{self.draw.__name__}"):
+            self._prepare(args, width, height, dpi)
+            self.canvas.draw()
+            w, h = self.canvas.get_width_height(physical=True)
+            return w, h, bytes(self.canvas.buffer_rgba())
+
+    def save(self, *args, width: int, height: int, dpi: float = 100, fmt: str = "png", **options) -> bytes:
+        """渲染图表并编码为文件内容，批量生成同类图表时复用同一个 Figure
+
+        options 原样传给 savefig（如 pil_kwargs 调整 PNG 压缩级别）。
+        """
+        with RENDER_LOCK, profiling.section(f"charts.save:{self.draw.__name__}:{fmt}"):
+            self._prepare(args, width, height, dpi)
+            buffer = io.BytesIO()
+            self.figure.savefig(buffer, format=fmt, dpi=dpi, **options)
+            return buffer.getvalue()
+
+
+def render_rgba(draw: Callable[..., None], *args, width: int, height: int,
+                dpi: float = 100) -> Tuple[int, int, bytes]:
+    """离屏渲染图表，返回 (宽, 高, RGBA 像素数据)
+
+    draw 为本模块中的绘制函数，第一个参数是待绘制的 Figure。
+    """
+    return ChartRenderer(draw).render(*args, width=width, height=height, dpi=dpi)
+
+
+def render_bytes(draw: Callable[..., None], *args, width: int, height: int, dpi: float = 100,
+                 fmt: str = "png") -> bytes:
+    """渲染图表并编码为文件内容（fmt 为 png、svg、pdf 等 matplotlib 支持的格式）"""
+    with RENDER_LOCK, profiling.section(f"charts.render_bytes:{draw.__name__}:{fmt}"):
+        fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        FigureCanvasAgg(fig)
+        draw(fig, *args)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=fmt, dpi=dpi)
+        return buffer.getvalue()
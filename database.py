@@ -1,184 +1,826 @@
 # database.py
-import sqlite3
 import os
-from typing import List, Optional
-from datetime import datetime
-from models import Ledger, AssetRecord, LedgerSummary
+import sqlite3
+import queue
+import threading
+import traceback
+from itertools import islice
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta
+from models import (Ledger, AssetRecord, LedgerSummary, LedgerTrend, RecordFilter, ChangeKind, ChangeEvent,
+                    ChangeLogEntry, SyncPeer)
+import migrations
+import profiling
+from cache import QueryCache, CacheStats, cached
+
+# 连接级别的性能参数
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",        # 写操作不阻塞读连接
+    "PRAGMA synchronous = NORMAL",      # WAL 模式下兼顾安全与速度
+    "PRAGMA cache_size = -16000",       # 约 16MB 页缓存
+    "PRAGMA mmap_size = 268435456",     # 256MB 内存映射
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",         # 删除账本时级联删除其记录
+)
+
+# 只读连接不切换日志模式：journal_mode = WAL 会永久改写数据库文件
+READ_ONLY_PRAGMAS = tuple(pragma for pragma in PRAGMAS
+                          if not pragma.startswith(("PRAGMA journal_mode", "PRAGMA synchronous")))
+
+# 每个连接缓存的预编译语句数量
+CACHED_STATEMENTS = 128
+
+# created_at 以整数秒存储：不带时区的本地时间按 UTC 换算（见 migrations._v4_integer_timestamps）
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+
+def to_epoch(value: datetime) -> int:
+    """datetime 转为存储用的整数时间戳（舍去秒以下部分）"""
+    return (value.replace(tzinfo=None) - _EPOCH) // _SECOND
+
+
+def from_epoch(value: int) -> datetime:
+    return _EPOCH + timedelta(seconds=value)
+
+
+def _epoch_decoder() -> Callable[[int], datetime]:
+    """返回带备忘的时间戳解码函数
+
+    同一结果集中大量记录共享相同时间（如同一次盘点），每个不同的值只转换一次。
+    """
+    memo = {}
+    
+    def decode(value):
+        result = memo.get(value)
+        if result is None:
+            result = memo[value] = _EPOCH + timedelta(seconds=value)
+        return result
+    return decode
+
 
+# trigram 分词按三个字符切分，更短的搜索词无法走全文索引，改用 LIKE
+FTS_MIN_TERM = 3
+
+
+def _like_pattern(term: str) -> str:
+    """LIKE 子串匹配模式，转义 % 和 _（配合 ESCAPE '\\'）"""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def filter_conditions(record_filter: Optional[RecordFilter], fts: bool) -> Tuple[List[str], List]:
+    """把筛选条件转换为 WHERE 子句片段及参数（各片段之间为 AND）
+    
+    fts 为 True 时，长度不少于 FTS_MIN_TERM 的搜索词合并成一个 FTS5 MATCH 查询，
+    其余搜索词在 note 和 period 上做 LIKE 子串匹配。
+    """
+    conditions = []
+    params = []
+    if record_filter is None:
+        return conditions, params
+    if record_filter.ledger_id is not None:
+        conditions.append('ledger_id = ?')
+        params.append(record_filter.ledger_id)
+    if record_filter.start is not None:
+        conditions.append('created_at >= ?')
+        params.append(to_epoch(record_filter.start))
+    if record_filter.end is not None:
+        conditions.append('created_at < ?')
+        params.append(to_epoch(record_filter.end))
+    if record_filter.min_amount is not None:
+        conditions.append('amount >= ?')
+        params.append(record_filter.min_amount)
+    if record_filter.max_amount is not None:
+        conditions.append('amount <= ?')
+        params.append(record_filter.max_amount)
+    if record_filter.period:
+        conditions.append('period = ?')
+        params.append(record_filter.period)
+
+    phrases = []
+    for term in record_filter.text.split():
+        if fts and len(term) >= FTS_MIN_TERM:
+            # 每个词作为带引号的短语，避免其中的 AND/OR/* 等被当作 FTS5 查询语法
+            phrases.append('"' + term.replace('"', '""') + '"')
+        else:
+            conditions.append("(note LIKE ? ESCAPE '\\' OR period LIKE ? ESCAPE '\\')")
+            pattern = _like_pattern(term)
+            params.extend((pattern, pattern))
+    if phrases:
+        conditions.append(f'id IN (SELECT rowid FROM {migrations.FTS_TABLE} '
+                          f'WHERE {migrations.FTS_TABLE} MATCH ?)')
+        params.append(' '.join(phrases))
+    return conditions, params
+
+
+@profiling.timed()
+def decode_ledgers(rows) -> List[Ledger]:
+    """把 (id, name, description, created_at) 行批量解码为 Ledger"""
+    decode = _epoch_decoder()
+    return [Ledger(id=row[0], name=row[1], description=row[2], created_at=decode(row[3]))
+            for row in rows]
+
+
+@profiling.timed()
+def decode_records(rows) -> List[AssetRecord]:
+    """把 (id, ledger_id, amount, note, period, created_at) 行批量解码为 AssetRecord"""
+    decode = _epoch_decoder()
+    return [AssetRecord(id=row[0], ledger_id=row[1], amount=row[2],
+                        note=row[3], period=row[4], created_at=decode(row[5]))
+            for row in rows]
+
+
+@profiling.profiled
 class Database:
-    def __init__(self, db_path: str = "accounting.db"):
+    def __init__(self, db_path: str = "accounting.db", read_pool_size: int = 4,
+                 cache_size: int = 256, readonly: bool = False):
         self.db_path = db_path
+        # 只读打开时不迁移、不修改文件（日志模式保持原样），写操作会抛出 sqlite3.OperationalError
+        self.readonly = readonly
+        self.read_pool_size = read_pool_size
+        self._write_lock = threading.RLock()
+        self._read_pool = queue.LifoQueue()
+        self._read_conn_count = 0
+        self._pool_lock = threading.Lock()
+        self._closed = False
+        self._listeners: List[Callable[[ChangeEvent], None]] = []
+        # 每次写操作提交后加一，读方可据此判断数据是否变化
+        self.data_version = 0
+        # 读方法结果缓存，cache_size 为 0 时不缓存
+        self.cache = QueryCache(cache_size)
+        # 长连接：所有写操作以及内存数据库的读操作都走这里
+        self._conn = self._connect()
         self.init_database()
-    
-    def init_database(self):
-        """初始化数据库表"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 创建账本表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ledgers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 创建资产记录表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS asset_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ledger_id INTEGER,
-                amount REAL NOT NULL,
-                note TEXT,
-                period TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (ledger_id) REFERENCES ledgers (id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
-    def create_ledger(self, ledger: Ledger) -> Ledger:
-        """创建新账本"""
-        conn = sqlite3.connect(self.db_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建并配置一个数据库连接"""
+        if self.readonly:
+            conn = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True,
+                                   check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                   cached_statements=CACHED_STATEMENTS)
+        for pragma in READ_ONLY_PRAGMAS if self.readonly else PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _is_memory(self) -> bool:
+        """内存数据库无法在多个连接间共享，读操作只能使用主连接"""
+        return self.db_path in ("", ":memory:")
+
+    def _check_open(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Database 已关闭")
+
+    @contextmanager
+    def _write(self):
+        """获取写游标，正常退出时提交，异常时回滚"""
+        self._check_open()
+        with self._write_lock:
+            cursor = self._open_cursor(self._conn)
+            try:
+                yield cursor
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            finally:
+                self._close_cursor(self._conn, cursor)
+
+    @contextmanager
+    def _read(self):
+        """从读连接池借出一个游标，可在工作线程中使用"""
+        self._check_open()
+        if self._is_memory():
+            with self._write_lock:
+                cursor = self._open_cursor(self._conn)
+                try:
+                    yield cursor
+                finally:
+                    self._close_cursor(self._conn, cursor)
+            return
+
+        conn = self._acquire_reader()
+        cursor = self._open_cursor(conn)
+        try:
+            yield cursor
+        finally:
+            self._close_cursor(conn, cursor)
+            self._release_reader(conn)
+
+    @staticmethod
+    def _open_cursor(conn: sqlite3.Connection):
+        """开启性能剖析时返回记录语句耗时的游标，并在借用期间挂上 trace/进度回调"""
         cursor = conn.cursor()
+        if not profiling.PROFILER.enabled:
+            return cursor
+        profiling.PROFILER.attach(conn)
+        return profiling.TimedCursor(cursor)
+
+    @staticmethod
+    def _close_cursor(conn: sqlite3.Connection, cursor):
+        if isinstance(cursor, profiling.TimedCursor):
+            profiling.PROFILER.detach(conn)
+        cursor.close()
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._read_pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._read_conn_count < self.read_pool_size:
+                self._read_conn_count += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except BaseException:
+                with self._pool_lock:
+                    self._read_conn_count -= 1
+                raise
+        # 连接池已满，等待其他线程归还
+        return self._read_pool.get()
+
+    def _release_reader(self, conn: sqlite3.Connection):
+        if self._closed:
+            conn.close()
+            return
+        # 结束可能残留的读事务，避免长期持有 WAL 快照
+        if conn.in_transaction:
+            conn.rollback()
+        self._read_pool.put(conn)
+
+    def subscribe(self, listener: Callable[[ChangeEvent], None]):
+        """订阅数据变更事件；回调在执行写操作的线程中、事务提交之后调用"""
+        self._listeners.append(listener)
+    
+    def unsubscribe(self, listener: Callable[[ChangeEvent], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+    
+    def _publish(self, kind: ChangeKind, ledger_ids, **details):
+        """使相关缓存失效，数据版本号加一并通知订阅者"""
+        # "ledgers" 标记依赖账本列表的查询，"records" 标记跨账本的记录查询，
+        # "records:<id>" 标记单个账本的记录查询
+        tags = [f"records:{ledger_id}" for ledger_id in ledger_ids]
+        if kind != ChangeKind.LEDGER_CREATED:
+            tags.append("records")
+        if kind != ChangeKind.RECORDS_ADDED:
+            tags.append("ledgers")
+        self.cache.invalidate(*tags)
         
+        with self._write_lock:
+            self.data_version += 1
+            event = ChangeEvent(kind=kind, version=self.data_version, ledger_ids=list(ledger_ids), **details)
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception:
+                # 订阅者的错误不影响已经提交的写操作
+                traceback.print_exc()
+    
+    def cache_stats(self) -> CacheStats:
+        """查询缓存的命中统计"""
+        return self.cache.stats()
+    
+    def close(self):
+        """关闭所有连接；可重复调用"""
+        if self._closed:
+            return
+        self._closed = True
+        while True:
+            try:
+                self._read_pool.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._write_lock:
+            self._conn.close()
+
+    def init_database(self):
+        """初始化数据库表，并把旧版本数据库升级到最新结构"""
+        self._check_open()
+        with self._write_lock:
+            if not self.readonly:
+                migrations.migrate(self._conn)
+            elif migrations.get_version(self._conn) != migrations.SCHEMA_VERSION:
+                raise RuntimeError(f"数据库版本 {migrations.get_version(self._conn)} 与程序版本 "
+                                   f"{migrations.SCHEMA_VERSION} 不一致，只读打开时无法升级")
+            # 当前 SQLite 不支持 FTS5 trigram 时没有全文索引，搜索退回 LIKE
+            self.fts_available = migrations.has_fts(self._conn)
+            self.database_id, self.log_id, self.write_id = self._conn.execute(
+                'SELECT database_id, log_id, write_id FROM sync_state').fetchone()
+    
+    @staticmethod
+    def _log_change(cursor, kind: ChangeKind, ledger_id: Optional[int] = None, ledger_name: Optional[str] = None,
+                    first_record_id: Optional[int] = None, last_record_id: Optional[int] = None,
+                    origin: Optional[str] = None):
+        """在当前写事务中追加一条变更日志"""
         cursor.execute('''
-            INSERT INTO ledgers (name, description, created_at)
-            VALUES (?, ?, ?)
-        ''', (ledger.name, ledger.description, ledger.created_at or datetime.now()))
-        
-        ledger_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+            INSERT INTO change_log (kind, ledger_id, ledger_name, first_record_id, last_record_id, origin)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (kind.value, ledger_id, ledger_name, first_record_id, last_record_id, origin))
+    
+    def create_ledger(self, ledger: Ledger, origin: Optional[str] = None) -> Ledger:
+        """创建新账本；origin 为同步来源数据库的标识，本机操作为 None"""
+        with self._write() as cursor:
+            cursor.execute('''
+                INSERT INTO ledgers (name, description, created_at)
+                VALUES (?, ?, ?)
+            ''', (ledger.name, ledger.description, to_epoch(ledger.created_at or datetime.now())))
+            
+            ledger_id = cursor.lastrowid
+            self._log_change(cursor, ChangeKind.LEDGER_CREATED, ledger_id, ledger.name, origin=origin)
         
         ledger.id = ledger_id
+        self._publish(ChangeKind.LEDGER_CREATED, [ledger_id], ledger=ledger)
         return ledger
     
+    @cached("ledgers")
     def get_all_ledgers(self) -> List[Ledger]:
         """获取所有账本"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT id, name, description, created_at FROM ledgers')
-        rows = cursor.fetchall()
-        conn.close()
+        with self._read() as cursor:
+            cursor.execute('SELECT id, name, description, created_at FROM ledgers')
+            rows = cursor.fetchall()
         
-        return [Ledger(id=row[0], name=row[1], description=row[2], 
-                      created_at=datetime.fromisoformat(row[3])) for row in rows]
+        return decode_ledgers(rows)
     
-    def delete_ledger(self, ledger_id: int):
-        """删除账本"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def delete_ledger(self, ledger_id: int, origin: Optional[str] = None):
+        """删除账本；origin 为同步来源数据库的标识，本机操作为 None"""
+        with self._write() as cursor:
+            cursor.execute('SELECT name FROM ledgers WHERE id = ?', (ledger_id,))
+            row = cursor.fetchone()
+            # asset_records 通过外键 ON DELETE CASCADE 一并删除
+            cursor.execute('DELETE FROM ledgers WHERE id = ?', (ledger_id,))
+            if row is not None:
+                # 其他数据库按名称找到对应的账本
+                self._log_change(cursor, ChangeKind.LEDGER_DELETED, ledger_id, row[0], origin=origin)
         
-        cursor.execute('DELETE FROM asset_records WHERE ledger_id = ?', (ledger_id,))
-        cursor.execute('DELETE FROM ledgers WHERE id = ?', (ledger_id,))
-        
-        conn.commit()
-        conn.close()
+        self._publish(ChangeKind.LEDGER_DELETED, [ledger_id])
     
     def add_asset_record(self, record: AssetRecord) -> AssetRecord:
         """添加资产记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO asset_records (ledger_id, amount, note, period, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (record.ledger_id, record.amount, record.note, record.period, record.created_at or datetime.now()))
-        
-        record_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with self._write() as cursor:
+            cursor.execute('''
+                INSERT INTO asset_records (ledger_id, amount, note, period, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (record.ledger_id, record.amount, record.note, record.period, to_epoch(record.created_at or datetime.now())))
+            
+            record_id = cursor.lastrowid
+            self._log_change(cursor, ChangeKind.RECORDS_ADDED, record.ledger_id,
+                             first_record_id=record_id, last_record_id=record_id)
         
         record.id = record_id
+        self._publish(ChangeKind.RECORDS_ADDED, [record.ledger_id], record_ids=[record_id], count=1)
         return record
     
-    def get_latest_asset_records(self) -> List[AssetRecord]:
-        """获取每个账本的最新记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def add_asset_records(self, records: List[AssetRecord]) -> List[AssetRecord]:
+        """在一个事务中添加多条资产记录（如一次盘点的全部账本），要么全部成功要么全部失败"""
+        record_ids = []
+        with self._write() as cursor:
+            for record in records:
+                cursor.execute('''
+                    INSERT INTO asset_records (ledger_id, amount, note, period, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (record.ledger_id, record.amount, record.note, record.period, to_epoch(record.created_at or datetime.now())))
+                record_ids.append(cursor.lastrowid)
+            if record_ids:
+                self._log_change(cursor, ChangeKind.RECORDS_ADDED,
+                                 first_record_id=record_ids[0], last_record_id=record_ids[-1])
         
-
-        cursor.execute('''
-                SELECT ar.id, ar.ledger_id, ar.amount, ar.note, ar.period, ar.created_at
-                FROM asset_records ar
-                INNER JOIN (
-                    SELECT ledger_id, MAX(created_at) as max_date
-                    FROM asset_records
-                    GROUP BY ledger_id
-                ) latest ON ar.ledger_id = latest.ledger_id AND ar.created_at = latest.max_date
-            ''')
-
-
+        # 提交成功后再回填 id
+        for record, record_id in zip(records, record_ids):
+            record.id = record_id
+        if records:
+            self._publish(ChangeKind.RECORDS_ADDED, sorted({r.ledger_id for r in records}),
+                          record_ids=record_ids, count=len(records))
+        return records
+    
+    def add_asset_records_bulk(self, records: Iterable[AssetRecord], chunk_size: int = 5000,
+                               skip_duplicates: bool = False, origin: Optional[str] = None) -> int:
+        """批量添加资产记录，返回实际插入的条数
         
-        rows = cursor.fetchall()
-        conn.close()
+        records 可以是生成器，按 chunk_size 分块读取，每块在一个事务中用 executemany 写入，
+        内存占用与总条数无关。skip_duplicates 为 True 时跳过同一账本同一时间已存在的记录
+        （包括同一批中较早出现的记录）。批量写入不会回填 record.id。
+        origin 为同步来源数据库的标识，本机操作为 None。
+        """
+        if skip_duplicates:
+            sql = '''
+                INSERT INTO asset_records (ledger_id, amount, note, period, created_at)
+                SELECT ?, ?, ?, ?, ?
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM asset_records WHERE ledger_id = ? AND created_at = ?
+                )
+            '''
+        else:
+            sql = '''
+                INSERT INTO asset_records (ledger_id, amount, note, period, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            '''
         
-        return [AssetRecord(id=row[0], ledger_id=row[1], amount=row[2], 
-                           note=row[3], period=row[4], created_at=datetime.fromisoformat(row[5])) for row in rows]
+        def params(chunk):
+            for record in chunk:
+                created_at = to_epoch(record.created_at or datetime.now())
+                row = (record.ledger_id, record.amount, record.note, record.period, created_at)
+                yield row + (record.ledger_id, created_at) if skip_duplicates else row
+        
+        inserted = 0
+        iterator = iter(records)
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                break
+            with self._write() as cursor:
+                if self.fts_available:
+                    # 整块插入后一次建全文索引，比逐行触发快得多；
+                    # 暂停标志只在本事务内为 1，其他连接看不到
+                    cursor.execute('UPDATE search_index_state SET deferred = 1')
+                cursor.execute('SELECT COALESCE(MAX(id), 0) FROM asset_records')
+                last_id = cursor.fetchone()[0]
+                cursor.executemany(sql, params(chunk))
+                chunk_inserted = cursor.rowcount
+                if self.fts_available:
+                    migrations.index_new_records(cursor, last_id)
+                    cursor.execute('UPDATE search_index_state SET deferred = 0')
+                if chunk_inserted:
+                    # 写锁内没有其他写入，本块的 id 是 last_id 之后连续分配的
+                    cursor.execute('SELECT MAX(id) FROM asset_records')
+                    self._log_change(cursor, ChangeKind.RECORDS_ADDED, first_record_id=last_id + 1,
+                                     last_record_id=cursor.fetchone()[0], origin=origin)
+            inserted += chunk_inserted
+            if chunk_inserted:
+                self._publish(ChangeKind.RECORDS_ADDED, sorted({r.ledger_id for r in chunk}),
+                              count=chunk_inserted)
+        return inserted
+    
+    @cached("records")
+    def get_latest_asset_records(self) -> List[AssetRecord]:
+        """获取每个账本的最新记录"""
+        # ledger_balances 由触发器维护，每个账本恰好一行
+        with self._read() as cursor:
+            cursor.execute('''
+                    SELECT ar.id, ar.ledger_id, ar.amount, ar.note, ar.period, ar.created_at
+                    FROM ledger_balances lb
+                    INNER JOIN asset_records ar ON ar.id = lb.record_id
+                ''')
+            rows = cursor.fetchall()
+        
+        return decode_records(rows)
     
+    @cached("records:{ledger_id}")
     def get_ledger_history(self, ledger_id: int) -> List[AssetRecord]:
         """获取账本历史记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-       
+        with self._read() as cursor:
+            cursor.execute('''
+                    SELECT id, ledger_id, amount, note, period, created_at
+                    FROM asset_records
+                    WHERE ledger_id = ?
+                    ORDER BY created_at DESC
+                ''', (ledger_id,))
+            rows = cursor.fetchall()
         
-        cursor.execute('''
-                SELECT id, ledger_id, amount, note, period, created_at
-                FROM asset_records
-                WHERE ledger_id = ?
-                ORDER BY created_at DESC
-            ''', (ledger_id,))
+        return decode_records(rows)
+    
+    @cached("ledgers", "records")
+    def get_recent_history(self, per_ledger: int = 8) -> List[LedgerTrend]:
+        """一次查询获取每个账本最近 per_ledger 条记录
+        
+        每个账本的数据按时间升序排列，没有记录的账本不出现在结果中。
+        """
+        with self._read() as cursor:
+            cursor.execute('''
+                    SELECT l.id, l.name, l.description, l.created_at,
+                           r.amount, r.period, r.created_at
+                    FROM (
+                        SELECT ledger_id, id, amount, period, created_at,
+                               ROW_NUMBER() OVER (PARTITION BY ledger_id
+                                                  ORDER BY created_at DESC, id DESC) AS rn
+                        FROM asset_records
+                    ) r
+                    INNER JOIN ledgers l ON l.id = r.ledger_id
+                    WHERE r.rn <= ?
+                    ORDER BY l.id, r.created_at, r.id
+                ''', (per_ledger,))
+            rows = cursor.fetchall()
         
-        rows = cursor.fetchall()
-        conn.close()
+        decode = _epoch_decoder()
+        trends = []
+        for row in rows:
+            if not trends or trends[-1].ledger.id != row[0]:
+                ledger = Ledger(id=row[0], name=row[1], description=row[2],
+                                created_at=decode(row[3]))
+                trends.append(LedgerTrend(ledger=ledger, created_at=[], amounts=[], periods=[]))
+            trend = trends[-1]
+            trend.amounts.append(row[4])
+            trend.periods.append(row[5])
+            trend.created_at.append(decode(row[6]))
         
-        return [AssetRecord(id=row[0], ledger_id=row[1], amount=row[2], 
-                           note=row[3], period=row[4], created_at=datetime.fromisoformat(row[5])) for row in rows]
+        return trends
     
+    @cached("ledgers", "records")
     def get_ledger_summaries(self) -> List[LedgerSummary]:
-        """获取账本统计信息"""
-        ledgers = self.get_all_ledgers()
-        latest_records = self.get_latest_asset_records()
+        """获取账本统计信息（当前金额、上次金额、变化、占比、记录数、最后更新时间）"""
+        # 每个账本只取最近两条记录（沿 (ledger_id, created_at) 索引倒序读取），再用窗口函数
+        # 得到上次金额和占比，不需要对全部历史做窗口计算；记录数只在覆盖索引上计数。
+        # 时间相同的记录按 id 排序，后写入的算作更新的一条。
+        with self._read() as cursor:
+            cursor.execute('''
+                    WITH recent AS (
+                        SELECT r.ledger_id, r.id, r.amount, r.created_at
+                        FROM ledgers l
+                        JOIN asset_records r ON r.id IN (
+                            SELECT id FROM asset_records
+                            WHERE ledger_id = l.id
+                            ORDER BY created_at DESC, id DESC
+                            LIMIT 2)
+                    ), latest AS (
+                        SELECT ledger_id, amount, created_at,
+                               LAG(amount) OVER (PARTITION BY ledger_id ORDER BY created_at, id) AS previous_amount,
+                               ROW_NUMBER() OVER (PARTITION BY ledger_id ORDER BY created_at DESC, id DESC) AS rn
+                        FROM recent
+                    )
+                    SELECT l.id, l.name, l.description, l.created_at,
+                           COALESCE(r.amount, 0.0),
+                           r.previous_amount,
+                           r.amount - r.previous_amount,
+                           CASE WHEN SUM(COALESCE(r.amount, 0.0)) OVER () > 0
+                                THEN COALESCE(r.amount, 0.0) * 100.0 / SUM(COALESCE(r.amount, 0.0)) OVER ()
+                                ELSE 0.0 END,
+                           (SELECT COUNT(*) FROM asset_records WHERE ledger_id = l.id),
+                           r.created_at
+                    FROM ledgers l
+                    LEFT JOIN latest r ON r.ledger_id = l.id AND r.rn = 1
+                    ORDER BY l.id
+                ''')
+            rows = cursor.fetchall()
         
-        # 创建ledger_id到最新记录的映射
-        record_map = {record.ledger_id: record for record in latest_records}
+        decode = _epoch_decoder()
+        return [LedgerSummary(ledger=ledger, current_amount=row[4], percentage=row[7],
+                              previous_amount=row[5], delta=row[6], record_count=row[8],
+                              last_updated=None if row[9] is None else decode(row[9]))
+                for ledger, row in zip(decode_ledgers(rows), rows)]
+    
+    def rebuild_ledger_balances(self):
+        """根据全部历史记录重建账本余额快照"""
+        with self._write() as cursor:
+            migrations.rebuild_ledger_balances(cursor)
+        self.cache.clear()
+    
+    @cached("records")
+    def get_all_records(self) -> List[AssetRecord]:
+        """获取所有资产记录"""
+        with self._read() as cursor:
+            cursor.execute('''
+                    SELECT id, ledger_id, amount, note, period, created_at
+                    FROM asset_records
+                    ORDER BY created_at DESC
+                ''')
+            rows = cursor.fetchall()
         
-        # 计算总资产
-        total_amount = sum(record.amount for record in latest_records)
+        return decode_records(rows)
+    
+    def iter_records(self, after: Optional[Tuple[datetime, int]] = None,
+                     limit: Optional[int] = None, page_size: int = 500,
+                     record_filter: Optional[RecordFilter] = None) -> Iterator[AssetRecord]:
+        """按时间倒序逐页读取资产记录
         
-        # 构建账本统计信息
-        summaries = []
-        for ledger in ledgers:
-            current_amount = record_map.get(ledger.id, AssetRecord(None, ledger.id, 0.0, "", "", datetime.now())).amount
-            percentage = (current_amount / total_amount * 100) if total_amount > 0 else 0
+        after 为上一页最后一条记录的 (created_at, id)，只返回排在它之后的记录；
+        limit 为最多返回的条数；record_filter 为筛选条件，在 SQL 中完成筛选。
+        使用键集分页，每页都走 created_at 索引，不会像 OFFSET 那样随页码变慢，
+        也不会一次性把全部记录读入内存。
+        """
+        conditions, params = filter_conditions(record_filter, self.fts_available)
+        key = None if after is None else (to_epoch(after[0]), after[1])
+        remaining = limit
+        while remaining is None or remaining > 0:
+            count = page_size if remaining is None else min(page_size, remaining)
+            page_conditions = conditions if key is None else conditions + ['(created_at, id) < (?, ?)']
+            page_params = params if key is None else params + list(key)
+            where = ('WHERE ' + ' AND '.join(page_conditions)) if page_conditions else ''
+            with self._read() as cursor:
+                cursor.execute(f'''
+                        SELECT id, ledger_id, amount, note, period, created_at
+                        FROM asset_records
+                        {where}
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT ?
+                    ''', page_params + [count])
+                rows = cursor.fetchall()
+            
+            yield from decode_records(rows)
             
-            summaries.append(LedgerSummary(
-                ledger=ledger,
-                current_amount=current_amount,
-                percentage=percentage
-            ))
+            if len(rows) < count:
+                return
+            if remaining is not None:
+                remaining -= len(rows)
+            key = (rows[-1][5], rows[-1][0])
+    
+    @cached("records")
+    def count_records(self, record_filter: Optional[RecordFilter] = None) -> int:
+        """符合筛选条件的记录条数"""
+        conditions, params = filter_conditions(record_filter, self.fts_available)
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+        with self._read() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM asset_records {where}', params)
+            return cursor.fetchone()[0]
+    
+    @cached("records")
+    def get_periods(self) -> List[str]:
+        """所有出现过的盘点周期（按名称倒序，较新的周期在前）"""
+        with self._read() as cursor:
+            cursor.execute('''
+                    SELECT DISTINCT period FROM asset_records
+                    WHERE period IS NOT NULL AND period != ''
+                    ORDER BY period DESC
+                ''')
+            return [row[0] for row in cursor.fetchall()]
+    
+    def get_record_batch(self, ledger_id: Optional[int] = None, start: Optional[datetime] = None,
+                         end: Optional[datetime] = None, chunk_size: int = 65536, text: bool = True):
+        """以列式 RecordBatch 返回记录（按时间升序），用于分析计算
+        
+        可按账本和时间范围 [start, end) 过滤。行按 chunk_size 分块读取并转换为数组，
+        不会为每条记录创建 AssetRecord 对象。text 为 False 时不读取备注和盘点周期
+        （均为空字符串），只需要金额和时间的计算用这种方式更快。需要 numpy。
+        """
+        from batch import RecordBatch
         
-        return summaries
+        record_filter = RecordFilter(ledger_id=ledger_id, start=start, end=end)
+        if text:
+            return RecordBatch.from_row_chunks(self.iter_record_chunks(record_filter, chunk_size))
+        conditions, params = filter_conditions(record_filter, self.fts_available)
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+        with self._read() as cursor:
+            cursor.execute(f'''
+                    SELECT id, ledger_id, amount, created_at
+                    FROM asset_records
+                    {where}
+                    ORDER BY created_at, id
+                ''', params)
+            return RecordBatch.from_numeric_chunks(iter(lambda: cursor.fetchmany(chunk_size), []))
     
-    def get_all_records(self) -> List[AssetRecord]:
-        """获取所有资产记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def iter_record_chunks(self, record_filter: Optional[RecordFilter] = None,
+                           chunk_size: int = 65536) -> Iterator[List[tuple]]:
+        """按时间升序分块返回原始行 (id, ledger_id, amount, note, period, created_at 时间戳)
+        
+        全程使用同一个游标逐块读取，结果来自同一个快照，内存占用只与 chunk_size 有关，
+        用于导出等需要顺序处理全部记录的场景。读完或关闭生成器之前一直占用一个读连接。
+        """
+        conditions, params = filter_conditions(record_filter, self.fts_available)
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+        
+        with self._read() as cursor:
+            cursor.execute(f'''
+                    SELECT id, ledger_id, amount, note, period, created_at
+                    FROM asset_records
+                    {where}
+                    ORDER BY created_at, id
+                ''', params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+    
+    def iter_record_range(self, first_id: int, last_id: int,
+                          chunk_size: int = 65536) -> Iterator[List[tuple]]:
+        """按 id 升序分块返回 id 在 [first_id, last_id] 内的原始行 (id, ledger_name, amount, note, period, created_at 时间戳)
+        
+        用于按变更日志导出新增的记录，账本以名称表示。
+        """
+        with self._read() as cursor:
+            cursor.execute('''
+                    SELECT r.id, l.name, r.amount, r.note, r.period, r.created_at
+                    FROM asset_records r
+                    JOIN ledgers l ON l.id = r.ledger_id
+                    WHERE r.id BETWEEN ? AND ?
+                    ORDER BY r.id
+                ''', (first_id, last_id))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+    
+    def get_changes(self, after_seq: int = 0, local_only: bool = True) -> List[ChangeLogEntry]:
+        """seq 大于 after_seq 的变更日志（按 seq 升序）；local_only 为 True 时只返回本机的修改"""
+        with self._read() as cursor:
+            cursor.execute(f'''
+                    SELECT seq, kind, ledger_id, ledger_name, first_record_id, last_record_id, origin
+                    FROM change_log
+                    WHERE seq > ? {'AND origin IS NULL' if local_only else ''}
+                    ORDER BY seq
+                ''', (after_seq,))
+            rows = cursor.fetchall()
+        return [ChangeLogEntry(seq=row[0], kind=ChangeKind(row[1]), ledger_id=row[2], ledger_name=row[3],
+                               first_record_id=row[4], last_record_id=row[5], origin=row[6])
+                for row in rows]
+    
+    def get_last_change_seq(self) -> int:
+        """变更日志中最大的 seq，没有日志时为 0"""
+        with self._read() as cursor:
+            cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log')
+            return cursor.fetchone()[0]
+    
+    def get_sync_peers(self) -> List[SyncPeer]:
+        """同步过的其他数据库及水位"""
+        with self._read() as cursor:
+            cursor.execute('SELECT peer_id, log_id, received_seq, acked_seq, synced_at FROM sync_peers '
+                           'ORDER BY peer_id')
+            rows = cursor.fetchall()
+        return [SyncPeer(peer_id=row[0], log_id=row[1], received_seq=row[2], acked_seq=row[3],
+                         synced_at=None if row[4] is None else from_epoch(row[4]))
+                for row in rows]
+    
+    def save_sync_peer(self, peer: SyncPeer):
+        """保存同步水位（不存在时新增）"""
+        with self._write() as cursor:
+            cursor.execute('''
+                INSERT INTO sync_peers (peer_id, log_id, received_seq, acked_seq, synced_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (peer_id) DO UPDATE SET
+                    log_id = excluded.log_id,
+                    received_seq = excluded.received_seq,
+                    acked_seq = excluded.acked_seq,
+                    synced_at = excluded.synced_at
+            ''', (peer.peer_id, peer.log_id, peer.received_seq, peer.acked_seq,
+                  None if peer.synced_at is None else to_epoch(peer.synced_at)))
+    
+    def save_write_id(self, write_id: str):
+        """记录本机最近一次写出的变更文件的标识"""
+        with self._write() as cursor:
+            cursor.execute('UPDATE sync_state SET write_id = ?', (write_id,))
+        self.write_id = write_id
+    
+    def reset_database_id(self) -> str:
+        """重新生成数据库标识并清空同步水位（复制出的数据库文件与原文件标识相同，需要先重置）
+        
+        变更日志改为从头开始：现有的全部账本和记录都作为本机修改，下次同步时完整发送一次。
+        """
+        with self._write() as cursor:
+            cursor.execute('UPDATE sync_state SET database_id = lower(hex(randomblob(16)))')
+            cursor.execute('DELETE FROM sync_peers')
+            self._restart_change_log(cursor)
+            cursor.execute('SELECT database_id FROM sync_state')
+            self.database_id = cursor.fetchone()[0]
+        return self.database_id
+    
+    def restart_change_log(self):
+        """重新开始变更日志：现有的全部账本和记录都作为本机修改，下次同步时完整发送给所有对方
 
-        cursor.execute('''
-                SELECT id, ledger_id, amount, note, period, created_at
-                FROM asset_records
-                ORDER BY created_at DESC
-            ''')
+        用于数据库回退到旧状态之后（如被旧副本覆盖），回退后新写的修改会沿用对方已收到过的 seq。
+        新日志换用新的 log_id，对方发现 log_id 变化后从头重新应用，不再按 seq 跳过。
+        """
+        with self._write() as cursor:
+            self._restart_change_log(cursor)
+    
+    def _restart_change_log(self, cursor):
+        cursor.execute('DELETE FROM change_log')
+        migrations.log_existing_data(cursor)
+        # 对方的确认针对的是旧日志
+        cursor.execute('UPDATE sync_peers SET acked_seq = 0')
+        cursor.execute('UPDATE sync_state SET log_id = lower(hex(randomblob(16))), write_id = NULL')
+        cursor.execute('SELECT log_id, write_id FROM sync_state')
+        self.log_id, self.write_id = cursor.fetchone()
+    
+    @cached("ledgers", "records")
+    def get_resampled_balances(self, freq: str = "month", start: Optional[datetime] = None,
+                               end: Optional[datetime] = None):
+        """各账本和总资产按日/月/季度/年重采样的余额（analytics.ResampledBalances）
         
-        rows = cursor.fetchall()
-        conn.close()
+        每个周期取周期结束前最后一条记录的金额。结果在数据变化前一直缓存，
+        调用方不能修改（数组为只读）。需要 numpy。
+        """
+        import analytics
+        return analytics.resample(*self.get_record_batch(text=False).balance_columns(), freq=freq,
+                                  start=None if start is None else to_epoch(start),
+                                  end=None if end is None else to_epoch(end))
+    
+    @cached("ledgers", "records")
+    def get_net_worth_curve(self):
+        """每个记录时间点的总资产（analytics.NetWorthCurve，各账本截至该时刻的最新金额之和）
+        
+        结果在数据变化前一直缓存，调用方不能修改。需要 numpy。
+        """
+        import analytics
+        return analytics.net_worth(*self.get_record_batch(text=False).balance_columns())
+    
+    @cached("ledgers", "records")
+    def get_ledger_series(self):
+        """各账本的全部记录（List[analytics.LedgerSeries]，列式、按时间升序），用于绘制完整走势
         
-        return [AssetRecord(id=row[0], ledger_id=row[1], amount=row[2], 
-                           note=row[3], period=row[4], created_at=datetime.fromisoformat(row[5])) for row in rows]
\ No newline at end of file
+        结果在数据变化前一直缓存，调用方不能修改。需要 numpy。
+        """
+        import analytics
+        return analytics.split_by_ledger(*self.get_record_batch(text=False).balance_columns())
@@ -1,12 +1,54 @@
 # easyAccounting.py
-from ui import MainWindow
-from PySide6.QtWidgets import QApplication
+import importlib
 import sys
+import startup
+import profiling
+
+# 子命令 -> 模块（模块提供 main(argv) -> 退出码）
+COMMANDS = {
+    "backup": "backup",
+    "report": "report",
+    "export": "exporter",
+    "import": "importer",
+    "sync": "sync",
+}
 
 def main():
+    # 命令行子命令不需要界面，在导入 Qt 之前分派
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        module = importlib.import_module(COMMANDS[sys.argv[1]])
+        sys.exit(module.main(sys.argv[2:]))
+
+    timer = None
+    if startup.enabled():
+        timer = startup.StartupTimer()
+        timer.install_import_hook()
+
+    # 图表相关的模块在第一次打开资产统计页面时才导入
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtCore import QTimer
+    from ui import MainWindow
+    if timer:
+        timer.mark("导入界面模块")
+
+    # 开启性能剖析且设置了 EASYACCOUNTING_PROFILE_OUTPUT 时，退出时保存统计结果
+    if profiling.PROFILER.enabled:
+        profiling.dump_on_exit()
+
     app = QApplication(sys.argv)
     window = MainWindow()
+    if timer:
+        timer.mark("创建主窗口")
     window.show()
+
+    if timer:
+        def first_frame():
+            timer.mark("首帧显示")
+            timer.remove_import_hook()
+            print(timer.report(), file=sys.stderr)
+        # 事件循环处理完首次绘制后执行
+        QTimer.singleShot(0, first_frame)
+
     sys.exit(app.exec())
 
 if __name__ == "__main__":
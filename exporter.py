@@ -0,0 +1,339 @@
+# exporter.py
+"""把资产记录流式导出为 CSV、JSON Lines 或列式文件
+
+记录按时间升序从同一个游标分块读取（Database.iter_record_chunks），每块转换后立即写出，
+内存占用只与块大小有关，与记录总数无关。可按账本、时间范围和关键词筛选。
+
+支持的格式（默认按文件扩展名判断）:
+  csv      表头与导入的默认列名一致（账本、金额、时间、盘点周期、备注），可直接重新导入
+  jsonl    每行一个 JSON 对象
+  parquet  需要安装 pyarrow，每块写成一个行组
+  npz      NumPy 数组（np.load 读取），字符串列保存为 UTF-8 字节和偏移量，见 decode_strings
+  columnar 已安装 pyarrow 时为 parquet，否则为 npz
+
+命令行用法:
+    python exporter.py records.csv [--db accounting.db] [--ledger 账本] [--start 2024-01-01] [--end 2025-01-01]
+    python -m easyAccounting export records.parquet --format columnar
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from database import Database
+from importer import ColumnMapping, parse_datetime
+from models import RecordFilter
+
+FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".parquet": "parquet",
+    ".npz": "npz",
+}
+
+CHUNK_SIZE = 65536
+
+# 写文件时的缓冲区大小
+BUFFER_SIZE = 1 << 20
+
+
+class ExportFormatError(Exception):
+    """导出格式不支持或缺少依赖"""
+
+
+@dataclass
+class ExportResult:
+    """导出结果统计"""
+    path: str
+    format: str
+    rows: int = 0
+    bytes: int = 0
+
+
+def has_pyarrow() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_format(path: str, fmt: Optional[str] = None) -> str:
+    """确定导出格式：未指定时按扩展名判断，columnar 按是否安装 pyarrow 选择 parquet 或 npz"""
+    if fmt == "columnar":
+        return "parquet" if has_pyarrow() else "npz"
+    if fmt:
+        if fmt not in FORMATS.values():
+            raise ExportFormatError(f"不支持的格式: {fmt}")
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ExportFormatError(f"无法从扩展名判断导出格式: {ext or '（无）'}，请用 --format 指定")
+    return FORMATS[ext]
+
+
+def _timestamps(rows: List[tuple]) -> List[str]:
+    """把一块记录的时间戳批量格式化为 ISO 格式文本（与 database.from_epoch 一致，不带时区）"""
+    epochs = np.fromiter((row[5] for row in rows), dtype=np.int64, count=len(rows))
+    return np.datetime_as_string(epochs.astype("datetime64[s]"), unit="s").tolist()
+
+
+def write_csv(path: str, chunks: Iterable[List[tuple]], names: Dict[int, str]):
+    import csv
+
+    columns = ColumnMapping()
+    # 与导入一致使用带 BOM 的 UTF-8，Excel 可直接打开
+    with open(path, "w", encoding="utf-8-sig", newline="", buffering=BUFFER_SIZE) as f:
+        writer = csv.writer(f)
+        writer.writerow([columns.ledger, columns.amount, columns.created_at, columns.period, columns.note])
+        for rows in chunks:
+            writer.writerows((names.get(row[1], ""), row[2], created_at, row[4] or "", row[3] or "")
+                             for row, created_at in zip(rows, _timestamps(rows)))
+
+
+def write_jsonl(path: str, chunks: Iterable[List[tuple]], names: Dict[int, str]):
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    ledgers = {ledger_id: encode(name) for ledger_id, name in names.items()}
+    with open(path, "w", encoding="utf-8", buffering=BUFFER_SIZE) as f:
+        for rows in chunks:
+            # 数字字段直接格式化，只有字符串需要 JSON 转义
+            f.write("".join(
+                f'{{"id":{row[0]},"ledger_id":{row[1]},"ledger":{ledgers.get(row[1], "null")},'
+                f'"amount":{row[2]!r},"created_at":"{created_at}",'
+                f'"period":{encode(row[4] or "")},"note":{encode(row[3] or "")}}}\n'
+                for row, created_at in zip(rows, _timestamps(rows))))
+
+
+def write_parquet(path: str, chunks: Iterable[List[tuple]], names: Dict[int, str]):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportFormatError("导出 parquet 需要安装 pyarrow: pip install pyarrow，或改用 npz 格式")
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("ledger_id", pa.int64()),
+        ("ledger", pa.string()),
+        ("amount", pa.float64()),
+        ("created_at", pa.timestamp("s")),
+        ("period", pa.string()),
+        ("note", pa.string()),
+    ])
+    writer = pq.ParquetWriter(path, schema)
+    try:
+        for rows in chunks:
+            ids, ledger_ids, amounts, notes, periods, created_at = zip(*rows)
+            writer.write_table(pa.Table.from_arrays([
+                pa.array(ids, pa.int64()),
+                pa.array(ledger_ids, pa.int64()),
+                pa.array([names.get(i, "") for i in ledger_ids], pa.string()),
+                pa.array(amounts, pa.float64()),
+                pa.array(np.array(created_at, dtype=np.int64).astype("datetime64[s]"), pa.timestamp("s")),
+                pa.array([p or "" for p in periods], pa.string()),
+                pa.array([n or "" for n in notes], pa.string()),
+            ], schema=schema))
+    finally:
+        writer.close()
+
+
+class _ColumnSpool:
+    """把一列数组逐块追加到临时文件，最后作为 .npy 写入 npz
+
+    .npy 的文件头里要写总长度，而导出完成前不知道记录条数，所以先写临时文件。
+    """
+    def __init__(self, dtype, directory: str):
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self.file = tempfile.TemporaryFile(dir=directory)
+
+    def append(self, values: np.ndarray):
+        self.file.write(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+        self.length += len(values)
+
+    def copy_to(self, archive: zipfile.ZipFile, name: str):
+        from numpy.lib import format as npy
+
+        self.file.flush()
+        self.file.seek(0)
+        with archive.open(name + ".npy", "w", force_zip64=True) as out:
+            npy.write_array_header_2_0(out, {"descr": npy.dtype_to_descr(self.dtype),
+                                             "fortran_order": False, "shape": (self.length,)})
+            shutil.copyfileobj(self.file, out, BUFFER_SIZE)
+
+    def close(self):
+        self.file.close()
+
+
+class _StringSpool:
+    """字符串列：UTF-8 字节依次相连保存在 <name>_data，第 i 个字符串为 data[offsets[i]:offsets[i + 1]]"""
+    def __init__(self, directory: str):
+        self.offsets = _ColumnSpool(np.int64, directory)
+        self.data = _ColumnSpool(np.uint8, directory)
+        self.offsets.append(np.zeros(1, np.int64))
+
+    def append(self, values: Iterable[Optional[str]]):
+        encoded = [(value or "").encode("utf-8") for value in values]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        self.offsets.append(self.data.length + np.cumsum(lengths))
+        self.data.append(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    def copy_to(self, archive: zipfile.ZipFile, name: str):
+        self.offsets.copy_to(archive, name + "_offsets")
+        self.data.copy_to(archive, name + "_data")
+
+    def close(self):
+        self.offsets.close()
+        self.data.close()
+
+
+def decode_strings(offsets: np.ndarray, data: np.ndarray) -> List[str]:
+    """还原 npz 中的字符串列，如 decode_strings(f["note_offsets"], f["note_data"])"""
+    raw = data.tobytes()
+    bounds = offsets.tolist()
+    return [raw[start:end].decode("utf-8") for start, end in zip(bounds, bounds[1:])]
+
+
+def write_npz(path: str, chunks: Iterable[List[tuple]], names: Dict[int, str], compress: bool = False):
+    """各列先追加到输出目录下的临时文件，全部读完后再依次写入 npz"""
+    directory = os.path.dirname(os.path.abspath(path))
+    columns = {
+        "id": _ColumnSpool(np.int64, directory),
+        "ledger_id": _ColumnSpool(np.int64, directory),
+        "amount": _ColumnSpool(np.float64, directory),
+        "created_at": _ColumnSpool("datetime64[s]", directory),
+        "period": _StringSpool(directory),
+        "note": _StringSpool(directory),
+    }
+    try:
+        for rows in chunks:
+            ids, ledger_ids, amounts, notes, periods, created_at = zip(*rows)
+            columns["id"].append(np.array(ids, dtype=np.int64))
+            columns["ledger_id"].append(np.array(ledger_ids, dtype=np.int64))
+            columns["amount"].append(np.array(amounts, dtype=np.float64))
+            columns["created_at"].append(np.array(created_at, dtype=np.int64).astype("datetime64[s]"))
+            columns["period"].append(periods)
+            columns["note"].append(notes)
+
+        compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        with zipfile.ZipFile(path, "w", compression=compression, allowZip64=True) as archive:
+            for name, column in columns.items():
+                column.copy_to(archive, name)
+            # 账本名称表：ledger_names[i] 为 id 等于 ledger_ids[i] 的账本
+            for name, array in (("ledger_ids", np.array(list(names), dtype=np.int64)),
+                                ("ledger_names", np.array(list(names.values()), dtype=str))):
+                with archive.open(name + ".npy", "w") as out:
+                    np.lib.format.write_array(out, array, allow_pickle=False)
+    finally:
+        for column in columns.values():
+            column.close()
+
+
+def _counted(chunks: Iterable[List[tuple]], result: ExportResult) -> Iterator[List[tuple]]:
+    for rows in chunks:
+        result.rows += len(rows)
+        yield rows
+
+
+def export_records(db: Database, path: str, fmt: Optional[str] = None,
+                   record_filter: Optional[RecordFilter] = None, chunk_size: int = CHUNK_SIZE,
+                   compress: bool = False) -> ExportResult:
+    """流式导出记录
+
+    先写入同目录下的临时文件，完成后再替换目标文件，导出失败时不会留下不完整的文件。
+    compress 只对 npz 有效（parquet 使用 pyarrow 的默认压缩）。
+    """
+    fmt = resolve_format(path, fmt)
+    result = ExportResult(path=path, format=fmt)
+    names = {ledger.id: ledger.name for ledger in db.get_all_ledgers()}
+    source = db.iter_record_chunks(record_filter, chunk_size)
+    chunks = _counted(source, result)
+
+    partial = path + ".part"
+    try:
+        if fmt == "csv":
+            write_csv(partial, chunks, names)
+        elif fmt == "jsonl":
+            write_jsonl(partial, chunks, names)
+        elif fmt == "parquet":
+            write_parquet(partial, chunks, names)
+        else:
+            write_npz(partial, chunks, names, compress)
+        os.replace(partial, path)
+    except BaseException:
+        # 提前结束时立即归还读连接
+        source.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    result.bytes = os.path.getsize(path)
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="easyAccounting export", description="流式导出资产记录")
+    parser.add_argument("output", help="输出文件（.csv/.jsonl/.parquet/.npz）")
+    parser.add_argument("--db", default="accounting.db", help="数据库文件")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())) + ["columnar"],
+                        help="导出格式，默认按扩展名判断")
+    parser.add_argument("--ledger", help="只导出该账本（名称）")
+    parser.add_argument("--start", help="起始时间（包含），如 2024-01-01")
+    parser.add_argument("--end", help="结束时间（不包含）")
+    parser.add_argument("--search", default="", help="在备注和盘点周期中搜索的关键词")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="每次读取的记录条数")
+    parser.add_argument("--compress", action="store_true", help="压缩 npz")
+    args = parser.parse_args(argv)
+
+    output = args.output
+    if args.format == "columnar":
+        # 按实际选用的格式修改扩展名
+        fmt = resolve_format(output, args.format)
+        output = os.path.splitext(output)[0] + "." + fmt
+    else:
+        fmt = args.format
+    if not os.path.isfile(args.db):
+        print(f"数据库不存在: {args.db}", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    # 只读打开：导出不迁移、不改变数据库文件的日志模式
+    try:
+        db = Database(args.db, read_pool_size=1, cache_size=0, readonly=True)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    with db:
+        try:
+            ledger_id = None
+            if args.ledger:
+                ledgers = {ledger.name: ledger.id for ledger in db.get_all_ledgers()}
+                if args.ledger not in ledgers:
+                    print(f"账本不存在: {args.ledger}", file=sys.stderr)
+                    return 1
+                ledger_id = ledgers[args.ledger]
+            record_filter = RecordFilter(ledger_id=ledger_id,
+                                         start=parse_datetime(args.start) if args.start else None,
+                                         end=parse_datetime(args.end) if args.end else None,
+                                         text=args.search)
+            result = export_records(db, output, fmt, record_filter, args.chunk_size, args.compress)
+        except (ExportFormatError, ValueError) as e:
+            print(e, file=sys.stderr)
+            return 1
+
+    elapsed = time.perf_counter() - started
+    print(f"已导出 {result.rows} 条记录到 {result.path}（{result.format}，{result.bytes / 1e6:.1f} MB，"
+          f"用时 {elapsed:.1f} 秒）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+# importer.py
+"""从银行/券商导出的 CSV、XLSX 文件批量导入资产记录
+
+文件按行流式读取，经生成器转换后分块写入数据库，内存占用与文件大小无关。
+不存在的账本按名称自动创建，同一账本同一时间已有记录的行会被跳过。
+
+命令行用法:
+    python importer.py records.csv [--db accounting.db] [--ledger 账本] [--amount 金额] ...
+"""
+import argparse
+import csv
+import os
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from database import Database
+from models import AssetRecord, Ledger
+
+
+class ImportFormatError(Exception):
+    """导入文件格式错误"""
+
+
+@dataclass
+class ColumnMapping:
+    """文件列名与记录字段的对应关系，默认与历史记录表格的表头一致"""
+    ledger: str = "账本"
+    amount: str = "金额"
+    created_at: str = "时间"
+    period: Optional[str] = "盘点周期"
+    note: Optional[str] = "备注"
+    date_format: Optional[str] = None  # 为 None 时按 ISO 格式解析（允许 / 分隔）
+
+
+@dataclass
+class ImportResult:
+    """导入结果统计"""
+    rows: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    ledgers_created: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)  # 只保留前 MAX_ERRORS 条
+    error_count: int = 0
+
+
+MAX_ERRORS = 100
+
+
+def iter_csv_rows(path: str, encoding: str = "utf-8-sig", delimiter: str = ",") -> Iterator[Dict[str, object]]:
+    """逐行读取 CSV，第一行为表头"""
+    with open(path, newline="", encoding=encoding) as f:
+        yield from csv.DictReader(f, delimiter=delimiter)
+
+
+def iter_xlsx_rows(path: str, sheet: Optional[str] = None) -> Iterator[Dict[str, object]]:
+    """以只读模式逐行读取 XLSX，第一行为表头（需要安装 openpyxl）"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError("读取 xlsx 文件需要安装 openpyxl: pip install openpyxl")
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h).strip() if h is not None else "" for h in header]
+        for values in rows:
+            if values is None or all(v is None for v in values):
+                continue
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def iter_rows(path: str, **options) -> Iterator[Dict[str, object]]:
+    """按扩展名选择读取方式"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".xlsx", ".xlsm"):
+        return iter_xlsx_rows(path, **options)
+    if ext in (".csv", ".txt"):
+        return iter_csv_rows(path, **options)
+    raise ImportFormatError(f"不支持的文件类型: {ext}")
+
+
+def parse_amount(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().replace(",", "").replace("¥", "").replace("￥", "")
+    return float(text)
+
+
+def parse_datetime(value, date_format: Optional[str] = None) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    text = str(value).strip()
+    if date_format:
+        return datetime.strptime(text, date_format)
+    return datetime.fromisoformat(text.replace("/", "-"))
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def import_rows(db: Database, rows: Iterator[Dict[str, object]],
+                mapping: Optional[ColumnMapping] = None, create_ledgers: bool = True,
+                chunk_size: int = 5000) -> ImportResult:
+    """把行数据转换为资产记录并批量写入"""
+    mapping = mapping or ColumnMapping()
+    result = ImportResult()
+    ledger_ids = {ledger.name: ledger.id for ledger in db.get_all_ledgers()}
+
+    def error(line, message):
+        result.error_count += 1
+        if len(result.errors) < MAX_ERRORS:
+            result.errors.append(f"第 {line} 行: {message}")
+
+    def records():
+        # 第 1 行是表头
+        for line, row in enumerate(rows, start=2):
+            result.rows += 1
+            try:
+                name = _text(row.get(mapping.ledger))
+                if not name:
+                    raise ValueError("缺少账本名称")
+                amount = parse_amount(row.get(mapping.amount))
+                created_at = parse_datetime(row.get(mapping.created_at), mapping.date_format)
+            except (TypeError, ValueError) as e:
+                error(line, str(e))
+                continue
+
+            ledger_id = ledger_ids.get(name)
+            if ledger_id is None:
+                if not create_ledgers:
+                    error(line, f"账本不存在: {name}")
+                    continue
+                ledger = db.create_ledger(Ledger(id=None, name=name, description="", created_at=datetime.now()))
+                ledger_ids[name] = ledger_id = ledger.id
+                result.ledgers_created.append(name)
+
+            yield AssetRecord(
+                id=None,
+                ledger_id=ledger_id,
+                amount=amount,
+                note=_text(row.get(mapping.note)) if mapping.note else "",
+                period=_text(row.get(mapping.period)) if mapping.period else "",
+                created_at=created_at
+            )
+
+    result.inserted = db.add_asset_records_bulk(records(), chunk_size=chunk_size, skip_duplicates=True)
+    result.duplicates = result.rows - result.error_count - result.inserted
+    return result
+
+
+def import_file(db: Database, path: str, mapping: Optional[ColumnMapping] = None,
+                create_ledgers: bool = True, chunk_size: int = 5000, **options) -> ImportResult:
+    """流式导入 CSV/XLSX 文件"""
+    return import_rows(db, iter_rows(path, **options), mapping, create_ledgers, chunk_size)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    defaults = ColumnMapping()
+    parser = argparse.ArgumentParser(description="批量导入资产记录")
+    parser.add_argument("file", help="CSV 或 XLSX 文件")
+    parser.add_argument("--db", default="accounting.db", help="数据库文件")
+    parser.add_argument("--ledger", default=defaults.ledger, help="账本名称列")
+    parser.add_argument("--amount", default=defaults.amount, help="金额列")
+    parser.add_argument("--time", default=defaults.created_at, help="时间列")
+    parser.add_argument("--period", default=defaults.period, help="盘点周期列")
+    parser.add_argument("--note", default=defaults.note, help="备注列")
+    parser.add_argument("--date-format", default=None, help="时间格式，如 %%Y/%%m/%%d")
+    parser.add_argument("--no-create", action="store_true", help="不自动创建账本")
+    args = parser.parse_args(argv)
+
+    mapping = ColumnMapping(ledger=args.ledger, amount=args.amount, created_at=args.time,
+                            period=args.period or None, note=args.note or None,
+                            date_format=args.date_format)
+    with Database(args.db) as db:
+        try:
+            result = import_file(db, args.file, mapping, create_ledgers=not args.no_create)
+        except ImportFormatError as e:
+            print(e, file=sys.stderr)
+            return 1
+
+    print(f"读取 {result.rows} 行，导入 {result.inserted} 条，重复 {result.duplicates} 条，错误 {result.error_count} 条")
+    if result.ledgers_created:
+        print("新建账本: " + ", ".join(result.ledgers_created))
+    for message in result.errors:
+        print(message, file=sys.stderr)
+    return 0 if result.error_count == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
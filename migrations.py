@@ -0,0 +1,565 @@
+# migrations.py
+"""数据库结构版本管理
+
+通过 PRAGMA user_version 记录当前结构版本，启动时按顺序执行尚未应用的迁移，
+可以原地升级已有的 accounting.db 文件。
+
+命令行用法:
+    python migrations.py accounting.db                      升级并打印前后执行计划
+    python migrations.py accounting.db --rebuild-balances   根据历史重建最新余额快照
+    python migrations.py accounting.db --rebuild-fts        重建备注/盘点周期的全文索引
+"""
+import sqlite3
+import sys
+from typing import Callable, List, Tuple
+
+
+def _v1_base_tables(cursor: sqlite3.Cursor):
+    """最初的账本表与资产记录表"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ledgers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS asset_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ledger_id INTEGER,
+            amount REAL NOT NULL,
+            note TEXT,
+            period TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (ledger_id) REFERENCES ledgers (id)
+        )
+    ''')
+
+
+def _v2_cascade_and_indexes(cursor: sqlite3.Cursor):
+    """重建资产记录表以支持级联删除，并添加按账本/时间访问的索引"""
+    # SQLite 不能修改已有外键，只能重建表
+    cursor.execute('''
+        CREATE TABLE asset_records_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ledger_id INTEGER NOT NULL REFERENCES ledgers (id) ON DELETE CASCADE,
+            amount REAL NOT NULL,
+            note TEXT,
+            period TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # 丢弃已没有所属账本的孤儿记录
+    cursor.execute('''
+        INSERT INTO asset_records_new (id, ledger_id, amount, note, period, created_at)
+        SELECT id, ledger_id, amount, note, period, created_at
+        FROM asset_records
+        WHERE ledger_id IN (SELECT id FROM ledgers)
+    ''')
+    # 保留自增序列，避免复用已删除记录的 id（记录已全部删除时新表还没有序列记录）
+    _copy_sequence(cursor, 'asset_records', 'asset_records_new')
+    cursor.execute('DROP TABLE asset_records')
+    cursor.execute('ALTER TABLE asset_records_new RENAME TO asset_records')
+
+    # 覆盖 最新记录/账本历史/按账本删除 的访问路径。id 显式排在 amount 之前，
+    # 按 (created_at, id) 排序取每个账本最近的记录时完全沿索引进行，不需要临时 B 树
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_asset_records_ledger_time
+        ON asset_records (ledger_id, created_at, id, amount)
+    ''')
+    # 全部历史按时间倒序浏览
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_asset_records_time
+        ON asset_records (created_at)
+    ''')
+
+
+def rebuild_ledger_balances(cursor: sqlite3.Cursor):
+    """根据全部历史记录重新生成每个账本的最新余额快照
+
+    最新记录以 created_at 最大者为准，时间相同时取 id 较大的一条。
+    """
+    cursor.execute('DELETE FROM ledger_balances')
+    cursor.execute('''
+        INSERT INTO ledger_balances (ledger_id, record_id, amount, created_at)
+        SELECT ledger_id, id, amount, created_at
+        FROM (
+            SELECT ledger_id, id, amount, created_at,
+                   ROW_NUMBER() OVER (PARTITION BY ledger_id
+                                      ORDER BY created_at DESC, id DESC) AS rn
+            FROM asset_records
+        )
+        WHERE rn = 1
+    ''')
+
+
+# 删除/修改记录后重新计算某个账本的最新余额；账本本身已被删除时不再写入
+_RECOMPUTE_BALANCE = '''
+    DELETE FROM ledger_balances WHERE ledger_id = {ledger};
+    INSERT INTO ledger_balances (ledger_id, record_id, amount, created_at)
+    SELECT ledger_id, id, amount, created_at
+    FROM asset_records
+    WHERE ledger_id = {ledger}
+      AND EXISTS (SELECT 1 FROM ledgers WHERE id = {ledger})
+    ORDER BY created_at DESC, id DESC
+    LIMIT 1;
+'''
+
+
+def _create_balance_triggers(cursor: sqlite3.Cursor):
+    """在 asset_records 上创建维护 ledger_balances 的触发器"""
+    # 新记录只有比快照更新时才替换快照，O(1)
+    cursor.execute('''
+        CREATE TRIGGER trg_asset_records_balance_insert
+        AFTER INSERT ON asset_records
+        BEGIN
+            INSERT INTO ledger_balances (ledger_id, record_id, amount, created_at)
+            VALUES (NEW.ledger_id, NEW.id, NEW.amount, NEW.created_at)
+            ON CONFLICT (ledger_id) DO UPDATE SET
+                record_id = excluded.record_id,
+                amount = excluded.amount,
+                created_at = excluded.created_at
+            WHERE excluded.created_at > ledger_balances.created_at
+               OR (excluded.created_at = ledger_balances.created_at
+                   AND excluded.record_id > ledger_balances.record_id);
+        END
+    ''')
+    # 只有删除的恰好是快照记录时才需要回查历史
+    cursor.execute('''
+        CREATE TRIGGER trg_asset_records_balance_delete
+        AFTER DELETE ON asset_records
+        WHEN OLD.id = (SELECT record_id FROM ledger_balances WHERE ledger_id = OLD.ledger_id)
+        BEGIN
+    ''' + _RECOMPUTE_BALANCE.format(ledger='OLD.ledger_id') + '''
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER trg_asset_records_balance_update
+        AFTER UPDATE OF ledger_id, amount, created_at ON asset_records
+        BEGIN
+    ''' + _RECOMPUTE_BALANCE.format(ledger='OLD.ledger_id')
+          + _RECOMPUTE_BALANCE.format(ledger='NEW.ledger_id') + '''
+        END
+    ''')
+
+
+def _v3_ledger_balances(cursor: sqlite3.Cursor):
+    """由触发器增量维护的账本最新余额快照表"""
+    cursor.execute('''
+        CREATE TABLE ledger_balances (
+            ledger_id INTEGER PRIMARY KEY REFERENCES ledgers (id) ON DELETE CASCADE,
+            record_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            created_at TIMESTAMP NOT NULL
+        )
+    ''')
+    _create_balance_triggers(cursor)
+    rebuild_ledger_balances(cursor)
+
+
+# 当前本地时间对应的整数时间戳（见 _v4_integer_timestamps）
+_NOW_EPOCH = "(CAST(strftime('%s', 'now', 'localtime') AS INTEGER))"
+# 把旧的 ISO 文本时间转换为整数时间戳，无法解析时使用当前时间
+_TEXT_TO_EPOCH = "COALESCE(CAST(strftime('%s', {column}) AS INTEGER), " + _NOW_EPOCH + ")"
+
+
+def _copy_sequence(cursor: sqlite3.Cursor, old: str, new: str):
+    """重建表时保留自增序列"""
+    # 新表为空时还没有序列记录
+    cursor.execute('''
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT ?, seq FROM sqlite_sequence
+        WHERE name = ? AND NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+    ''', (new, old, new))
+    cursor.execute('''
+        UPDATE sqlite_sequence
+        SET seq = MAX(seq, (SELECT seq FROM sqlite_sequence WHERE name = ?))
+        WHERE name = ?
+          AND EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+    ''', (old, new, old))
+
+
+def _v4_integer_timestamps(cursor: sqlite3.Cursor):
+    """created_at 由 ISO 文本改为整数时间戳
+
+    时间戳为本地时间按 UTC 计算的秒数（即把本地时间当作 UTC 换算），
+    与程序中使用的不带时区的 datetime 一一对应，不受夏令时影响。
+    """
+    # 快照表和触发器随后重建；先删除它们，避免重命名表时触发器引用失效
+    cursor.execute('DROP TABLE ledger_balances')
+
+    cursor.execute('''
+        CREATE TABLE asset_records_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ledger_id INTEGER NOT NULL REFERENCES ledgers (id) ON DELETE CASCADE,
+            amount REAL NOT NULL,
+            note TEXT,
+            period TEXT,
+            created_at INTEGER NOT NULL DEFAULT ''' + _NOW_EPOCH + '''
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO asset_records_new (id, ledger_id, amount, note, period, created_at)
+        SELECT id, ledger_id, amount, note, period, ''' + _TEXT_TO_EPOCH.format(column='created_at') + '''
+        FROM asset_records
+    ''')
+    _copy_sequence(cursor, 'asset_records', 'asset_records_new')
+    # 同时删除旧表上的索引和触发器
+    cursor.execute('DROP TABLE asset_records')
+    cursor.execute('ALTER TABLE asset_records_new RENAME TO asset_records')
+
+    cursor.execute('''
+        CREATE TABLE ledgers_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            description TEXT,
+            created_at INTEGER NOT NULL DEFAULT ''' + _NOW_EPOCH + '''
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO ledgers_new (id, name, description, created_at)
+        SELECT id, name, description, ''' + _TEXT_TO_EPOCH.format(column='created_at') + '''
+        FROM ledgers
+    ''')
+    _copy_sequence(cursor, 'ledgers', 'ledgers_new')
+    cursor.execute('DROP TABLE ledgers')
+    cursor.execute('ALTER TABLE ledgers_new RENAME TO ledgers')
+
+    cursor.execute('''
+        CREATE INDEX idx_asset_records_ledger_time
+        ON asset_records (ledger_id, created_at, id, amount)
+    ''')
+    cursor.execute('''
+        CREATE INDEX idx_asset_records_time
+        ON asset_records (created_at)
+    ''')
+    cursor.execute('''
+        CREATE TABLE ledger_balances (
+            ledger_id INTEGER PRIMARY KEY REFERENCES ledgers (id) ON DELETE CASCADE,
+            record_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            created_at INTEGER NOT NULL
+        )
+    ''')
+    _create_balance_triggers(cursor)
+    rebuild_ledger_balances(cursor)
+
+
+FTS_TABLE = 'asset_records_fts'
+
+
+def has_fts(conn) -> bool:
+    """数据库中是否有备注/盘点周期的全文索引（SQLite 不支持 FTS5 trigram 时不会创建）"""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (FTS_TABLE,)).fetchone() is not None
+
+
+def _v5_search_indexes(cursor: sqlite3.Cursor):
+    """按盘点周期筛选的索引，以及备注和盘点周期的 FTS5 全文索引"""
+    cursor.execute('''
+        CREATE INDEX idx_asset_records_period
+        ON asset_records (period, created_at)
+    ''')
+
+    # trigram 分词按连续三个字符建索引，中文备注也能做子串搜索；
+    # 需要 SQLite 3.34 以上且启用 FTS5，不支持时不建全文索引，搜索退回 LIKE
+    try:
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+                note, period,
+                content = 'asset_records', content_rowid = 'id',
+                tokenize = 'trigram'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        return
+
+    # 外部内容表：索引由触发器与 asset_records 保持同步。
+    # 逐行触发的 FTS 写入比整批写入慢数倍，批量导入时在事务内把 deferred 置 1，
+    # 插入后用 index_new_records 一次补建索引（见 Database.add_asset_records_bulk）
+    cursor.execute('''
+        CREATE TABLE search_index_state (
+            deferred INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT INTO search_index_state (deferred) VALUES (0)')
+    cursor.execute(f'''
+        CREATE TRIGGER trg_asset_records_fts_insert
+        AFTER INSERT ON asset_records
+        WHEN (SELECT deferred FROM search_index_state) = 0
+        BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, note, period) VALUES (NEW.id, NEW.note, NEW.period);
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER trg_asset_records_fts_delete
+        AFTER DELETE ON asset_records
+        BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, note, period)
+            VALUES ('delete', OLD.id, OLD.note, OLD.period);
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER trg_asset_records_fts_update
+        AFTER UPDATE OF note, period ON asset_records
+        BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, note, period)
+            VALUES ('delete', OLD.id, OLD.note, OLD.period);
+            INSERT INTO {FTS_TABLE} (rowid, note, period) VALUES (NEW.id, NEW.note, NEW.period);
+        END
+    ''')
+    rebuild_fts(cursor)
+
+
+def index_new_records(cursor: sqlite3.Cursor, after_id: int):
+    """为 id 大于 after_id 的记录补建全文索引（用于暂停插入触发器后的批量导入）"""
+    cursor.execute(f'''
+        INSERT INTO {FTS_TABLE} (rowid, note, period)
+        SELECT id, note, period FROM asset_records WHERE id > ?
+    ''', (after_id,))
+
+
+def rebuild_fts(cursor: sqlite3.Cursor):
+    """根据 asset_records 重建全文索引"""
+    cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _v6_change_log(cursor: sqlite3.Cursor):
+    """数据库标识、变更日志和同步水位，用于多台电脑之间增量同步（见 sync.py）"""
+    # 每个数据库随机生成一个标识；复制出来的数据库文件需要用 sync --new-id 重新生成。
+    # log_id 标识当前这一份变更日志，日志重新开始时更换，对方据此从头重新应用；
+    # write_id 为本机最近一次写出的变更文件的标识，用来发现数据库被旧副本覆盖
+    cursor.execute('''
+        CREATE TABLE sync_state (
+            database_id TEXT NOT NULL,
+            log_id TEXT NOT NULL,
+            write_id TEXT
+        )
+    ''')
+    cursor.execute("INSERT INTO sync_state (database_id, log_id) "
+                   "VALUES (lower(hex(randomblob(16))), lower(hex(randomblob(16))))")
+    # seq 单调递增、不重复使用。新增记录按写入事务记一行（first_record_id..last_record_id），
+    # 不逐条记录；origin 为 NULL 表示本机的修改，否则为同步过来的修改所来自的数据库标识
+    cursor.execute('''
+        CREATE TABLE change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            ledger_id INTEGER,
+            ledger_name TEXT,
+            first_record_id INTEGER,
+            last_record_id INTEGER,
+            origin TEXT
+        )
+    ''')
+    # received_seq: 已应用对方 seq 不超过该值的修改（对方 log_id 为 log_id 的那一份日志）；
+    # acked_seq: 对方已确认应用了本机当前日志中 seq 不超过该值的修改
+    cursor.execute('''
+        CREATE TABLE sync_peers (
+            peer_id TEXT PRIMARY KEY,
+            log_id TEXT,
+            received_seq INTEGER NOT NULL DEFAULT 0,
+            acked_seq INTEGER NOT NULL DEFAULT 0,
+            synced_at INTEGER
+        )
+    ''')
+    log_existing_data(cursor)
+
+
+def log_existing_data(cursor: sqlite3.Cursor):
+    """把已有的账本和记录作为本机修改写入变更日志，首次同步时全部发送给对方"""
+    cursor.execute('''
+        INSERT INTO change_log (kind, ledger_id, ledger_name)
+        SELECT 'ledger_created', id, name FROM ledgers ORDER BY id
+    ''')
+    cursor.execute('''
+        INSERT INTO change_log (kind, first_record_id, last_record_id)
+        SELECT 'records_added', MIN(id), MAX(id) FROM asset_records HAVING COUNT(*) > 0
+    ''')
+
+
+# 按顺序排列，第 i 项执行后 user_version 变为 i + 1
+MIGRATIONS: List[Callable[[sqlite3.Cursor], None]] = [
+    _v1_base_tables,
+    _v2_cascade_and_indexes,
+    _v3_ledger_balances,
+    _v4_integer_timestamps,
+    _v5_search_indexes,
+    _v6_change_log,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    """读取数据库当前的结构版本"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """把数据库升级到最新版本，返回本次执行的迁移数量
+
+    每个迁移在独立事务中执行；迁移期间临时关闭外键检查（重建表需要），
+    结束后校验外键完整性并执行 ANALYZE 更新查询优化器统计信息。
+    """
+    current = get_version(conn)
+    if current > SCHEMA_VERSION:
+        raise RuntimeError(f"数据库版本 {current} 高于程序支持的版本 {SCHEMA_VERSION}，请升级程序")
+    if current == SCHEMA_VERSION:
+        return 0
+
+    if conn.in_transaction:
+        conn.commit()
+    # foreign_keys 只能在事务外切换
+    conn.execute('PRAGMA foreign_keys = OFF')
+    try:
+        for version in range(current + 1, SCHEMA_VERSION + 1):
+            cursor = conn.cursor()
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                MIGRATIONS[version - 1](cursor)
+                # 旧结构允许孤儿记录，只校验最终结构
+                violations = []
+                if version == SCHEMA_VERSION:
+                    violations = cursor.execute('PRAGMA foreign_key_check').fetchall()
+                if violations:
+                    raise sqlite3.IntegrityError(f"迁移到版本 {version} 后存在外键错误: {violations[:5]}")
+                # PRAGMA 不支持参数绑定
+                cursor.execute(f'PRAGMA user_version = {version:d}')
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+    finally:
+        conn.execute('PRAGMA foreign_keys = ON')
+
+    conn.execute('ANALYZE')
+    conn.commit()
+    return SCHEMA_VERSION - current
+
+
+# 关键查询及其期望使用的索引，用于发现执行计划退化
+QUERY_PLAN_CHECKS: List[Tuple[str, str, tuple, str]] = [
+    ('账本历史', '''
+        SELECT id, ledger_id, amount, note, period, created_at
+        FROM asset_records WHERE ledger_id = ? ORDER BY created_at DESC
+     ''', (1,), 'idx_asset_records_ledger_time'),
+    ('每个账本最新时间', '''
+        SELECT ledger_id, MAX(created_at) FROM asset_records GROUP BY ledger_id
+     ''', (), 'idx_asset_records_ledger_time'),
+    ('每个账本最近两条记录', '''
+        SELECT id FROM asset_records WHERE ledger_id = ? ORDER BY created_at DESC, id DESC LIMIT 2
+     ''', (1,), 'idx_asset_records_ledger_time'),
+    ('按账本删除', '''
+        DELETE FROM asset_records WHERE ledger_id = ?
+     ''', (1,), 'idx_asset_records_ledger_time'),
+    ('按盘点周期筛选', '''
+        SELECT id, ledger_id, amount, note, period, created_at
+        FROM asset_records WHERE period = ? ORDER BY created_at DESC, id DESC LIMIT 100
+     ''', ('',), 'idx_asset_records_period'),
+    ('全部历史', '''
+        SELECT id, ledger_id, amount, note, period, created_at
+        FROM asset_records ORDER BY created_at DESC
+     ''', (), 'idx_asset_records_time'),
+]
+
+
+def explain(conn: sqlite3.Connection, sql: str, params: tuple = ()) -> List[str]:
+    """返回 EXPLAIN QUERY PLAN 的各行说明"""
+    return [row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+
+def _schema_replica(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """在内存中复制表结构和索引（不含数据与 ANALYZE 统计）"""
+    replica = sqlite3.connect(':memory:')
+    rows = conn.execute('''
+        SELECT sql FROM sqlite_master
+        WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+          AND name NOT LIKE ?  -- FTS5 的影子表由虚拟表自动创建
+        ORDER BY type = 'index'
+    ''', (FTS_TABLE + '_%',)).fetchall()
+    for (sql,) in rows:
+        replica.execute(sql)
+    return replica
+
+
+def plan_ok(plan: List[str], index: str) -> bool:
+    """执行计划使用了期望的索引，没有不走索引的全表扫描，也不需要临时 B 树排序"""
+    return (any(index in line for line in plan)
+            and not any('TEMP B-TREE' in line for line in plan)
+            and not any(line.startswith('SCAN ') and 'INDEX' not in line for line in plan))
+
+
+def check_query_plans(conn: sqlite3.Connection) -> List[Tuple[str, List[str], bool]]:
+    """检查关键查询是否使用了期望的索引（见 plan_ok）
+
+    在不含统计信息的结构副本上生成执行计划，这样结果只取决于索引是否存在，
+    不会因为表里数据太少让优化器选择全表扫描而误报。
+    返回 (查询名称, 执行计划, 是否通过) 列表。
+    """
+    replica = _schema_replica(conn)
+    results = []
+    try:
+        for name, sql, params, index in QUERY_PLAN_CHECKS:
+            try:
+                plan = explain(replica, sql, params)
+            except sqlite3.OperationalError as e:
+                # 旧版本数据库可能还没有相应的表
+                plan = [str(e)]
+            results.append((name, plan, plan_ok(plan, index)))
+    finally:
+        replica.close()
+    return results
+
+
+def _print_plans(title: str, conn: sqlite3.Connection):
+    print(f"== {title} (user_version={get_version(conn)}) ==")
+    for name, plan, ok in check_query_plans(conn):
+        print(f"[{'OK' if ok else '--'}] {name}")
+        for line in plan:
+            print(f"      {line}")
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) == 3 and argv[2] == '--rebuild-balances':
+        conn = sqlite3.connect(argv[1])
+        try:
+            migrate(conn)
+            cursor = conn.cursor()
+            rebuild_ledger_balances(cursor)
+            conn.commit()
+            print(f"已重建 {cursor.execute('SELECT COUNT(*) FROM ledger_balances').fetchone()[0]} 个账本的余额快照")
+            return 0
+        finally:
+            conn.close()
+    if len(argv) == 3 and argv[2] == '--rebuild-fts':
+        conn = sqlite3.connect(argv[1])
+        try:
+            migrate(conn)
+            if not has_fts(conn):
+                print("当前 SQLite 不支持 FTS5 trigram 分词，没有全文索引")
+                return 1
+            rebuild_fts(conn.cursor())
+            conn.commit()
+            print("已重建全文索引")
+            return 0
+        finally:
+            conn.close()
+    if len(argv) != 2:
+        print(__doc__)
+        return 2
+    conn = sqlite3.connect(argv[1])
+    try:
+        _print_plans("升级前", conn)
+        applied = migrate(conn)
+        print(f"已执行 {applied} 个迁移")
+        _print_plans("升级后", conn)
+        return 0 if all(ok for _, _, ok in check_query_plans(conn)) else 1
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
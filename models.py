@@ -1,11 +1,16 @@
 # models.py
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from enum import Enum
 from typing import List, Optional
 from datetime import datetime
 
+# 数量可能很大的结果对象使用 __slots__，不为每个实例分配 __dict__
+# （Python 3.9 的 dataclass 还不支持 slots=True，这里手动声明）
+
 @dataclass
 class Ledger:
     """账本类"""
+    __slots__ = ('id', 'name', 'description', 'created_at')
     id: Optional[int]
     name: str
     description: str
@@ -14,6 +19,7 @@ class Ledger:
 @dataclass
 class AssetRecord:
     """资产记录类"""
+    __slots__ = ('id', 'ledger_id', 'amount', 'note', 'period', 'created_at')
     id: Optional[int]
     ledger_id: int
     amount: float
@@ -24,6 +30,73 @@ class AssetRecord:
 @dataclass
 class LedgerSummary:
     """账本统计信息"""
+    __slots__ = ('ledger', 'current_amount', 'percentage', 'previous_amount', 'delta',
+                 'record_count', 'last_updated')
     ledger: Ledger
     current_amount: float
-    percentage: float
\ No newline at end of file
+    percentage: float  # 占总资产的百分比
+    previous_amount: Optional[float]  # 上一条记录的金额，记录不足两条时为 None
+    delta: Optional[float]  # 当前金额 - 上次金额
+    record_count: int
+    last_updated: Optional[datetime]  # 最新记录的时间，没有记录时为 None
+
+@dataclass
+class LedgerTrend:
+    """账本趋势数据（按时间升序排列的列式数据，可直接用于绘图）"""
+    __slots__ = ('ledger', 'created_at', 'amounts', 'periods')
+    ledger: Ledger
+    created_at: List[datetime]
+    amounts: List[float]
+    periods: List[str]
+
+@dataclass(frozen=True)
+class RecordFilter:
+    """历史记录筛选条件，各条件为 None/空时不筛选（不可变，可作为查询缓存的键）"""
+    ledger_id: Optional[int] = None
+    start: Optional[datetime] = None  # 包含
+    end: Optional[datetime] = None  # 不包含
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    period: Optional[str] = None  # 盘点周期，精确匹配
+    text: str = ""  # 在备注和盘点周期中搜索，多个词用空格分隔，需全部命中
+
+    def is_empty(self) -> bool:
+        return (self.ledger_id is None and self.start is None and self.end is None
+                and self.min_amount is None and self.max_amount is None
+                and not self.period and not self.text.strip())
+
+class ChangeKind(Enum):
+    """数据变更类型"""
+    LEDGER_CREATED = "ledger_created"
+    LEDGER_DELETED = "ledger_deleted"
+    RECORDS_ADDED = "records_added"
+
+@dataclass
+class ChangeEvent:
+    """Database 写操作提交后发布的变更事件"""
+    kind: ChangeKind
+    version: int  # 发布该事件后的数据版本号
+    ledger_ids: List[int]  # 受影响的账本
+    record_ids: List[int] = field(default_factory=list)  # 新增记录的 id，批量写入时为空
+    count: int = 0  # 新增记录条数
+    ledger: Optional[Ledger] = None  # LEDGER_CREATED 时为新账本
+
+@dataclass
+class ChangeLogEntry:
+    """变更日志中的一项（用于同步）"""
+    seq: int
+    kind: ChangeKind
+    ledger_id: Optional[int] = None
+    ledger_name: Optional[str] = None
+    first_record_id: Optional[int] = None  # RECORDS_ADDED 时为本次写入的记录 id 范围
+    last_record_id: Optional[int] = None
+    origin: Optional[str] = None  # 本机修改为 None，同步过来的修改为来源数据库的标识
+
+@dataclass
+class SyncPeer:
+    """同步对象（另一台电脑上的数据库）的水位"""
+    peer_id: str
+    log_id: Optional[str] = None  # received_seq 所对应的对方变更日志
+    received_seq: int = 0  # 已应用对方 seq 不超过该值的修改
+    acked_seq: int = 0  # 对方已确认应用了本机 seq 不超过该值的修改
+    synced_at: Optional[datetime] = None
@@ -0,0 +1,308 @@
+# profiling.py
+"""运行时性能剖析
+
+默认关闭。设置环境变量 EASYACCOUNTING_PROFILE=1 或启动时加 --profile 参数开启，
+也可以在诊断面板（主窗口中按 Ctrl+Shift+D 打开）中随时开关。开启后记录:
+  - Database 各公开方法的调用次数、耗时和返回条数
+  - 每条 SQL 语句的执行耗时（含读取结果）、返回行数和虚拟机步数（进度回调计数）
+  - trace 回调看到的所有语句（含 BEGIN/COMMIT），按语句模板计数；
+    触发器执行时 SQLite 会再次报告触发它的语句，次数多于 SQL 统计即说明有触发器开销
+  - 行解码、图表绘制/渲染以及页面加载各阶段的耗时
+设置 EASYACCOUNTING_PROFILE_OUTPUT=路径 时，程序退出时把统计结果写入该 JSON 文件。
+关闭时各埋点只多一次属性判断，不挂 SQLite 回调，开销可以忽略。
+"""
+import atexit
+import functools
+import inspect
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+ENV_VAR = "EASYACCOUNTING_PROFILE"
+OUTPUT_ENV_VAR = "EASYACCOUNTING_PROFILE_OUTPUT"
+
+# 统计类别 -> 显示名称
+KINDS = {
+    "database": "Database 方法",
+    "sql": "SQL 语句",
+    "trace": "trace 回调",
+    "stages": "解码/图表/界面",
+}
+
+# 进度回调每执行这么多条虚拟机指令调用一次
+PROGRESS_STEPS = 1000
+
+# SQL 文本超过该长度时截断，避免统计表的键过长
+MAX_STATEMENT_LENGTH = 300
+
+
+def enabled(argv: Optional[List[str]] = None) -> bool:
+    argv = sys.argv if argv is None else argv
+    return os.environ.get(ENV_VAR, "") not in ("", "0") or "--profile" in argv
+
+
+class Stat:
+    """一项操作的累计统计"""
+    __slots__ = ('count', 'total', 'max', 'rows', 'steps')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0  # 秒
+        self.max = 0.0
+        self.rows = 0
+        self.steps = 0
+
+    def add(self, elapsed: float, rows: int = 0, steps: int = 0):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.rows += rows
+        self.steps += steps
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "rows": self.rows,
+            "vm_steps": self.steps,
+        }
+
+
+# trace 回调得到的是代入参数后的 SQL，把字面量换回 ? 以便按模板归类
+_LITERALS = re.compile(r"[xX]?'(?:[^']|'')*'|\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b")
+
+
+def _normalize(sql: str) -> str:
+    """合并空白，同一条语句无论缩进如何都归为一项"""
+    text = " ".join(sql.split())
+    return text if len(text) <= MAX_STATEMENT_LENGTH else text[:MAX_STATEMENT_LENGTH] + "…"
+
+
+class Profiler:
+    """线程安全的统计收集器"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Stat]] = {kind: {} for kind in KINDS}
+        self._local = threading.local()
+        self.since = time.time()
+
+    def record(self, kind: str, name: str, elapsed: float, rows: int = 0, steps: int = 0):
+        with self._lock:
+            stat = self._stats[kind].get(name)
+            if stat is None:
+                stat = self._stats[kind][name] = Stat()
+            stat.add(elapsed, rows, steps)
+
+    def reset(self):
+        with self._lock:
+            self._stats = {kind: {} for kind in KINDS}
+            self.since = time.time()
+
+    def snapshot(self) -> Dict:
+        """当前统计的副本（可直接序列化为 JSON）"""
+        with self._lock:
+            stats = {kind: {name: stat.to_dict() for name, stat in entries.items()}
+                     for kind, entries in self._stats.items()}
+        return {"enabled": self.enabled, "since": self.since, "elapsed_s": time.time() - self.since,
+                "stats": stats}
+
+    def dump(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+    def report(self, top: int = 15) -> str:
+        """按总耗时排序的文本报告"""
+        snapshot = self.snapshot()["stats"]
+        lines = []
+        for kind, title in KINDS.items():
+            entries = sorted(snapshot[kind].items(), key=lambda item: (item[1]["total_ms"], item[1]["count"]), reverse=True)
+            if not entries:
+                continue
+            lines.append(f"== {title} ==")
+            lines.append(f"{'次数':>8} | {'总耗时(ms)':>12} | {'平均(ms)':>10} | {'最大(ms)':>10} | "
+                         f"{'行数':>10} | {'VM 步数':>12} | 名称")
+            for name, stat in entries[:top]:
+                lines.append(f"{stat['count']:8d} | {stat['total_ms']:12.1f} | {stat['mean_ms']:10.3f} | "
+                             f"{stat['max_ms']:10.3f} | {stat['rows']:10d} | {stat['vm_steps']:12d} | {name}")
+        return "\n".join(lines)
+
+    # SQLite 回调：只在开启剖析时、连接被借出期间挂上
+
+    def attach(self, conn):
+        conn.set_trace_callback(self._trace)
+        conn.set_progress_handler(self._progress, PROGRESS_STEPS)
+
+    def detach(self, conn):
+        conn.set_trace_callback(None)
+        conn.set_progress_handler(None, 0)
+
+    def _trace(self, statement: str):
+        self.record("trace", _normalize(_LITERALS.sub("?", statement)), 0.0)
+
+    def _progress(self) -> int:
+        # 回调在执行语句的线程中调用，按线程计数
+        self._local.steps = getattr(self._local, "steps", 0) + 1
+        return 0  # 返回非零会中断语句
+
+    def steps(self) -> int:
+        """当前线程已执行的虚拟机指令数（按 PROGRESS_STEPS 取整）"""
+        return getattr(self._local, "steps", 0) * PROGRESS_STEPS
+
+
+PROFILER = Profiler(enabled())
+
+
+class TimedCursor:
+    """记录每条语句耗时、返回行数和虚拟机步数的游标包装
+
+    一条语句的执行和之后读取结果的耗时合计为一次调用，在执行下一条语句或关闭游标时记录。
+    """
+    def __init__(self, cursor, profiler: Profiler = PROFILER):
+        self._cursor = cursor
+        self._profiler = profiler
+        self._statement = None
+        self._elapsed = 0.0
+        self._rows = 0
+        self._steps = 0
+
+    def _flush(self):
+        if self._statement is not None:
+            self._profiler.record("sql", self._statement, self._elapsed, self._rows, self._steps)
+            self._statement = None
+
+    def _call(self, method, *args):
+        steps = self._profiler.steps()
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed += time.perf_counter() - started
+            self._steps += self._profiler.steps() - steps
+
+    def _execute(self, method, sql, args):
+        self._flush()
+        self._statement = _normalize(sql)
+        self._elapsed = 0.0
+        self._rows = 0
+        self._steps = 0
+        self._call(method, sql, args)
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._execute(self._cursor.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._execute(self._cursor.executemany, sql, seq_of_parameters)
+        self._rows = max(self._cursor.rowcount, 0)  # 写入的行数
+        return self
+
+    def fetchone(self):
+        row = self._call(self._cursor.fetchone)
+        self._rows += row is not None
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._call(self._cursor.fetchmany) if size is None else self._call(self._cursor.fetchmany, size)
+        self._rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._call(self._cursor.fetchall)
+        self._rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._flush()
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        # lastrowid、rowcount 等直接使用原游标
+        return getattr(self._cursor, name)
+
+
+def timed(name: Optional[str] = None, kind: str = "stages") -> Callable:
+    """记录函数的调用耗时；返回列表时同时记录条数
+
+    生成器函数按消费期间实际执行的时间计，生成器结束或关闭时记一次。
+    """
+    def decorator(fn):
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                if not PROFILER.enabled:
+                    yield from fn(*args, **kwargs)
+                    return
+                elapsed = 0.0
+                rows = 0
+                iterator = fn(*args, **kwargs)
+                try:
+                    while True:
+                        started = time.perf_counter()
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            elapsed += time.perf_counter() - started
+                            return
+                        elapsed += time.perf_counter() - started
+                        rows += 1
+                        yield item
+                finally:
+                    iterator.close()
+                    PROFILER.record(kind, label, elapsed, rows)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            result = fn(*args, **kwargs)
+            PROFILER.record(kind, label, time.perf_counter() - started,
+                            len(result) if isinstance(result, list) else 0)
+            return result
+        return wrapper
+    return decorator
+
+
+def profiled(cls):
+    """类装饰器：为所有公开方法加上 timed（类别为 database）"""
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith("_") or not inspect.isfunction(value):
+            continue
+        setattr(cls, attr, timed(f"{cls.__name__}.{attr}", kind="database")(value))
+    return cls
+
+
+@contextmanager
+def section(name: str, kind: str = "stages"):
+    """记录一段代码的耗时"""
+    if not PROFILER.enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PROFILER.record(kind, name, time.perf_counter() - started)
+
+
+def dump_on_exit(path: Optional[str] = None):
+    """程序退出时把统计结果写入 JSON 文件（默认取环境变量 EASYACCOUNTING_PROFILE_OUTPUT）"""
+    path = path or os.environ.get(OUTPUT_ENV_VAR)
+    if path:
+        atexit.register(PROFILER.dump, path)
+    return path
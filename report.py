@@ -0,0 +1,339 @@
+# report.py
+"""命令行批量报表（不依赖 Qt）
+
+为一个或多个账本数据库生成报表，每个数据库输出到 <输出目录>/<文件名>/:
+  report.html           汇总页面（内嵌下面的图表和表格）
+  summary.csv           各账本当前金额、占比、较上次变化、记录数
+  balances_<频率>.csv   各账本及总资产按日/月/季度/年重采样的余额
+  pie.png / balances.png / net_worth.png   图表（matplotlib Agg 后端离屏渲染）
+另在输出目录下生成 index.html 汇总所有数据库。
+
+多个数据库用进程池并行处理，每个进程复用同一组 Figure 逐个渲染。
+数据库以只读方式打开，不修改文件（包括日志模式）。结构版本低于程序版本时默认跳过，
+加 --migrate 才会升级后再生成报表。
+
+用法:
+    python -m easyAccounting report data/*.db --output reports
+    python report.py clients/ --formats html,csv --freq quarter --jobs 8
+"""
+import argparse
+import csv
+import glob
+import html
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# 只使用 Agg 后端，不加载任何 GUI 工具包
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import migrations
+
+FORMATS = ("html", "png", "csv")
+
+# 图表文件名 -> 标题
+CHARTS = {
+    "pie.png": "资产配置分布",
+    "balances.png": "资产变化趋势",
+    "net_worth.png": "总资产走势",
+}
+
+CHART_WIDTH = 1000
+CHART_HEIGHT = 600
+CHART_DPI = 100
+# 最低压缩级别：文件只大几个百分点，编码耗时减少约一半
+PNG_OPTIONS = {"pil_kwargs": {"compress_level": 1}}
+
+# 工作进程内复用的图表（进程首次生成报表时创建）
+_renderers = None
+
+
+def _chart_renderers():
+    global _renderers
+    if _renderers is None:
+        import charts
+        _renderers = {
+            "pie.png": charts.ChartRenderer(charts.draw_pie_chart, charts.update_pie_chart),
+            "balances.png": charts.ChartRenderer(charts.draw_balance_chart, charts.update_balance_chart),
+            "net_worth.png": charts.ChartRenderer(charts.draw_net_worth_chart, charts.update_net_worth_chart),
+        }
+    return _renderers
+
+
+def find_databases(paths: List[str]) -> List[str]:
+    """展开参数中的文件、目录（递归查找 *.db）和通配符，去重后保持原顺序"""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(sorted(glob.glob(os.path.join(path, "**", "*.db"), recursive=True)))
+        elif glob.has_magic(path):
+            found.extend(sorted(glob.glob(path, recursive=True)))
+        else:
+            found.append(path)
+    seen = set()
+    result = []
+    for path in found:
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            result.append(path)
+    return result
+
+
+def output_names(paths: List[str]) -> List[str]:
+    """每个数据库的输出子目录名：取文件名，重名时加序号"""
+    names = []
+    used = set()
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0] or "accounting"
+        name = stem
+        index = 2
+        while name in used:
+            name = f"{stem}_{index}"
+            index += 1
+        used.add(name)
+        names.append(name)
+    return names
+
+
+def check_version(db_path: str, migrate: bool) -> int:
+    """确认数据库存在且结构版本可用，返回结构版本，不满足时抛出 RuntimeError"""
+    if not os.path.isfile(db_path):
+        raise RuntimeError("文件不存在")
+    # 只读打开，不会创建文件或修改数据
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        version = migrations.get_version(conn)
+    except sqlite3.DatabaseError as e:
+        raise RuntimeError(f"不是有效的数据库: {e}") from e
+    finally:
+        conn.close()
+    if version > migrations.SCHEMA_VERSION:
+        raise RuntimeError(f"数据库版本 {version} 高于程序支持的版本 {migrations.SCHEMA_VERSION}")
+    if version < migrations.SCHEMA_VERSION and not migrate:
+        raise RuntimeError(f"数据库版本 {version} 低于 {migrations.SCHEMA_VERSION}，加 --migrate 升级后再生成")
+    return version
+
+
+def migrate_database(db_path: str):
+    """升级数据库结构；用普通连接执行迁移，不像 Database 那样把日志模式切换为 WAL"""
+    conn = sqlite3.connect(db_path)
+    try:
+        migrations.migrate(conn)
+    finally:
+        conn.close()
+
+
+def _amount(value: Optional[float]) -> str:
+    return "" if value is None else f"{value:.2f}"
+
+
+def write_csv(path: str, header: List[str], rows):
+    # 与导入一致使用带 BOM 的 UTF-8，Excel 可直接打开
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def _summary_rows(summaries):
+    for s in summaries:
+        yield [s.ledger.name, _amount(s.current_amount), f"{s.percentage:.2f}", _amount(s.previous_amount),
+               _amount(s.delta), s.record_count,
+               s.last_updated.strftime("%Y-%m-%d %H:%M:%S") if s.last_updated else ""]
+
+
+def _balance_rows(balances):
+    values = balances.values.T.tolist()  # 每个周期一行
+    for label, row, total in zip(balances.labels(), values, balances.totals.tolist()):
+        yield [label] + ["" if v != v else f"{v:.2f}" for v in row] + [f"{total:.2f}"]
+
+
+def render_html(name: str, db_path: str, summaries, total: float, record_count: int,
+                charts_written: List[str], csv_written: List[str], generated: datetime) -> str:
+    """生成单个数据库的报表页面"""
+    rows = []
+    for s in summaries:
+        delta = "" if s.delta is None else f"{s.delta:+,.2f}"
+        updated = s.last_updated.strftime("%Y-%m-%d %H:%M") if s.last_updated else "-"
+        rows.append(f"<tr><td>{html.escape(s.ledger.name)}</td><td class=num>{s.current_amount:,.2f}</td>"
+                    f"<td class=num>{s.percentage:.1f}%</td><td class=num>{delta}</td>"
+                    f"<td class=num>{s.record_count}</td><td>{updated}</td></tr>")
+    images = "".join(f"<figure><img src=\"{html.escape(file)}\" alt=\"{CHARTS[file]}\">"
+                     f"<figcaption>{CHARTS[file]}</figcaption></figure>" for file in charts_written)
+    downloads = ("<p>数据: " + " · ".join(f"<a href=\"{html.escape(file)}\">{html.escape(file)}</a>"
+                                          for file in csv_written) + "</p>") if csv_written else ""
+    return f"""<!DOCTYPE html>
+<html lang="zh-CN"><head><meta charset="utf-8"><title>{html.escape(name)} - 资产报表</title>
+<style>{STYLE}</style></head><body>
+<h1>{html.escape(name)}</h1>
+<p class=meta>{html.escape(os.path.abspath(db_path))} · 生成于 {generated:%Y-%m-%d %H:%M:%S}</p>
+<p class=total>总资产 ¥{total:,.2f} · {len(summaries)} 个账本 · {record_count} 条记录</p>
+<table><thead><tr><th>账本</th><th>当前金额</th><th>占比</th><th>较上次</th><th>记录数</th><th>最近更新</th></tr></thead>
+<tbody>{"".join(rows)}</tbody></table>
+{images}
+{downloads}
+</body></html>
+"""
+
+
+STYLE = ("body{font-family:sans-serif;margin:2em;color:#333}"
+         "table{border-collapse:collapse;margin:1em 0}"
+         "th,td{border:1px solid #ddd;padding:4px 10px}th{background:#f5f5f5}"
+         ".num{text-align:right}.meta{color:#888;font-size:90%}.total{font-size:120%}"
+         ".error{color:#c00}figure{margin:1em 0}img{max-width:100%}")
+
+
+def generate_report(db_path: str, out_dir: str, formats=FORMATS, freq: str = "month",
+                    migrate: bool = False) -> Dict:
+    """为一个数据库生成报表，返回结果摘要（出错时 ok 为 False、error 为错误信息，不抛出异常）"""
+    started = time.perf_counter()
+    result = {"path": db_path, "output": out_dir, "ok": False, "error": None,
+              "ledgers": 0, "records": 0, "total": 0.0, "files": [], "elapsed": 0.0}
+    try:
+        if check_version(db_path, migrate) < migrations.SCHEMA_VERSION:
+            migrate_database(db_path)
+        from database import Database
+
+        # 每个数据库只读一遍，不需要读连接池和查询缓存；只读打开，不改变客户文件的日志模式
+        with Database(db_path, read_pool_size=1, cache_size=0, readonly=True) as db:
+            summaries = db.get_ledger_summaries()
+            record_count = db.count_records()
+            names = {s.ledger.id: s.ledger.name for s in summaries}
+            balances = db.get_resampled_balances(freq) if {"csv", "png"} & set(formats) else None
+            curve = db.get_net_worth_curve() if "png" in formats else None
+
+        total = sum(s.current_amount for s in summaries)
+        result.update(ledgers=len(summaries), records=record_count, total=total)
+        os.makedirs(out_dir, exist_ok=True)
+        files = result["files"]
+
+        if "csv" in formats:
+            write_csv(os.path.join(out_dir, "summary.csv"),
+                      ["账本", "当前金额", "占比(%)", "上次金额", "变化", "记录数", "最近更新"],
+                      _summary_rows(summaries))
+            files.append("summary.csv")
+            ledger_ids = balances.ledger_ids.tolist()
+            write_csv(os.path.join(out_dir, f"balances_{freq}.csv"),
+                      ["周期"] + [names.get(i, str(i)) for i in ledger_ids] + ["总资产"],
+                      _balance_rows(balances))
+            files.append(f"balances_{freq}.csv")
+
+        charts_written = []
+        if "png" in formats:
+            renderers = _chart_renderers()
+            data = {"pie.png": (summaries,), "balances.png": (balances, names), "net_worth.png": (curve,)}
+            for file, args in data.items():
+                content = renderers[file].save(*args, width=CHART_WIDTH, height=CHART_HEIGHT, dpi=CHART_DPI,
+                                                **PNG_OPTIONS)
+                with open(os.path.join(out_dir, file), "wb") as f:
+                    f.write(content)
+                charts_written.append(file)
+            files.extend(charts_written)
+
+        if "html" in formats:
+            page = render_html(os.path.basename(out_dir), db_path, summaries, total, record_count,
+                               charts_written, [f for f in files if f.endswith(".csv")], datetime.now())
+            with open(os.path.join(out_dir, "report.html"), "w", encoding="utf-8") as f:
+                f.write(page)
+            files.append("report.html")
+
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}" if not isinstance(e, RuntimeError) else str(e)
+    result["elapsed"] = time.perf_counter() - started
+    return result
+
+
+def write_index(out_dir: str, results: List[Dict], generated: datetime):
+    """生成汇总所有数据库的 index.html"""
+    rows = []
+    for r in results:
+        name = html.escape(os.path.basename(r["output"]))
+        if r["ok"]:
+            link = f"<a href=\"{name}/report.html\">{name}</a>" if "report.html" in r["files"] else name
+            rows.append(f"<tr><td>{link}</td><td class=num>{r['total']:,.2f}</td><td class=num>{r['ledgers']}</td>"
+                        f"<td class=num>{r['records']}</td><td class=num>{r['elapsed']:.2f}</td></tr>")
+        else:
+            rows.append(f"<tr><td>{name}</td><td colspan=4 class=error>{html.escape(r['error'] or '')}</td></tr>")
+    page = f"""<!DOCTYPE html>
+<html lang="zh-CN"><head><meta charset="utf-8"><title>资产报表汇总</title>
+<style>{STYLE}</style></head><body>
+<h1>资产报表汇总</h1>
+<p class=meta>生成于 {generated:%Y-%m-%d %H:%M:%S} · {len(results)} 个数据库</p>
+<table><thead><tr><th>数据库</th><th>总资产</th><th>账本数</th><th>记录数</th><th>用时(秒)</th></tr></thead>
+<tbody>{"".join(rows)}</tbody></table>
+</body></html>
+"""
+    with open(os.path.join(out_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(page)
+
+
+def run(paths: List[str], out_dir: str, formats=FORMATS, freq: str = "month", migrate: bool = False,
+        jobs: Optional[int] = None, progress=None) -> List[Dict]:
+    """并行为多个数据库生成报表，结果按输入顺序返回；progress(done, total, result) 在每个完成时调用"""
+    targets = [os.path.join(out_dir, name) for name in output_names(paths)]
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(paths)))
+    results: List[Optional[Dict]] = [None] * len(paths)
+    if jobs == 1:
+        for i, (path, target) in enumerate(zip(paths, targets)):
+            results[i] = generate_report(path, target, formats, freq, migrate)
+            if progress:
+                progress(i + 1, len(paths), results[i])
+        return results
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(generate_report, path, target, formats, freq, migrate): i
+                   for i, (path, target) in enumerate(zip(paths, targets))}
+        for done, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            if progress:
+                progress(done, len(paths), results[futures[future]])
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import analytics
+
+    parser = argparse.ArgumentParser(prog="easyAccounting report", description="批量生成账本数据库报表")
+    parser.add_argument("paths", nargs="+", help="数据库文件、目录（递归查找 *.db）或通配符")
+    parser.add_argument("-o", "--output", default="reports", help="输出目录，默认 reports")
+    parser.add_argument("-j", "--jobs", type=int, help="并行进程数，默认 CPU 核数")
+    parser.add_argument("--formats", default=",".join(FORMATS),
+                        help=f"输出格式，逗号分隔，可选 {','.join(FORMATS)}")
+    parser.add_argument("--freq", default="month", choices=list(analytics.FREQUENCIES), help="余额重采样频率")
+    parser.add_argument("--migrate", action="store_true", help="允许把旧版本数据库升级后再生成报表")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不逐个输出进度")
+    args = parser.parse_args(argv)
+
+    formats = tuple(f.strip() for f in args.formats.split(",") if f.strip())
+    unknown = set(formats) - set(FORMATS)
+    if unknown or not formats:
+        parser.error(f"不支持的格式: {','.join(sorted(unknown)) or '（空）'}")
+    paths = find_databases(args.paths)
+    if not paths:
+        parser.error("没有找到数据库文件")
+
+    def progress(done, total, result):
+        if args.quiet and result["ok"]:
+            return
+        status = (f"{result['ledgers']} 个账本，{result['records']} 条记录，{result['elapsed']:.2f} 秒"
+                  if result["ok"] else f"失败: {result['error']}")
+        print(f"[{done}/{total}] {result['path']}: {status}", flush=True)
+
+    started = time.perf_counter()
+    os.makedirs(args.output, exist_ok=True)
+    results = run(paths, args.output, formats, args.freq, args.migrate, args.jobs, progress)
+    if "html" in formats:
+        write_index(args.output, results, datetime.now())
+    failed = sum(not r["ok"] for r in results)
+    print(f"已生成 {len(results) - failed} 份报表，失败 {failed} 份，"
+          f"用时 {time.perf_counter() - started:.1f} 秒，输出目录 {os.path.abspath(args.output)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# startup.py
+"""启动耗时统计
+
+开启方式: 设置环境变量 EASYACCOUNTING_STARTUP_TIMING=1，或启动时加 --startup-timing 参数。
+开启后记录每个模块的导入耗时（与 python -X importtime 相同的 自身/累计 口径）
+以及窗口创建、首帧显示等阶段的时间点，首帧显示后输出到标准错误。
+"""
+import os
+import sys
+import time
+from importlib.abc import Loader, MetaPathFinder
+from typing import Dict, List, Optional, Tuple
+
+ENV_VAR = "EASYACCOUNTING_STARTUP_TIMING"
+
+_start = time.perf_counter()
+
+
+def enabled(argv: Optional[List[str]] = None) -> bool:
+    argv = sys.argv if argv is None else argv
+    return os.environ.get(ENV_VAR, "") not in ("", "0") or "--startup-timing" in argv
+
+
+class _TimedLoader(Loader):
+    """包装原加载器，记录 exec_module 耗时"""
+    def __init__(self, loader, recorder):
+        self.loader = loader
+        self.recorder = recorder
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        self.recorder.begin(module.__name__)
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.recorder.end()
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class ImportTimer(MetaPathFinder):
+    """记录模块导入耗时的查找器，需放在 sys.meta_path 最前面"""
+    def __init__(self):
+        self.stack: List[Tuple[str, float, float]] = []  # (模块名, 开始时间, 子模块耗时)
+        self.times: Dict[str, Tuple[float, float]] = {}  # 模块名 -> (自身耗时, 累计耗时)
+        self._finding = set()
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname in self._finding:
+            return None
+        self._finding.add(fullname)
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding.discard(fullname)
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    def begin(self, name: str):
+        self.stack.append((name, time.perf_counter(), 0.0))
+
+    def end(self):
+        name, started, children = self.stack.pop()
+        total = time.perf_counter() - started
+        self.times[name] = (total - children, total)
+        if self.stack:
+            parent, parent_start, parent_children = self.stack[-1]
+            self.stack[-1] = (parent, parent_start, parent_children + total)
+
+
+class StartupTimer:
+    """启动阶段计时"""
+    def __init__(self):
+        self.marks: List[Tuple[str, float]] = []
+        self.imports: Optional[ImportTimer] = None
+
+    def install_import_hook(self):
+        self.imports = ImportTimer()
+        sys.meta_path.insert(0, self.imports)
+
+    def remove_import_hook(self):
+        if self.imports in sys.meta_path:
+            sys.meta_path.remove(self.imports)
+
+    def mark(self, phase: str):
+        """记录从进程启动（本模块导入）到当前的耗时"""
+        self.marks.append((phase, time.perf_counter() - _start))
+
+    def report(self, top: int = 25) -> str:
+        lines = ["== 启动耗时 =="]
+        previous = 0.0
+        for phase, elapsed in self.marks:
+            lines.append(f"{elapsed * 1000:9.1f} ms  (+{(elapsed - previous) * 1000:7.1f} ms)  {phase}")
+            previous = elapsed
+        if self.imports and self.imports.times:
+            lines.append(f"== 导入耗时（按累计耗时排序，前 {top} 项）==")
+            lines.append(f"{'自身(ms)':>10} | {'累计(ms)':>10} | 模块")
+            ranked = sorted(self.imports.times.items(), key=lambda item: item[1][1], reverse=True)
+            for name, (self_time, cumulative) in ranked[:top]:
+                lines.append(f"{self_time * 1000:10.1f} | {cumulative * 1000:10.1f} | {name}")
+        return "\n".join(lines)
@@ -0,0 +1,330 @@
+# sync.py
+"""通过共享文件夹在多台电脑的数据库之间增量同步
+
+不需要网络服务：各台电脑把数据库同步到同一个文件夹（网盘、U 盘均可），
+每个数据库只写自己的变更文件 <数据库标识>.changes.jsonl.gz，读取其他数据库的变更文件。
+
+  - 变更日志（change_log）记录本机的创建账本、删除账本和新增记录，seq 单调递增
+  - 变更文件的表头带有本机已应用各数据库修改的水位（received），对方据此知道哪些修改已送达，
+    下次只写出对方尚未确认的修改，日常同步只有几 KB
+  - 水位只在同一份变更日志内有效：日志重新开始时更换 log_id，表头带上 log_id，
+    对方发现 log_id 变化后从头重新应用，不按 seq 跳过
+  - 同步过来的修改在本机日志中标记来源，不会再写回变更文件
+  - 账本按名称对应（名称唯一）；同一账本同一时间已有记录时跳过，与导入的去重规则相同；
+    账本在本机已删除时，对方发来的该账本记录被忽略
+
+复制出来的数据库文件与原文件标识相同，需先用 --new-id 重新生成标识后再同步。
+backup.restore 恢复后会直接重新生成数据库标识。数据库被旧副本直接覆盖时，回退后新写的修改
+会沿用对方已收到过的 seq：每次写出变更文件时在表头和数据库中记下随机的 write_id，
+同步时本机已有的变更文件的 write_id 与数据库中的不一致，说明文件是这个数据库的另一份副本写的，
+变更日志重新开始（更换 log_id），全部重新发送。重复应用的记录按去重规则跳过。
+同一个数据库在多个共享文件夹之间交替同步时也会被当作回退，每次都完整发送。
+
+命令行用法:
+    python sync.py 共享文件夹 [--db accounting.db]
+    python -m easyAccounting sync 共享文件夹 --status
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import sys
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from database import Database, from_epoch, to_epoch
+from models import AssetRecord, ChangeKind, Ledger, SyncPeer
+
+FILE_SUFFIX = ".changes.jsonl.gz"
+FORMAT = "easyAccounting-changes"
+FORMAT_VERSION = 1
+
+# 应用对方的新增记录时每批写入的条数
+CHUNK_SIZE = 5000
+
+
+class SyncError(Exception):
+    """变更文件无效"""
+
+
+@dataclass
+class PeerResult:
+    """应用一个数据库的变更文件的结果"""
+    peer_id: str
+    ledgers_created: List[str] = field(default_factory=list)
+    ledgers_deleted: List[str] = field(default_factory=list)
+    records_added: int = 0
+    records_skipped: int = 0  # 重复或所属账本已删除
+    gap: bool = False  # 变更文件缺少本机尚未应用的修改，本次没有应用
+
+
+@dataclass
+class SyncResult:
+    """一次同步的结果"""
+    database_id: str
+    path: str  # 本机的变更文件
+    changes: int = 0  # 写出的变更条数（每条新增记录算一条）
+    size: int = 0
+    restarted: bool = False  # 发现数据库被旧副本覆盖过，变更日志已重新开始
+    peers: List[PeerResult] = field(default_factory=list)
+
+
+def changes_path(directory: str, database_id: str) -> str:
+    return os.path.join(directory, database_id + FILE_SUFFIX)
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def write_changes(db: Database, path: str, from_seq: int, received: Dict[str, Dict]) -> int:
+    """把本机 seq 大于 from_seq 的修改写入变更文件，返回写出的条数
+
+    received 为 对方标识 -> {"log_id": 对方日志, "seq": 已应用的水位}。
+    先写临时文件再替换，对方不会读到写了一半的文件；替换后在数据库中记下本次的 write_id。
+    """
+    last_seq = db.get_last_change_seq()
+    ledgers = {ledger.id: ledger for ledger in db.get_all_ledgers()}
+    write_id = uuid.uuid4().hex
+    header = {"format": FORMAT, "version": FORMAT_VERSION, "database_id": db.database_id,
+              "log_id": db.log_id, "write_id": write_id,
+              "from_seq": from_seq, "last_seq": last_seq, "received": received,
+              "created_at": datetime.now().isoformat(timespec="seconds")}
+    count = 0
+    partial = path + ".part"
+    try:
+        with gzip.open(partial, "wt", encoding="utf-8", compresslevel=6) as f:
+            f.write(_dumps(header) + "\n")
+            for entry in db.get_changes(from_seq):
+                if entry.seq > last_seq:
+                    break
+                if entry.kind == ChangeKind.RECORDS_ADDED:
+                    for rows in db.iter_record_range(entry.first_record_id, entry.last_record_id):
+                        f.write("".join(_dumps({"seq": entry.seq, "kind": "record", "ledger": row[1],
+                                                "amount": row[2], "note": row[3], "period": row[4],
+                                                "created_at": row[5]}) + "\n" for row in rows))
+                        count += len(rows)
+                    continue
+                line = {"seq": entry.seq, "kind": entry.kind.value, "ledger": entry.ledger_name}
+                ledger = ledgers.get(entry.ledger_id)
+                if entry.kind == ChangeKind.LEDGER_CREATED and ledger is not None and ledger.name == entry.ledger_name:
+                    line["description"] = ledger.description
+                    line["created_at"] = to_epoch(ledger.created_at)
+                f.write(_dumps(line) + "\n")
+                count += 1
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    # 在替换文件和记下 write_id 之间中断时，下次同步会当作回退完整重发，不会丢失修改
+    db.save_write_id(write_id)
+    return count
+
+
+def _read_header(f, path: str) -> Dict:
+    try:
+        header = json.loads(f.readline() or "null")
+    except (OSError, ValueError) as e:
+        raise SyncError(f"无法读取变更文件 {path}: {e}") from e
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise SyncError(f"不是变更文件: {path}")
+    if header.get("version", 0) > FORMAT_VERSION:
+        raise SyncError(f"变更文件版本 {header['version']} 高于程序支持的版本 {FORMAT_VERSION}: {path}")
+    if not header.get("log_id"):
+        raise SyncError(f"变更文件缺少日志标识: {path}")
+    return header
+
+
+def read_header(path: str) -> Dict:
+    """只读取变更文件的表头"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return _read_header(f, path)
+
+
+def read_changes(path: str) -> Tuple[Dict, Iterator[Dict]]:
+    """读取变更文件，返回 (表头, 逐条变更的迭代器)；迭代器读完后关闭文件"""
+    f = gzip.open(path, "rt", encoding="utf-8")
+    try:
+        header = _read_header(f, path)
+    except SyncError:
+        f.close()
+        raise
+
+    def entries():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    return header, entries()
+
+
+def apply_changes(db: Database, entries: Iterator[Dict], peer: SyncPeer) -> PeerResult:
+    """按 seq 顺序应用对方 seq 大于 peer.received_seq 的修改
+
+    重复应用同一批修改不会产生重复数据，中途失败后重新同步即可。
+    """
+    result = PeerResult(peer.peer_id)
+    names = {ledger.name: ledger.id for ledger in db.get_all_ledgers()}
+    pending: List[AssetRecord] = []
+
+    def flush():
+        if pending:
+            inserted = db.add_asset_records_bulk(pending, chunk_size=CHUNK_SIZE, skip_duplicates=True,
+                                                 origin=peer.peer_id)
+            result.records_added += inserted
+            result.records_skipped += len(pending) - inserted
+            pending.clear()
+
+    for entry in entries:
+        if entry["seq"] <= peer.received_seq:
+            continue
+        kind = entry["kind"]
+        name = entry["ledger"]
+        if kind == "record":
+            ledger_id = names.get(name)
+            if ledger_id is None:
+                result.records_skipped += 1
+                continue
+            pending.append(AssetRecord(id=None, ledger_id=ledger_id, amount=entry["amount"], note=entry["note"],
+                                       period=entry["period"], created_at=from_epoch(entry["created_at"])))
+            if len(pending) >= CHUNK_SIZE:
+                flush()
+            continue
+
+        # 账本的增删要在之前的记录写入之后执行
+        flush()
+        if kind == ChangeKind.LEDGER_CREATED.value:
+            if name not in names:
+                created_at = entry.get("created_at")
+                ledger = db.create_ledger(Ledger(id=None, name=name, description=entry.get("description", ""),
+                                                 created_at=None if created_at is None else from_epoch(created_at)),
+                                          origin=peer.peer_id)
+                names[name] = ledger.id
+                result.ledgers_created.append(name)
+        elif kind == ChangeKind.LEDGER_DELETED.value:
+            ledger_id = names.pop(name, None)
+            if ledger_id is not None:
+                db.delete_ledger(ledger_id, origin=peer.peer_id)
+                result.ledgers_deleted.append(name)
+    flush()
+    return result
+
+
+def sync(db: Database, directory: str) -> SyncResult:
+    """与共享文件夹中其他数据库的变更文件同步：先应用对方的修改，再写出本机的变更文件"""
+    os.makedirs(directory, exist_ok=True)
+    result = SyncResult(database_id=db.database_id, path=changes_path(directory, db.database_id))
+    if os.path.exists(result.path) and read_header(result.path).get("write_id") != db.write_id:
+        # 本机的变更文件不是这个数据库写出的：数据库被旧副本覆盖过，对方已收到的 seq 可能被重新使用
+        db.restart_change_log()
+        result.restarted = True
+    peers = {peer.peer_id: peer for peer in db.get_sync_peers()}
+
+    for path in sorted(glob.glob(os.path.join(glob.escape(directory), "*" + FILE_SUFFIX))):
+        peer_id = os.path.basename(path)[:-len(FILE_SUFFIX)]
+        if peer_id == db.database_id:
+            continue
+        header, entries = read_changes(path)
+        if header.get("database_id") != peer_id:
+            entries.close()
+            raise SyncError(f"变更文件名与其中的数据库标识不一致: {path}")
+
+        peer = peers.get(peer_id) or SyncPeer(peer_id=peer_id)
+        if header["log_id"] != peer.log_id:
+            # 第一次同步或对方的变更日志重新开始过，已应用的水位不再有效，从头应用
+            peer.log_id = header["log_id"]
+            peer.received_seq = 0
+        # 对方的确认只在针对本机当前日志时有效；对方恢复过备份时水位会变小，以对方最新的表头为准
+        ack = header["received"].get(db.database_id)
+        peer.acked_seq = ack["seq"] if ack and ack["log_id"] == db.log_id else 0
+        if header["from_seq"] > peer.received_seq:
+            # 文件是在对方收到本机最新水位之前写的，等对方下次同步后会从本机的水位重新写出
+            entries.close()
+            peer_result = PeerResult(peer_id, gap=True)
+        else:
+            peer_result = apply_changes(db, entries, peer)
+            peer.received_seq = max(peer.received_seq, header["last_seq"])
+        peer.synced_at = datetime.now()
+        db.save_sync_peer(peer)
+        peers[peer_id] = peer
+        result.peers.append(peer_result)
+
+    # 只写出所有已知对方都还没确认的修改
+    from_seq = min((peer.acked_seq for peer in peers.values()), default=0)
+    received = {peer.peer_id: {"log_id": peer.log_id, "seq": peer.received_seq} for peer in peers.values()}
+    result.changes = write_changes(db, result.path, from_seq, received)
+    result.size = os.path.getsize(result.path)
+    return result
+
+
+def forget_peer(db: Database, peer_id: str) -> bool:
+    """不再等待某个数据库确认（停用的电脑），返回是否同步过该数据库
+
+    把对方的确认水位推到最新，本机的变更文件不再为它保留旧的修改；对方的变更文件需要手动删除，
+    否则下次同步时会按文件中的水位恢复。
+    """
+    peer = next((peer for peer in db.get_sync_peers() if peer.peer_id == peer_id), None)
+    if peer is None:
+        return False
+    peer.acked_seq = db.get_last_change_seq()
+    db.save_sync_peer(peer)
+    return True
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="easyAccounting sync", description="通过共享文件夹增量同步数据库")
+    parser.add_argument("directory", help="共享文件夹")
+    parser.add_argument("--db", default="accounting.db", help="数据库文件")
+    parser.add_argument("--status", action="store_true", help="只显示同步状态，不同步")
+    parser.add_argument("--new-id", action="store_true", help="重新生成数据库标识（用于复制出来的数据库文件）")
+    parser.add_argument("--forget", metavar="PEER", help="不再等待该数据库确认修改")
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.db):
+        print(f"数据库不存在: {args.db}", file=sys.stderr)
+        return 1
+    with Database(args.db, read_pool_size=1) as db:
+        if args.new_id:
+            print(f"新的数据库标识: {db.reset_database_id()}")
+        if args.forget:
+            if not forget_peer(db, args.forget):
+                print(f"没有同步过该数据库: {args.forget}", file=sys.stderr)
+                return 1
+            print(f"已不再等待 {args.forget} 确认")
+        if args.status:
+            print(f"本机数据库标识: {db.database_id}，最新 seq: {db.get_last_change_seq()}")
+            for peer in db.get_sync_peers():
+                synced = f"{peer.synced_at:%Y-%m-%d %H:%M:%S}" if peer.synced_at else "-"
+                print(f"  {peer.peer_id}: 已应用对方至 {peer.received_seq}，对方已确认本机至 {peer.acked_seq}，"
+                      f"上次同步 {synced}")
+            return 0
+        try:
+            result = sync(db, args.directory)
+        except (SyncError, ValueError, KeyError, OSError) as e:
+            print(e, file=sys.stderr)
+            return 1
+
+    if result.restarted:
+        print("本机的变更文件不是这个数据库写出的（数据库被旧副本覆盖过？），已重新开始变更日志，全部数据重新发送")
+    for peer in result.peers:
+        if peer.gap:
+            print(f"{peer.peer_id}: 变更文件缺少部分修改，等对方下次同步后再应用")
+            continue
+        parts = [f"新增记录 {peer.records_added} 条"]
+        if peer.records_skipped:
+            parts.append(f"跳过 {peer.records_skipped} 条")
+        if peer.ledgers_created:
+            parts.append("新建账本 " + ", ".join(peer.ledgers_created))
+        if peer.ledgers_deleted:
+            parts.append("删除账本 " + ", ".join(peer.ledgers_deleted))
+        print(f"{peer.peer_id}: " + "，".join(parts))
+    print(f"已写出 {result.changes} 条本机修改到 {result.path}（{result.size / 1024:.1f} KB）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
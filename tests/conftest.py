@@ -0,0 +1,44 @@
+# conftest.py
+"""pytest 公共设置：模块都在仓库根目录，测试时加入 sys.path"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+from models import AssetRecord, Ledger  # noqa: E402
+
+START = datetime(2024, 1, 1, 9, 0)
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "accounting.db"))
+    yield db
+    db.close()
+
+
+def add_ledger(db, name, amounts, start=START, step=timedelta(days=1)):
+    """创建账本并按时间顺序写入 amounts，返回账本"""
+    ledger = db.create_ledger(Ledger(id=None, name=name, description="", created_at=start))
+    db.add_asset_records([AssetRecord(id=None, ledger_id=ledger.id, amount=amount, note=f"{name}-{i}",
+                                      period="", created_at=start + step * i)
+                          for i, amount in enumerate(amounts)])
+    return ledger
+
+
+def record_rows(path):
+    """按 (账本名称, 时间, id) 排序的全部记录 (账本名称, 金额, 备注, 时间戳)，用于比较两个数据库"""
+    import sqlite3
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('''
+            SELECT l.name, r.amount, r.note, r.created_at
+            FROM asset_records r JOIN ledgers l ON l.id = r.ledger_id
+            ORDER BY l.name, r.created_at, r.id
+        ''').fetchall()
+    finally:
+        conn.close()
@@ -0,0 +1,108 @@
+# test_analytics.py
+"""向量化的重采样和总资产曲线与逐条循环的朴素实现比较"""
+import random
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+import analytics
+
+
+def _records(seed, count=400, ledgers=6):
+    """按 (时间, id) 升序的随机记录列，包含同一时间的多条记录"""
+    rng = random.Random(seed)
+    start = int(datetime(2023, 11, 20, tzinfo=timezone.utc).timestamp())
+    times = sorted(start + rng.choice([rng.randrange(0, 3 * 365 * 86400), 86400 * rng.randrange(0, 30)])
+                   for _ in range(count))
+    ledger_ids = [rng.randrange(1, ledgers + 1) * 10 for _ in range(count)]
+    amounts = [round(rng.uniform(-500, 5000), 2) for _ in range(count)]
+    return np.array(ledger_ids), np.array(amounts), np.array(times)
+
+
+def _period_start(dt, freq):
+    if freq == "day":
+        return dt.replace(hour=0, minute=0, second=0)
+    if freq == "month":
+        return dt.replace(day=1, hour=0, minute=0, second=0)
+    if freq == "quarter":
+        return dt.replace(month=(dt.month - 1) // 3 * 3 + 1, day=1, hour=0, minute=0, second=0)
+    return dt.replace(month=1, day=1, hour=0, minute=0, second=0)
+
+
+def _next_period(dt, freq):
+    if freq == "day":
+        return dt + timedelta(days=1)
+    months = {"month": 1, "quarter": 3, "year": 12}[freq]
+    month = dt.month - 1 + months
+    return dt.replace(year=dt.year + month // 12, month=month % 12 + 1)
+
+
+def _naive_resample(ledger_ids, amounts, created_at, freq):
+    utc = [datetime.fromtimestamp(int(t), timezone.utc).replace(tzinfo=None) for t in created_at]
+    periods = [_period_start(utc[0], freq)]
+    while _next_period(periods[-1], freq) <= utc[-1]:
+        periods.append(_next_period(periods[-1], freq))
+    ledgers = sorted(set(ledger_ids.tolist()))
+    values = []
+    for ledger in ledgers:
+        row = []
+        for period in periods:
+            end = _next_period(period, freq)
+            latest = float("nan")
+            for lid, amount, dt in zip(ledger_ids.tolist(), amounts.tolist(), utc):
+                if lid == ledger and dt < end:
+                    latest = amount
+            row.append(latest)
+        values.append(row)
+    totals = [sum(v for v in column if v == v) for column in zip(*values)]
+    return periods, ledgers, values, totals
+
+
+def _naive_net_worth(ledger_ids, amounts, created_at):
+    latest = {}
+    curve = {}
+    for lid, amount, t in zip(ledger_ids.tolist(), amounts.tolist(), created_at.tolist()):
+        latest[lid] = amount
+        curve[t] = sum(latest.values())
+    return list(curve), list(curve.values())
+
+
+@pytest.mark.parametrize("freq", list(analytics.FREQUENCIES))
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_resample_matches_naive(freq, seed):
+    ledger_ids, amounts, created_at = _records(seed)
+    result = analytics.resample(ledger_ids, amounts, created_at, freq)
+    periods, ledgers, values, totals = _naive_resample(ledger_ids, amounts, created_at, freq)
+    assert result.periods.astype(datetime).tolist() == periods
+    assert result.ledger_ids.tolist() == ledgers
+    np.testing.assert_allclose(result.values, values, equal_nan=True)
+    np.testing.assert_allclose(result.totals, totals)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_net_worth_matches_naive(seed):
+    ledger_ids, amounts, created_at = _records(seed)
+    result = analytics.net_worth(ledger_ids, amounts, created_at)
+    times, totals = _naive_net_worth(ledger_ids, amounts, created_at)
+    assert result.times.astype(np.int64).tolist() == times
+    np.testing.assert_allclose(result.totals, totals)
+
+
+def test_resample_range_and_labels():
+    # start 之前的记录作为第一个周期的起始余额
+    created_at = np.array([int(datetime(2024, m, 15, tzinfo=timezone.utc).timestamp()) for m in (1, 2, 5)])
+    result = analytics.resample(np.array([1, 2, 1]), np.array([10.0, 20.0, 30.0]), created_at, "quarter",
+                                start=int(datetime(2024, 4, 1, tzinfo=timezone.utc).timestamp()),
+                                end=int(datetime(2024, 12, 31, tzinfo=timezone.utc).timestamp()))
+    assert result.labels() == ["2024Q2", "2024Q3", "2024Q4"]
+    assert result.for_ledger(1).tolist() == [30.0, 30.0, 30.0]
+    assert result.totals.tolist() == [50.0, 50.0, 50.0]
+    with pytest.raises(KeyError):
+        result.for_ledger(3)
+
+
+def test_empty_input():
+    empty = np.array([], dtype=np.int64)
+    assert len(analytics.resample(empty, empty, empty)) == 0
+    assert len(analytics.net_worth(empty, empty, empty)) == 0
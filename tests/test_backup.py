@@ -0,0 +1,76 @@
+# test_backup.py
+"""快照的创建、恢复和比较"""
+import contextlib
+import os
+import sqlite3
+from datetime import timedelta
+
+import pytest
+
+import backup
+from conftest import START, add_ledger, record_rows
+from database import Database
+from models import AssetRecord
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "accounting.db")
+    with Database(path) as db:
+        add_ledger(db, "现金", [100.0, 120.0])
+        add_ledger(db, "基金", [300.0])
+    return path
+
+
+def _modify(path):
+    with Database(path) as db:
+        cash, fund = db.get_all_ledgers()
+        db.add_asset_record(AssetRecord(id=None, ledger_id=cash.id, amount=50.0, note="", period="",
+                                        created_at=START + timedelta(days=10)))
+        db.delete_ledger(fund.id)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_backup_restore_round_trip(db_path, tmp_path, compress):
+    original = record_rows(db_path)
+    result = backup.backup(db_path, str(tmp_path / "snapshots"), compress=compress)
+    assert os.path.isfile(result.path)
+    assert result.path.endswith(".db.gz" if compress else ".db")
+    assert [s.path for s in backup.list_snapshots(db_path, str(tmp_path / "snapshots"))] == [result.path]
+
+    _modify(db_path)
+    assert record_rows(db_path) != original
+
+    saved = backup.restore(result.path, db_path, directory=str(tmp_path / "snapshots"))
+    assert record_rows(db_path) == original
+    with contextlib.closing(sqlite3.connect(db_path)) as conn:
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    # 恢复前自动备份的内容是修改后的数据
+    assert len(record_rows(saved.path)) == 3
+    with Database(db_path) as db:
+        assert {s.ledger.name: s.current_amount for s in db.get_ledger_summaries()} == {"现金": 120.0, "基金": 300.0}
+
+
+def test_backup_rotation(db_path, tmp_path):
+    directory = str(tmp_path / "snapshots")
+    results = [backup.backup(db_path, directory, keep=2) for _ in range(3)]
+    assert results[-1].removed == [results[0].path]
+    assert len(backup.list_snapshots(db_path, directory)) == 2
+
+
+def test_diff(db_path, tmp_path):
+    snapshot = backup.backup(db_path, str(tmp_path / "snapshots")).path
+    assert backup.diff(snapshot, db_path).is_empty()
+
+    _modify(db_path)
+    result = backup.diff(snapshot, db_path)
+    assert result.ledgers_removed == ["基金"]
+    assert (result.records_added, result.records_removed, result.records_changed) == (1, 1, 0)
+    assert result.balances == [("现金", 120.0, 50.0), ("基金", 300.0, None)]
+
+
+def test_restore_rejects_invalid_snapshot(db_path, tmp_path):
+    path = tmp_path / "broken.db"
+    path.write_bytes(b"not a database" * 100)
+    with pytest.raises(backup.BackupError):
+        backup.restore(str(path), db_path)
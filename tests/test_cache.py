@@ -0,0 +1,59 @@
+# test_cache.py
+"""写操作后缓存的查询结果失效"""
+from datetime import timedelta
+
+from conftest import START, add_ledger
+from models import AssetRecord, Ledger
+
+
+def test_repeated_reads_hit_cache(db):
+    add_ledger(db, "现金", [100.0, 120.0])
+    first = db.get_ledger_summaries()
+    hits = db.cache_stats().hits
+    assert db.get_ledger_summaries() == first
+    assert db.cache_stats().hits == hits + 1
+
+
+def test_writes_invalidate_cached_reads(db):
+    cash = add_ledger(db, "现金", [100.0, 120.0])
+    assert [l.name for l in db.get_all_ledgers()] == ["现金"]
+    assert db.count_records() == 2
+    assert db.get_ledger_summaries()[0].current_amount == 120.0
+    db.get_ledger_history(cash.id)
+
+    # 新建账本
+    db.create_ledger(Ledger(id=None, name="银行卡", description="", created_at=START))
+    assert [l.name for l in db.get_all_ledgers()] == ["现金", "银行卡"]
+
+    # 新增记录：依赖 records 的查询都要重新计算
+    bank = next(l for l in db.get_all_ledgers() if l.name == "银行卡")
+    db.add_asset_record(AssetRecord(id=None, ledger_id=bank.id, amount=500.0, note="", period="",
+                                    created_at=START + timedelta(days=5)))
+    assert db.count_records() == 3
+    assert {s.ledger.name: s.current_amount for s in db.get_ledger_summaries()} == {"现金": 120.0, "银行卡": 500.0}
+    assert db.get_net_worth_curve().totals[-1] == 620.0
+    # 按账本打标签的缓存只在该账本变化时失效
+    hits = db.cache_stats().hits
+    assert [r.amount for r in db.get_ledger_history(cash.id)] == [120.0, 100.0]
+    assert db.cache_stats().hits == hits + 1
+
+    db.add_asset_records_bulk([AssetRecord(id=None, ledger_id=cash.id, amount=80.0, note="", period="",
+                                           created_at=START + timedelta(days=6))])
+    assert [r.amount for r in db.get_ledger_history(cash.id)] == [80.0, 120.0, 100.0]
+    assert db.get_net_worth_curve().totals[-1] == 580.0
+
+    # 删除账本同时删除其记录
+    db.delete_ledger(cash.id)
+    assert [l.name for l in db.get_all_ledgers()] == ["银行卡"]
+    assert db.count_records() == 1
+    assert [s.ledger.name for s in db.get_ledger_summaries()] == ["银行卡"]
+    assert db.cache_stats().invalidations > 0
+
+
+def test_cache_disabled(tmp_path):
+    from database import Database
+    with Database(str(tmp_path / "accounting.db"), cache_size=0) as db:
+        add_ledger(db, "现金", [100.0])
+        db.get_all_ledgers()
+        db.get_all_ledgers()
+        assert db.cache_stats().hits == 0
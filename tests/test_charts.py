@@ -0,0 +1,42 @@
+# test_charts.py
+"""多个线程同时渲染图表（界面刷新、导出各用一个后台线程）"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import analytics
+import charts
+
+pytestmark = pytest.mark.filterwarnings("ignore:Glyph")
+
+
+def _charts():
+    rng = np.random.default_rng(0)
+    created_at = np.sort(rng.integers(1_600_000_000, 1_700_000_000, 500))
+    ledger_ids = rng.integers(1, 6, 500)
+    amounts = rng.uniform(0, 1000, 500).round(2)
+    names = {i: f"账本{i}" for i in range(1, 6)}
+    return [
+        (charts.draw_line_chart, (analytics.split_by_ledger(ledger_ids, amounts, created_at), names)),
+        (charts.draw_balance_chart, (analytics.resample(ledger_ids, amounts, created_at, "month"), names)),
+        (charts.draw_net_worth_chart, (analytics.net_worth(ledger_ids, amounts, created_at),)),
+    ]
+
+
+def test_concurrent_rendering_matches_serial():
+    jobs = _charts() * 2
+    expected = [charts.render_bytes(draw, *args, width=400, height=300, fmt="raw") for draw, args in jobs]
+    renderers = {draw: charts.ChartRenderer(draw) for draw, _ in jobs}
+
+    def render(job):
+        draw, args = job
+        # 同一个 ChartRenderer 被多个线程共用，另有独立 Figure 的 render_bytes 同时执行
+        w, h, pixels = renderers[draw].render(*args, width=400, height=300)
+        return pixels, charts.render_bytes(draw, *args, width=400, height=300, fmt="raw")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(render, jobs))
+    for want, (pixels, raw) in zip(expected, results):
+        assert pixels == want
+        assert raw == want
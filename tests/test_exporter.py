@@ -0,0 +1,38 @@
+# test_exporter.py
+"""命令行导出不修改数据库文件"""
+import contextlib
+import csv
+import sqlite3
+
+import exporter
+from conftest import add_ledger
+from database import Database
+
+
+def _journal_mode(path):
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        return conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+
+def test_export_keeps_journal_mode(tmp_path):
+    path = str(tmp_path / "client.db")
+    with Database(path) as db:
+        add_ledger(db, "现金", [100.0, 120.0])
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        conn.execute("PRAGMA journal_mode = DELETE")
+
+    output = str(tmp_path / "records.csv")
+    assert exporter.main([output, "--db", path, "--ledger", "现金"]) == 0
+    assert _journal_mode(path) == "delete"
+    with open(output, encoding="utf-8-sig", newline="") as f:
+        assert len(list(csv.reader(f))) == 3
+
+
+def test_export_refuses_old_database(tmp_path, capsys):
+    path = str(tmp_path / "client.db")
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        conn.execute("CREATE TABLE ledgers (id INTEGER PRIMARY KEY, name TEXT)")
+    assert exporter.main([str(tmp_path / "records.csv"), "--db", path]) == 1
+    assert "只读" in capsys.readouterr().err
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
@@ -0,0 +1,54 @@
+# test_importer.py
+"""导入的解析、错误统计和去重"""
+import csv
+from datetime import datetime
+
+from conftest import add_ledger
+from importer import ColumnMapping, import_file, import_rows
+
+ROWS = [
+    {"账本": "现金", "金额": "1,000.50", "时间": "2024-01-05 10:00:00", "盘点周期": "2024年Q1", "备注": "工资"},
+    {"账本": "现金", "金额": "900", "时间": "2024/02/05 10:00", "盘点周期": "2024年Q1", "备注": ""},
+    {"账本": "基金", "金额": "300", "时间": "2024-01-20", "盘点周期": "", "备注": "定投"},
+]
+
+
+def test_import_creates_ledgers_and_records(db):
+    result = import_rows(db, iter(ROWS))
+    assert (result.rows, result.inserted, result.duplicates, result.error_count) == (3, 3, 0, 0)
+    assert result.ledgers_created == ["现金", "基金"]
+    assert {s.ledger.name: s.current_amount for s in db.get_ledger_summaries()} == {"现金": 900.0, "基金": 300.0}
+
+
+def test_import_twice_skips_duplicates(db):
+    import_rows(db, iter(ROWS))
+    result = import_rows(db, iter(ROWS), chunk_size=2)
+    assert (result.rows, result.inserted, result.duplicates) == (3, 0, 3)
+    assert result.ledgers_created == []
+    assert db.count_records() == 3
+
+
+def test_import_skips_existing_records_and_reports_errors(db):
+    # 手动录入过的记录（同一账本同一时间）也视为重复
+    add_ledger(db, "现金", [1000.5], start=datetime(2024, 1, 5, 10))
+    rows = ROWS + [{"账本": "", "金额": "1", "时间": "2024-01-01"},
+                   {"账本": "现金", "金额": "abc", "时间": "2024-01-01"},
+                   {"账本": "股票", "金额": "1", "时间": "2024-01-01"}]
+    result = import_rows(db, iter(rows), create_ledgers=False)
+    assert (result.rows, result.inserted, result.duplicates, result.error_count) == (6, 1, 1, 4)
+    assert result.errors[0].startswith("第 4 行")
+    assert db.count_records() == 2
+
+
+def test_import_csv_with_mapping(db, tmp_path):
+    path = tmp_path / "records.csv"
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["account", "value", "date"])
+        writer.writerow(["现金", "12.5", "05/01/2024"])
+        writer.writerow(["现金", "12.5", "05/01/2024"])
+    mapping = ColumnMapping(ledger="account", amount="value", created_at="date", period=None, note=None,
+                            date_format="%d/%m/%Y")
+    result = import_file(db, str(path), mapping)
+    assert (result.inserted, result.duplicates) == (1, 1)
+    assert db.get_all_records()[0].created_at.month == 1
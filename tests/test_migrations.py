@@ -0,0 +1,125 @@
+# test_migrations.py
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import migrations
+from database import Database, to_epoch
+from models import RecordFilter
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    migrations.migrate(conn)
+    yield conn
+    conn.close()
+
+
+def test_query_plans_use_indexes(conn):
+    for name, plan, ok in migrations.check_query_plans(conn):
+        assert ok, f"{name}: {plan}"
+        assert not any('TEMP B-TREE' in line for line in plan), name
+
+
+def test_query_plan_check_flags_temp_btree(conn):
+    # amount 排在隐含的 rowid 之前时，按 (created_at, id) 排序需要临时 B 树
+    conn.execute('DROP INDEX idx_asset_records_ledger_time')
+    conn.execute('CREATE INDEX idx_asset_records_ledger_time ON asset_records (ledger_id, created_at, amount)')
+    results = {name: ok for name, _, ok in migrations.check_query_plans(conn)}
+    assert not results['每个账本最近两条记录']
+
+
+def _baseline_database(path):
+    """最初版本程序创建的数据库：无外键约束、时间为文本"""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE ledgers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE asset_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ledger_id INTEGER,
+            amount REAL NOT NULL,
+            note TEXT,
+            period TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (ledger_id) REFERENCES ledgers (id)
+        );
+        INSERT INTO ledgers (name, description, created_at) VALUES
+            ('银行卡', '工资卡', '2023-12-31 08:00:00'),
+            ('基金', '', '2023-12-31 08:00:00.250000');
+        INSERT INTO asset_records (ledger_id, amount, note, period, created_at) VALUES
+            (1, 1000.0, '工资入账', '2024年Q1', '2024-01-05 10:00:00'),
+            (1, 1500.0, '年终奖', '2024年Q1', '2024-02-05 10:00:00.500000'),
+            (2, 300.0, '定投', '2024年Q1', '2024-01-20 09:30:00'),
+            (2, 280.0, '', '2024年Q1', '2024-01-20 09:30:00'),
+            (9, 1.0, '已删除账本的记录', '', '2024-01-01 00:00:00');
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def test_migrate_baseline_database(tmp_path):
+    path = str(tmp_path / "accounting.db")
+    _baseline_database(path)
+    conn = sqlite3.connect(path)
+    try:
+        assert migrations.get_version(conn) == 0
+        assert migrations.migrate(conn) == migrations.SCHEMA_VERSION
+        assert migrations.get_version(conn) == migrations.SCHEMA_VERSION
+        assert migrations.migrate(conn) == 0
+        assert conn.execute('PRAGMA foreign_key_check').fetchall() == []
+
+        # 没有对应账本的记录被清理，时间转换为整数秒
+        rows = conn.execute('SELECT id, ledger_id, amount, created_at FROM asset_records ORDER BY id').fetchall()
+        assert rows == [
+            (1, 1, 1000.0, to_epoch(datetime(2024, 1, 5, 10))),
+            (2, 1, 1500.0, to_epoch(datetime(2024, 2, 5, 10))),
+            (3, 2, 300.0, to_epoch(datetime(2024, 1, 20, 9, 30))),
+            (4, 2, 280.0, to_epoch(datetime(2024, 1, 20, 9, 30))),
+        ]
+        assert conn.execute('SELECT typeof(created_at) FROM ledgers').fetchall() == [('integer',), ('integer',)]
+
+        # 余额快照取每个账本最新的记录（时间相同取 id 较大者）
+        assert conn.execute('SELECT ledger_id, record_id, amount FROM ledger_balances ORDER BY ledger_id').fetchall() \
+            == [(1, 2, 1500.0), (2, 4, 280.0)]
+
+        # 已有数据记为本机修改，首次同步时全部发送
+        assert conn.execute('SELECT kind, ledger_name, first_record_id, last_record_id FROM change_log ORDER BY seq') \
+            .fetchall() == [('ledger_created', '银行卡', None, None), ('ledger_created', '基金', None, None),
+                            ('records_added', None, 1, 4)]
+        assert len(conn.execute('SELECT database_id FROM sync_state').fetchone()[0]) == 32
+
+        for name, plan, ok in migrations.check_query_plans(conn):
+            assert ok, f"{name}: {plan}"
+    finally:
+        conn.close()
+
+    # 迁移后的数据库可以直接使用：删除账本级联删除记录，全文搜索可用
+    with Database(path) as db:
+        summaries = {s.ledger.name: s for s in db.get_ledger_summaries()}
+        assert summaries['银行卡'].current_amount == 1500.0
+        assert summaries['银行卡'].previous_amount == 1000.0
+        assert [r.id for r in db.iter_records(record_filter=RecordFilter(text="年终"))] == [2]
+        db.delete_ledger(1)
+        assert db.count_records() == 2
+
+
+def test_migrate_keeps_sequence_of_emptied_table(tmp_path):
+    # 记录已全部删除时也不能复用旧 id，变更日志和同步按记录 id 区分新增记录
+    path = str(tmp_path / "accounting.db")
+    _baseline_database(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('DELETE FROM asset_records')
+        conn.commit()
+        migrations.migrate(conn)
+        conn.execute("INSERT INTO asset_records (ledger_id, amount, created_at) VALUES (1, 1.0, 0)")
+        assert conn.execute('SELECT MAX(id) FROM asset_records').fetchone()[0] == 6
+    finally:
+        conn.close()
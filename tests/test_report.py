@@ -0,0 +1,66 @@
+# test_report.py
+"""报表生成不修改客户的数据库文件"""
+import contextlib
+import hashlib
+import os
+import sqlite3
+
+import migrations
+import report
+from conftest import add_ledger
+from database import Database
+
+
+def _journal_mode(path):
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        return conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+
+def _digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _client_database(path):
+    """其他工具创建的、使用回滚日志的数据库"""
+    with Database(path) as db:
+        add_ledger(db, "现金", [100.0, 120.0])
+        add_ledger(db, "基金", [300.0])
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        conn.execute("PRAGMA journal_mode = DELETE")
+    assert _journal_mode(path) == "delete"
+
+
+def test_report_keeps_journal_mode(tmp_path):
+    path = str(tmp_path / "client.db")
+    _client_database(path)
+    digest = _digest(path)
+
+    result = report.generate_report(path, str(tmp_path / "out"), formats=("csv",))
+    assert result["ok"], result["error"]
+    assert (result["ledgers"], result["records"], result["total"]) == (2, 3, 420.0)
+    assert _journal_mode(path) == "delete"
+    assert _digest(path) == digest
+    assert not os.path.exists(path + "-wal")
+
+
+def test_report_migrate_keeps_journal_mode(tmp_path):
+    # 上一个结构版本的数据库
+    path = str(tmp_path / "client.db")
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        for version, migration in enumerate(migrations.MIGRATIONS[:-1], start=1):
+            migration(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version:d}")
+        conn.execute("INSERT INTO ledgers (name, description) VALUES ('现金', '')")
+        conn.execute("INSERT INTO asset_records (ledger_id, amount, created_at) VALUES (1, 100.0, 0)")
+        conn.commit()
+    assert _journal_mode(path) == "delete"
+
+    result = report.generate_report(path, str(tmp_path / "out"), formats=("csv",))
+    assert not result["ok"] and "--migrate" in result["error"]
+
+    result = report.generate_report(path, str(tmp_path / "out"), formats=("csv",), migrate=True)
+    assert result["ok"], result["error"]
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        assert migrations.get_version(conn) == migrations.SCHEMA_VERSION
+    assert _journal_mode(path) == "delete"
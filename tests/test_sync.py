@@ -0,0 +1,136 @@
+# test_sync.py
+"""两个数据库通过共享文件夹同步"""
+import os
+import shutil
+from datetime import timedelta
+
+import pytest
+
+import backup
+import sync
+from conftest import START, add_ledger, record_rows
+from database import Database
+from models import AssetRecord
+
+
+@pytest.fixture
+def pair(tmp_path):
+    a = Database(str(tmp_path / "a.db"))
+    b = Database(str(tmp_path / "b.db"))
+    yield a, b
+    a.close()
+    b.close()
+
+
+def sync_both(a, b, directory):
+    """各同步两轮：第二轮让双方确认收到的水位"""
+    for _ in range(2):
+        sync.sync(a, directory)
+        sync.sync(b, directory)
+
+
+def test_sync_copies_changes_both_ways(pair, tmp_path):
+    a, b = pair
+    shared = str(tmp_path / "shared")
+    add_ledger(a, "现金", [100.0, 120.0])
+    add_ledger(b, "基金", [300.0])
+    sync_both(a, b, shared)
+    assert record_rows(a.db_path) == record_rows(b.db_path)
+    assert a.count_records() == 3
+
+    # 水位已确认，再同步不重复写入，变更文件中不再有旧修改
+    result = sync.sync(a, shared)
+    assert result.changes == 0
+    assert all(peer.records_added == 0 for peer in result.peers)
+
+    cash = next(l for l in b.get_all_ledgers() if l.name == "现金")
+    b.add_asset_record(AssetRecord(id=None, ledger_id=cash.id, amount=90.0, note="", period="",
+                                   created_at=START + timedelta(days=9)))
+    b.delete_ledger(next(l for l in b.get_all_ledgers() if l.name == "基金").id)
+    sync_both(a, b, shared)
+    assert record_rows(a.db_path) == record_rows(b.db_path)
+    assert [l.name for l in a.get_all_ledgers()] == ["现金"]
+
+
+def test_sync_deduplicates_identical_records(pair, tmp_path):
+    # 两台电脑各自录入了同一账本同一时间的记录
+    a, b = pair
+    shared = str(tmp_path / "shared")
+    add_ledger(a, "现金", [100.0, 120.0])
+    add_ledger(b, "现金", [100.0, 120.0, 130.0])
+    sync_both(a, b, shared)
+    assert a.count_records() == b.count_records() == 3
+    assert [r.amount for r in a.get_ledger_history(a.get_all_ledgers()[0].id)] == [130.0, 120.0, 100.0]
+
+    # 变更文件被重新应用（水位丢失）也不会产生重复记录
+    for peer in a.get_sync_peers():
+        peer.received_seq = 0
+        a.save_sync_peer(peer)
+    result = sync.sync(a, shared)
+    assert result.peers[0].records_added == 0
+    assert a.count_records() == 3
+
+
+def _add(db, name, amount, days):
+    ledger = next(l for l in db.get_all_ledgers() if l.name == name)
+    db.add_asset_record(AssetRecord(id=None, ledger_id=ledger.id, amount=amount, note="", period="",
+                                    created_at=START + timedelta(days=days)))
+
+
+def test_sync_after_restore(pair, tmp_path):
+    a, b = pair
+    shared = str(tmp_path / "shared")
+    add_ledger(a, "现金", [100.0, 120.0])
+    sync_both(a, b, shared)
+    snapshot = backup.backup(a.db_path, str(tmp_path / "snapshots")).path
+
+    # 备份之后的修改已同步给对方
+    _add(a, "现金", 130.0, 5)
+    _add(a, "现金", 140.0, 6)
+    sync_both(a, b, shared)
+    a.close()
+
+    backup.restore(snapshot, a.db_path, safety_backup=False)
+    with Database(a.db_path) as restored:
+        assert restored.database_id != a.database_id
+        _add(restored, "现金", 99.0, 7)
+        sync_both(restored, b, shared)
+        assert 99.0 in [r.amount for r in b.get_all_records()]
+        assert b.count_records() == 5
+
+
+@pytest.mark.parametrize("extra", [1, 3])
+def test_sync_after_copying_old_file(pair, tmp_path, extra):
+    # 不经过 backup.restore，直接用旧文件覆盖：数据库标识和日志都是旧的，
+    # 回退后新写的修改（比丢失的多或少）沿用对方已收到过的 seq
+    a, b = pair
+    shared = str(tmp_path / "shared")
+    add_ledger(a, "现金", [100.0, 120.0])
+    add_ledger(b, "基金", [300.0])
+    sync_both(a, b, shared)
+    a.close()
+    old = str(tmp_path / "old.db")
+    shutil.copyfile(a.db_path, old)
+
+    with Database(a.db_path) as current:
+        _add(current, "现金", 130.0, 5)
+        _add(current, "现金", 140.0, 6)
+        sync_both(current, b, shared)
+    os.replace(old, a.db_path)
+
+    with Database(a.db_path) as restored:
+        amounts = [90.0 + i for i in range(extra)]
+        for i, amount in enumerate(amounts):
+            _add(restored, "现金", amount, 7 + i)
+        assert sync.sync(restored, shared).restarted
+        sync_both(restored, b, shared)
+        assert set(amounts) <= {r.amount for r in b.get_all_records()}
+        assert b.count_records() == 5 + extra
+        # 之后双方的修改照常同步，不再当作回退
+        _add(b, "基金", 320.0, 20)
+        _add(restored, "现金", 98.0, 21)
+        assert not sync.sync(restored, shared).restarted
+        sync_both(restored, b, shared)
+        assert 320.0 in [r.amount for r in restored.get_all_records()]
+        assert 98.0 in [r.amount for r in b.get_all_records()]
+        assert b.count_records() == 7 + extra
@@ -0,0 +1,95 @@
+# trend_view.py
+"""可交互的趋势图控件
+
+趋势图需要缩放和平移，因此直接在界面线程中用 matplotlib 的 Qt 画布绘制，
+而不像其他图表那样在后台线程离屏渲染成图片。
+画布有自己的 Figure，只在界面线程中使用；matplotlib 的字体等缓存是进程内共享的，
+绘制时与后台线程的离屏渲染一样持有 charts.RENDER_LOCK，后台正在渲染时最多等待一张图表。
+"""
+from PySide6.QtWidgets import QWidget, QVBoxLayout
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg, NavigationToolbar2QT
+
+import charts
+import profiling
+
+
+class TrendCanvas(FigureCanvasQTAgg):
+    """折线单独绘制（blit）的画布
+
+    折线设为 animated，完整绘制时先画坐标轴、刻度、图例等背景并用 copy_from_bbox 缓存，
+    再把折线画上去。之后只有折线数据变化、显示范围和尺寸都不变时，
+    恢复缓存的背景并只重画折线。缩放、平移会改变刻度，仍然完整绘制。
+    """
+    def __init__(self, figure):
+        super().__init__(figure)
+        self.lines = []
+        self.background = None
+        self.background_key = None
+
+    def set_lines(self, lines):
+        """设置单独绘制的折线，之后需要完整绘制一次以缓存不含折线的背景"""
+        for line in self.lines:
+            line.set_animated(False)
+        self.lines = list(lines)
+        for line in self.lines:
+            line.set_animated(True)
+        self.background = None
+
+    def _view_key(self):
+        return (tuple(self.figure.bbox.bounds),
+                tuple(tuple(ax.viewLim.bounds) for ax in self.figure.axes))
+
+    def _draw_lines(self):
+        for line in self.lines:
+            line.axes.draw_artist(line)
+
+    def draw(self):
+        with charts.RENDER_LOCK, profiling.section("trend_view.TrendCanvas.draw"):
+            super().draw()
+            if self.lines:
+                self.background = self.copy_from_bbox(self.figure.bbox)
+                self.background_key = self._view_key()
+                self._draw_lines()
+
+    def blit_lines(self) -> bool:
+        """缓存的背景仍然有效时只重画折线，返回是否已完成（否则需要完整绘制）"""
+        if self.background is None or not self.lines or self._view_key() != self.background_key:
+            return False
+        with charts.RENDER_LOCK, profiling.section("trend_view.TrendCanvas.blit_lines"):
+            self.restore_region(self.background)
+            self._draw_lines()
+            self.blit(self.figure.bbox)
+        return True
+
+
+class TrendView(QWidget):
+    """带导航工具栏（缩放、平移、还原）的图表"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.figure = Figure()
+        self.canvas = TrendCanvas(self.figure)
+        self.toolbar = NavigationToolbar2QT(self.canvas, self)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.toolbar)
+        layout.addWidget(self.canvas)
+
+    def plot(self, draw, *args, update=None):
+        """用 charts 中的绘制函数 draw(fig, *args) 重新绘制
+
+        给出 update（charts 中对应的 update_* 函数）时先尝试原地更新已有折线，
+        显示范围没有变化时只重画折线；图表结构变化无法更新时才清空重绘。
+        """
+        # 绘制函数会计算 tight_layout 等文字排版，同样要与后台渲染串行
+        with charts.RENDER_LOCK:
+            updated = update is not None and update(self.figure, *args)
+            if not updated:
+                self.figure.clear()
+                draw(self.figure, *args)
+                self.canvas.set_lines(charts.dynamic_artists(self.figure))
+        if not updated or not self.canvas.blit_lines():
+            self.canvas.draw_idle()
+        # 清空导航历史，"还原"按钮回到新数据的初始视图
+        self.toolbar.update()
@@ -1,27 +1,28 @@
 # ui.py 
+import os
 import sys
 from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                                QPushButton, QStackedWidget, QFrame, QApplication,
                                QGroupBox, QLineEdit, QTextEdit, QComboBox, QTableWidget,
                                QTableWidgetItem, QLabel, QMessageBox, QListWidget, 
-                               QGridLayout, QScrollArea, QDateEdit)
-from PySide6.QtCore import Qt, QDateTime
-from PySide6.QtGui import QFont
+                               QGridLayout, QScrollArea, QDateEdit, QTableView,
+                               QAbstractItemView, QFileDialog, QDialog, QDialogButtonBox,
+                               QCheckBox, QTabWidget, QHeaderView)
+from PySide6.QtCore import Qt, QDate, QDateTime, QAbstractTableModel, QModelIndex, QTimer, Signal
+from PySide6.QtGui import QFont, QImage, QPixmap, QDoubleValidator, QKeySequence, QShortcut
 from database import Database
-from models import Ledger, AssetRecord
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-import numpy as np
+import profiling
+from cache import QueryCache
+from models import Ledger, AssetRecord, RecordFilter, ChangeKind
+from workers import TaskRunner, DatabaseEvents
 from datetime import datetime
-# 设置matplotlib中文字体支持
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans']
-plt.rcParams['axes.unicode_minus'] = False
+# charts（matplotlib/numpy）和 importer 在首次使用时才导入，以加快启动
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.db = Database()
+        self.db_events = DatabaseEvents(self.db, self)
         self.init_ui()
     
     def init_ui(self):
@@ -46,6 +47,10 @@ class MainWindow(QMainWindow):
         
         # 默认显示资产管理页面
         self.show_asset_management()
+        
+        # 隐藏的诊断面板
+        self.diagnostics_dialog = None
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self.show_diagnostics)
     
     def create_menu_bar(self, parent_layout):
         """创建顶部菜单按钮"""
@@ -81,32 +86,331 @@ class MainWindow(QMainWindow):
         self.stacked_widget = QStackedWidget()
         parent_layout.addWidget(self.stacked_widget)
         
-        # 创建页面实例
-        self.asset_management_page = AssetManagementPage(self.db)
-        self.asset_statistics_page = AssetStatisticsPage(self.db)
+        # 创建页面实例；统计页面在第一次打开时才创建
+        self.asset_management_page = AssetManagementPage(self.db, self.db_events)
+        self.asset_statistics_page = None
         
         # 添加页面到堆栈
         self.stacked_widget.addWidget(self.asset_management_page)
-        self.stacked_widget.addWidget(self.asset_statistics_page)
     
     def show_asset_management(self):
         """显示资产盘点页面"""
-        self.stacked_widget.setCurrentIndex(0)
+        # 离开统计页面时放弃其未完成的加载
+        if self.asset_statistics_page is not None:
+            self.asset_statistics_page.cancel_refresh()
+        self.stacked_widget.setCurrentWidget(self.asset_management_page)
         self.asset_management_btn.setEnabled(False)
         self.asset_statistics_btn.setEnabled(True)
     
     def show_asset_statistics(self):
-        """显示资产统计页面"""
-        self.stacked_widget.setCurrentIndex(1)
+        """显示资产统计页面（数据未变化时不会重新加载）"""
+        if self.asset_statistics_page is None:
+            self.asset_statistics_page = AssetStatisticsPage(self.db, self.db_events)
+            self.stacked_widget.addWidget(self.asset_statistics_page)
+        self.stacked_widget.setCurrentWidget(self.asset_statistics_page)
         self.asset_statistics_btn.setEnabled(False)
         self.asset_management_btn.setEnabled(True)
         self.asset_statistics_page.refresh_statistics()
 
+    def show_diagnostics(self):
+        """打开性能诊断面板"""
+        if self.diagnostics_dialog is None:
+            self.diagnostics_dialog = DiagnosticsDialog(self.db, self)
+        self.diagnostics_dialog.show()
+        self.diagnostics_dialog.raise_()
+    
+    def closeEvent(self, event):
+        """关闭窗口时等待后台任务结束并释放数据库连接"""
+        self.asset_management_page.runner.shutdown()
+        if self.asset_statistics_page is not None:
+            self.asset_statistics_page.runner.shutdown()
+        self.db_events.detach()
+        self.db.close()
+        super().closeEvent(event)
+
+class HistoryTableModel(QAbstractTableModel):
+    """历史记录表格模型
+
+    通过 Database.iter_records 按需分页加载：视图滚动到底部时才读取下一页，
+    首次显示只需查询一页数据。record_filter 为当前的筛选条件，随 reload 一起更新。
+    """
+    HEADERS = ["时间", "账本", "金额", "盘点周期", "备注"]
+    
+    def __init__(self, db, page_size=100, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.page_size = page_size
+        self.records = []
+        self.ledger_names = {}
+        self.record_filter = None
+        self.exhausted = False
+    
+    def reload(self, ledger_names, first_page=None, record_filter=None):
+        """清空已加载的数据，重新从第一页开始
+        
+        first_page 为已在后台线程按 record_filter 读取好的第一页记录，
+        为 None 时立即同步读取第一页。
+        """
+        self.beginResetModel()
+        self.records = list(first_page or [])
+        self.ledger_names = ledger_names
+        self.record_filter = record_filter
+        self.exhausted = first_page is not None and len(self.records) < self.page_size
+        self.endResetModel()
+        # 视图在重置后不一定会主动调用 fetchMore
+        if first_page is None:
+            self.fetchMore()
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.records)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        
+        record = self.records[index.row()]
+        column = index.column()
+        if column == 0:
+            return record.created_at.strftime("%Y-%m-%d %H:%M")
+        if column == 1:
+            return self.ledger_names.get(record.ledger_id, "未知")
+        if column == 2:
+            return f"¥{record.amount:,.2f}"
+        if column == 3:
+            return record.period
+        return record.note
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+    
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        
+        after = None
+        if self.records:
+            last = self.records[-1]
+            after = (last.created_at, last.id)
+        page = list(self.db.iter_records(after=after, limit=self.page_size,
+                                         record_filter=self.record_filter))
+        if len(page) < self.page_size:
+            self.exhausted = True
+        if not page:
+            return
+        
+        start = len(self.records)
+        self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+        self.records.extend(page)
+        self.endInsertRows()
+
+class StocktakeDialog(QDialog):
+    """批量盘点：同一盘点周期内一次录入所有账本的金额
+
+    summaries 为各账本的统计信息（在后台线程读取后传入）。
+    """
+    def __init__(self, db, summaries, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.setWindowTitle("批量盘点")
+        self.resize(700, 500)
+        self.summaries = summaries
+        self.init_ui()
+    
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        
+        # 盘点日期与周期（所有账本共用）
+        form_layout = QHBoxLayout()
+        form_layout.addWidget(QLabel("盘点日期:"))
+        self.date_input = QDateEdit()
+        self.date_input.setDateTime(QDateTime.currentDateTime())
+        self.date_input.setDisplayFormat("yyyy-MM-dd HH:mm")
+        self.date_input.setCalendarPopup(True)
+        form_layout.addWidget(self.date_input)
+        form_layout.addWidget(QLabel("盘点周期:"))
+        self.period_input = QLineEdit()
+        self.period_input.setPlaceholderText("例子：xx年年初第n次盘点")
+        form_layout.addWidget(self.period_input)
+        layout.addLayout(form_layout)
+        
+        # 每个账本一行，本次金额默认为上次金额，从未记录过的账本留空；金额为空的账本不记录
+        self.table = QTableWidget(len(self.summaries), 4)
+        self.table.setHorizontalHeaderLabels(["账本", "上次金额", "本次金额", "备注"])
+        self.table.horizontalHeader().setStretchLastSection(True)
+        for row, summary in enumerate(self.summaries):
+            recorded = summary.last_updated is not None
+            name_item = QTableWidgetItem(summary.ledger.name)
+            name_item.setFlags(name_item.flags() & ~Qt.ItemIsEditable)
+            last_item = QTableWidgetItem(f"¥{summary.current_amount:,.2f}" if recorded else "无记录")
+            last_item.setFlags(last_item.flags() & ~Qt.ItemIsEditable)
+            self.table.setItem(row, 0, name_item)
+            self.table.setItem(row, 1, last_item)
+            self.table.setItem(row, 2, QTableWidgetItem(f"{summary.current_amount:.2f}" if recorded else ""))
+            self.table.setItem(row, 3, QTableWidgetItem(""))
+        layout.addWidget(self.table)
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.save)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+    
+    def collect_records(self):
+        """读取表格中的输入，金额无效时返回 None"""
+        created_at = self.date_input.dateTime().toPython()
+        period = self.period_input.text().strip()
+        records = []
+        for row, summary in enumerate(self.summaries):
+            amount_str = self.table.item(row, 2).text().strip().replace(",", "").lstrip("¥")
+            if not amount_str:
+                continue
+            try:
+                amount = float(amount_str)
+            except ValueError:
+                QMessageBox.warning(self, "错误", f"账本 '{summary.ledger.name}' 的金额无效")
+                return None
+            records.append(AssetRecord(
+                id=None,
+                ledger_id=summary.ledger.id,
+                amount=amount,
+                note=self.table.item(row, 3).text().strip(),
+                period=period,
+                created_at=created_at
+            ))
+        return records
+    
+    def save(self):
+        """在一个事务中保存整次盘点"""
+        records = self.collect_records()
+        if records is None:
+            return
+        if not records:
+            QMessageBox.warning(self, "错误", "没有需要记录的账本")
+            return
+        
+        try:
+            self.db.add_asset_records(records)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"保存盘点失败: {str(e)}")
+            return
+        self.accept()
+
+class DiagnosticsDialog(QDialog):
+    """性能诊断面板：显示 profiling 收集的统计，每秒刷新一次"""
+    COLUMNS = ["名称", "次数", "总耗时(ms)", "平均(ms)", "最大(ms)", "行数", "VM 步数"]
+    
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.setWindowTitle("性能诊断")
+        self.resize(1000, 600)
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.init_ui()
+    
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        
+        controls = QHBoxLayout()
+        self.enabled_checkbox = QCheckBox("启用性能剖析")
+        self.enabled_checkbox.setChecked(profiling.PROFILER.enabled)
+        self.enabled_checkbox.toggled.connect(self.set_enabled)
+        controls.addWidget(self.enabled_checkbox)
+        reset_btn = QPushButton("清零")
+        reset_btn.clicked.connect(self.reset)
+        controls.addWidget(reset_btn)
+        dump_btn = QPushButton("导出 JSON")
+        dump_btn.clicked.connect(self.dump)
+        controls.addWidget(dump_btn)
+        controls.addStretch()
+        self.cache_label = QLabel()
+        controls.addWidget(self.cache_label)
+        layout.addLayout(controls)
+        
+        # 每个统计类别一个表格
+        self.tabs = QTabWidget()
+        self.tables = {}
+        for kind, title in profiling.KINDS.items():
+            table = QTableWidget(0, len(self.COLUMNS))
+            table.setHorizontalHeaderLabels(self.COLUMNS)
+            table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+            table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+            table.verticalHeader().hide()
+            self.tables[kind] = table
+            self.tabs.addTab(table, title)
+        layout.addWidget(self.tabs)
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.refresh_timer.start()
+    
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+    
+    def set_enabled(self, enabled):
+        profiling.PROFILER.enabled = enabled
+    
+    def reset(self):
+        profiling.PROFILER.reset()
+        self.refresh()
+    
+    def dump(self):
+        path, _ = QFileDialog.getSaveFileName(self, "导出性能统计", "profile.json", "JSON (*.json)")
+        if not path:
+            return
+        try:
+            profiling.PROFILER.dump(path)
+        except OSError as e:
+            QMessageBox.critical(self, "错误", f"导出失败: {str(e)}")
+    
+    def refresh(self):
+        """按总耗时从高到低显示当前统计"""
+        stats = self.db.cache_stats()
+        self.cache_label.setText(f"查询缓存: {stats.size}/{stats.capacity} 项，命中率 {stats.hit_rate:.1%}，"
+                                 f"失效 {stats.invalidations} 次")
+        snapshot = profiling.PROFILER.snapshot()["stats"]
+        for kind, table in self.tables.items():
+            entries = sorted(snapshot[kind].items(), key=lambda item: (item[1]["total_ms"], item[1]["count"]), reverse=True)
+            table.setRowCount(len(entries))
+            for row, (name, stat) in enumerate(entries):
+                values = [name, f"{stat['count']}", f"{stat['total_ms']:.1f}", f"{stat['mean_ms']:.3f}",
+                          f"{stat['max_ms']:.3f}", f"{stat['rows']}", f"{stat['vm_steps']}"]
+                for column, value in enumerate(values):
+                    item = table.item(row, column)
+                    if item is None:
+                        item = QTableWidgetItem()
+                        table.setItem(row, column, item)
+                    item.setText(value)
+                    if column:
+                        item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                table.item(row, 0).setToolTip(name)
+
 # 资产管理页面类
 class AssetManagementPage(QWidget):
-    def __init__(self, db):
+    def __init__(self, db, events):
         super().__init__()
         self.db = db
+        self.ledger_objects = []
+        self.ledger_combo_objects = []
+        self.runner = TaskRunner(parent=self)
+        self.runner.busy_changed.connect(self.on_busy_changed)
+        # 写操作后按变更事件局部更新，不再整页重新加载
+        events.changed.connect(self.on_data_changed)
+        # 批量导入会连续产生多个事件、筛选条件会连续输入，合并后只重载一次历史记录
+        self.history_reload_timer = QTimer(self)
+        self.history_reload_timer.setSingleShot(True)
+        self.history_reload_timer.setInterval(100)
+        self.history_reload_timer.timeout.connect(self.reload_history)
         self.init_ui()
         self.refresh_data()
     
@@ -115,12 +419,21 @@ class AssetManagementPage(QWidget):
         layout.setSpacing(10)
         
         # 标题
+        title_layout = QHBoxLayout()
         title_label = QLabel("资产盘点")
         title_font = QFont()
         title_font.setPointSize(16)
         title_font.setBold(True)
         title_label.setFont(title_font)
-        layout.addWidget(title_label)
+        title_layout.addWidget(title_label)
+        
+        # 加载状态
+        self.loading_label = QLabel("加载中...")
+        self.loading_label.setStyleSheet("color: gray;")
+        self.loading_label.hide()
+        title_layout.addWidget(self.loading_label)
+        title_layout.addStretch()
+        layout.addLayout(title_layout)
         
         # 创建主内容区域（水平布局）
         main_content_layout = QHBoxLayout()
@@ -234,6 +547,21 @@ class AssetManagementPage(QWidget):
         update_asset_btn.clicked.connect(self.add_asset_record)
         record_layout.addWidget(update_asset_btn)
         
+        # 批量盘点按钮
+        self.stocktake_btn = QPushButton("批量盘点")
+        self.stocktake_btn.clicked.connect(self.open_stocktake)
+        record_layout.addWidget(self.stocktake_btn)
+        
+        # 批量导入按钮
+        import_btn = QPushButton("导入记录 (CSV/XLSX)")
+        import_btn.clicked.connect(self.import_records)
+        record_layout.addWidget(import_btn)
+        
+        # 备份按钮
+        self.backup_btn = QPushButton("备份数据库")
+        self.backup_btn.clicked.connect(self.backup_database)
+        record_layout.addWidget(self.backup_btn)
+        
         parent_layout.addWidget(record_group)
     
     def create_history_group(self, parent_layout):
@@ -241,64 +569,237 @@ class AssetManagementPage(QWidget):
         history_group = QGroupBox("历史记录")
         history_layout = QVBoxLayout(history_group)
         
-        # 历史记录表格
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(5)
-        self.history_table.setHorizontalHeaderLabels(["时间", "账本", "金额", "盘点周期", "备注"])
-        self.history_table.setEditTriggers(QTableWidget.NoEditTriggers)  # 设置为只读
+        # 筛选条件：在数据库中完成筛选，修改后稍作延迟再重新加载，连续输入只查询一次
+        filter_layout = QHBoxLayout()
+        self.filter_ledger_combobox = QComboBox()
+        self.filter_ledger_combobox.addItem("全部账本", None)
+        self.filter_ledger_combobox.currentIndexChanged.connect(self.on_filter_changed)
+        filter_layout.addWidget(self.filter_ledger_combobox)
+        
+        self.filter_date_checkbox = QCheckBox("日期")
+        self.filter_date_checkbox.toggled.connect(self.on_filter_changed)
+        filter_layout.addWidget(self.filter_date_checkbox)
+        today = QDate.currentDate()
+        self.filter_start_date = QDateEdit(today.addMonths(-1))
+        self.filter_end_date = QDateEdit(today)
+        for date_edit in (self.filter_start_date, self.filter_end_date):
+            date_edit.setDisplayFormat("yyyy-MM-dd")
+            date_edit.setCalendarPopup(True)
+            date_edit.setEnabled(False)
+            date_edit.dateChanged.connect(self.on_filter_changed)
+        filter_layout.addWidget(self.filter_start_date)
+        filter_layout.addWidget(QLabel("至"))
+        filter_layout.addWidget(self.filter_end_date)
+        
+        self.filter_min_amount = QLineEdit()
+        self.filter_min_amount.setPlaceholderText("最小金额")
+        self.filter_max_amount = QLineEdit()
+        self.filter_max_amount.setPlaceholderText("最大金额")
+        for amount_input in (self.filter_min_amount, self.filter_max_amount):
+            amount_input.setValidator(QDoubleValidator(amount_input))
+            amount_input.setMaximumWidth(90)
+            amount_input.textChanged.connect(self.on_filter_changed)
+        filter_layout.addWidget(self.filter_min_amount)
+        filter_layout.addWidget(QLabel("-"))
+        filter_layout.addWidget(self.filter_max_amount)
+        
+        self.filter_period_combobox = QComboBox()
+        self.filter_period_combobox.addItem("全部周期", None)
+        self.filter_period_combobox.currentIndexChanged.connect(self.on_filter_changed)
+        filter_layout.addWidget(self.filter_period_combobox)
+        
+        self.filter_text_input = QLineEdit()
+        self.filter_text_input.setPlaceholderText("搜索备注/盘点周期")
+        self.filter_text_input.textChanged.connect(self.on_filter_changed)
+        filter_layout.addWidget(self.filter_text_input, 1)
+        
+        clear_filter_btn = QPushButton("清除")
+        clear_filter_btn.clicked.connect(self.clear_filter)
+        filter_layout.addWidget(clear_filter_btn)
+        
+        self.history_count_label = QLabel()
+        filter_layout.addWidget(self.history_count_label)
+        history_layout.addLayout(filter_layout)
+        
+        # 历史记录表格（滚动时按页加载）
+        self.history_model = HistoryTableModel(self.db, parent=self)
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_model)
+        self.history_table.setEditTriggers(QAbstractItemView.NoEditTriggers)  # 设置为只读
         self.history_table.horizontalHeader().setStretchLastSection(True)
         history_layout.addWidget(self.history_table)
         
         parent_layout.addWidget(history_group)
     
     def refresh_data(self):
-        """刷新所有数据"""
-        self.refresh_ledger_list()
-        self.refresh_ledger_combobox()
-        self.refresh_history()
+        """刷新所有数据（在后台线程查询数据库）"""
+        self.runner.submit("data", self.load_data, self.history_model.page_size, self.current_filter(),
+                           on_done=self.apply_data, on_error=self.on_load_error)
+    
+    @profiling.timed()
+    def load_data(self, token, page_size, record_filter):
+        """后台线程：读取账本列表和第一页历史记录"""
+        ledgers = self.db.get_all_ledgers()
+        token.check()
+        return (ledgers,) + self.load_history_page(token, page_size, record_filter)
+    
+    @profiling.timed()
+    def apply_data(self, result):
+        """界面线程：用加载结果更新各个控件"""
+        ledgers, record_filter, first_page, count, periods = result
+        self.refresh_ledger_list(ledgers)
+        self.refresh_ledger_combobox(ledgers)
+        self.refresh_history(ledgers, first_page, record_filter)
+        self.refresh_history_status(count, periods)
     
-    def refresh_ledger_list(self):
+    def on_busy_changed(self, key, busy):
+        self.loading_label.setVisible(self.runner.is_busy())
+    
+    def on_load_error(self, error):
+        QMessageBox.critical(self, "错误", f"加载数据失败: {str(error)}")
+    
+    def refresh_ledger_list(self, ledgers):
         """刷新账本列表"""
         self.ledger_list_widget.clear()
-        ledgers = self.db.get_all_ledgers()
-        self.ledger_objects = ledgers  # 保存账本对象引用
+        self.ledger_objects = list(ledgers)  # 保存账本对象引用
         
         for ledger in ledgers:
             item_text = f"{ledger.name} - {ledger.description}"
             self.ledger_list_widget.addItem(item_text)
     
-    def refresh_ledger_combobox(self):
+    def refresh_ledger_combobox(self, ledgers):
         """刷新账本下拉框"""
         self.ledger_combobox.clear()
-        ledgers = self.db.get_all_ledgers()
-        self.ledger_combo_objects = ledgers  # 保存账本对象引用
+        self.ledger_combo_objects = list(ledgers)  # 保存账本对象引用
         
         for ledger in ledgers:
             self.ledger_combobox.addItem(ledger.name)
+        
+        # 筛选用的账本下拉框尽量保持原来的选择
+        selected = self.filter_ledger_combobox.currentData()
+        self.filter_ledger_combobox.blockSignals(True)
+        while self.filter_ledger_combobox.count() > 1:
+            self.filter_ledger_combobox.removeItem(1)
+        for ledger in ledgers:
+            self.filter_ledger_combobox.addItem(ledger.name, ledger.id)
+        self.filter_ledger_combobox.setCurrentIndex(max(self.filter_ledger_combobox.findData(selected), 0))
+        self.filter_ledger_combobox.blockSignals(False)
     
-    def refresh_history(self):
+    def refresh_history(self, ledgers, first_page=None, record_filter=None):
         """刷新历史记录"""
-        # 清空表格
-        self.history_table.setRowCount(0)
-        
-        # 获取所有记录
-        ledgers = {l.id: l.name for l in self.db.get_all_ledgers()}
-        records = self.db.get_all_records()
-        
-        # 按时间排序
-        records.sort(key=lambda x: x.created_at, reverse=True)
-        
-        # 填充数据
-        self.history_table.setRowCount(min(len(records), 50))  # 只显示最近50条记录
-        
-        for row, record in enumerate(records[:50]):
-            ledger_name = ledgers.get(record.ledger_id, "未知")
-            
-            self.history_table.setItem(row, 0, QTableWidgetItem(record.created_at.strftime("%Y-%m-%d %H:%M")))
-            self.history_table.setItem(row, 1, QTableWidgetItem(ledger_name))
-            self.history_table.setItem(row, 2, QTableWidgetItem(f"¥{record.amount:,.2f}"))
-            self.history_table.setItem(row, 3, QTableWidgetItem(record.period))
-            self.history_table.setItem(row, 4, QTableWidgetItem(record.note))
+        # 之后的页面由视图滚动到底部时调用 fetchMore 加载
+        self.history_model.reload({l.id: l.name for l in ledgers}, first_page, record_filter)
+    
+    def refresh_history_status(self, count, periods):
+        """更新记录条数和盘点周期下拉框"""
+        self.history_count_label.setText(f"共 {count} 条")
+        selected = self.filter_period_combobox.currentData()
+        self.filter_period_combobox.blockSignals(True)
+        while self.filter_period_combobox.count() > 1:
+            self.filter_period_combobox.removeItem(1)
+        for period in periods:
+            self.filter_period_combobox.addItem(period, period)
+        self.filter_period_combobox.setCurrentIndex(max(self.filter_period_combobox.findData(selected), 0))
+        self.filter_period_combobox.blockSignals(False)
+    
+    def current_filter(self):
+        """界面线程：根据筛选控件生成 RecordFilter"""
+        start = end = None
+        if self.filter_date_checkbox.isChecked():
+            start = datetime.combine(self.filter_start_date.date().toPython(), datetime.min.time())
+            # 结束日期当天的记录也包含在内
+            end = datetime.combine(self.filter_end_date.date().addDays(1).toPython(), datetime.min.time())
+        return RecordFilter(ledger_id=self.filter_ledger_combobox.currentData(),
+                            start=start, end=end,
+                            min_amount=self.parse_filter_amount(self.filter_min_amount),
+                            max_amount=self.parse_filter_amount(self.filter_max_amount),
+                            period=self.filter_period_combobox.currentData(),
+                            text=self.filter_text_input.text().strip())
+    
+    @staticmethod
+    def parse_filter_amount(amount_input):
+        try:
+            return float(amount_input.text().strip())
+        except ValueError:
+            return None  # 未填写或尚未输入完整时不按金额筛选
+    
+    def on_filter_changed(self, *args):
+        self.filter_start_date.setEnabled(self.filter_date_checkbox.isChecked())
+        self.filter_end_date.setEnabled(self.filter_date_checkbox.isChecked())
+        self.history_reload_timer.start(300)
+    
+    def clear_filter(self):
+        """清除所有筛选条件"""
+        for widget in (self.filter_ledger_combobox, self.filter_period_combobox, self.filter_date_checkbox,
+                       self.filter_min_amount, self.filter_max_amount, self.filter_text_input):
+            widget.blockSignals(True)
+        self.filter_ledger_combobox.setCurrentIndex(0)
+        self.filter_period_combobox.setCurrentIndex(0)
+        self.filter_date_checkbox.setChecked(False)
+        self.filter_min_amount.clear()
+        self.filter_max_amount.clear()
+        self.filter_text_input.clear()
+        for widget in (self.filter_ledger_combobox, self.filter_period_combobox, self.filter_date_checkbox,
+                       self.filter_min_amount, self.filter_max_amount, self.filter_text_input):
+            widget.blockSignals(False)
+        self.on_filter_changed()
+    
+    def reload_history(self):
+        """在后台按当前筛选条件重新读取第一页历史记录（账本名称沿用当前映射）"""
+        self.runner.submit("history", self.load_history_page, self.history_model.page_size,
+                           self.current_filter(),
+                           on_done=self.apply_history_page, on_error=self.on_load_error)
+    
+    @profiling.timed()
+    def load_history_page(self, token, page_size, record_filter):
+        """后台线程：读取第一页记录、符合条件的记录条数和所有盘点周期"""
+        first_page = list(self.db.iter_records(limit=page_size, record_filter=record_filter))
+        token.check()
+        count = self.db.count_records(record_filter)
+        token.check()
+        return record_filter, first_page, count, self.db.get_periods()
+    
+    @profiling.timed()
+    def apply_history_page(self, result):
+        record_filter, first_page, count, periods = result
+        self.history_model.reload(self.history_model.ledger_names, first_page, record_filter)
+        self.refresh_history_status(count, periods)
+    
+    def on_data_changed(self, event):
+        """根据变更事件局部更新控件"""
+        if event.kind == ChangeKind.LEDGER_CREATED:
+            ledger = event.ledger
+            self.ledger_objects.append(ledger)
+            self.ledger_list_widget.addItem(f"{ledger.name} - {ledger.description}")
+            self.ledger_combo_objects.append(ledger)
+            self.ledger_combobox.addItem(ledger.name)
+            self.filter_ledger_combobox.addItem(ledger.name, ledger.id)
+            self.history_model.ledger_names[ledger.id] = ledger.name
+        elif event.kind == ChangeKind.LEDGER_DELETED:
+            for ledger_id in event.ledger_ids:
+                for row, ledger in enumerate(self.ledger_objects):
+                    if ledger.id == ledger_id:
+                        del self.ledger_objects[row]
+                        self.ledger_list_widget.takeItem(row)
+                        break
+                for index, ledger in enumerate(self.ledger_combo_objects):
+                    if ledger.id == ledger_id:
+                        del self.ledger_combo_objects[index]
+                        self.ledger_combobox.removeItem(index)
+                        break
+                # 删除的正是筛选中的账本时，下拉框自动回到“全部账本”
+                index = self.filter_ledger_combobox.findData(ledger_id)
+                if index > 0:
+                    selected = self.filter_ledger_combobox.currentIndex() == index
+                    self.filter_ledger_combobox.blockSignals(True)
+                    self.filter_ledger_combobox.removeItem(index)
+                    if selected:
+                        self.filter_ledger_combobox.setCurrentIndex(0)
+                    self.filter_ledger_combobox.blockSignals(False)
+            self.history_reload_timer.start(100)
+        elif event.kind == ChangeKind.RECORDS_ADDED:
+            # 新记录可能插在任意时间位置，重新加载第一页即可
+            self.history_reload_timer.start(100)
     
     def add_ledger(self):
         """添加新账本"""
@@ -315,12 +816,9 @@ class AssetManagementPage(QWidget):
             self.db.create_ledger(ledger)
             QMessageBox.information(self, "成功", "账本创建成功")
             
-            # 清空输入框
+            # 清空输入框（列表由变更事件更新）
             self.ledger_name_input.clear()
             self.ledger_desc_input.clear()
-            
-            # 刷新数据
-            self.refresh_data()
         except Exception as e:
             QMessageBox.critical(self, "错误", f"创建账本失败: {str(e)}")
     
@@ -346,7 +844,6 @@ class AssetManagementPage(QWidget):
         try:
             self.db.delete_ledger(ledger.id)
             QMessageBox.information(self, "成功", "账本删除成功")
-            self.refresh_data()
         except Exception as e:
             QMessageBox.critical(self, "错误", f"删除账本失败: {str(e)}")
     
@@ -407,36 +904,155 @@ class AssetManagementPage(QWidget):
             self.db.add_asset_record(record)
             QMessageBox.information(self, "成功", "资产记录更新成功")
             
-            # 清空输入框
+            # 清空输入框（历史记录由变更事件更新）
             self.amount_input.clear()
             self.note_input.clear()
             self.period_input.clear()
-            
-            # 刷新数据
-            self.refresh_data()
         except Exception as e:
             QMessageBox.critical(self, "错误", f"更新资产记录失败: {str(e)}")
+    
+    def open_stocktake(self):
+        """在后台线程读取各账本的统计信息后打开批量盘点窗口"""
+        self.stocktake_btn.setEnabled(False)
+        self.runner.submit("stocktake", self.load_stocktake,
+                           on_done=self.show_stocktake, on_error=self.on_stocktake_error)
+    
+    def load_stocktake(self, token):
+        return self.db.get_ledger_summaries()
+    
+    def show_stocktake(self, summaries):
+        """打开批量盘点窗口，整次盘点只产生一个变更事件"""
+        self.stocktake_btn.setEnabled(True)
+        dialog = StocktakeDialog(self.db, summaries, self)
+        if dialog.exec() == QDialog.Accepted:
+            QMessageBox.information(self, "成功", "盘点记录保存成功")
+    
+    def on_stocktake_error(self, error):
+        self.stocktake_btn.setEnabled(True)
+        QMessageBox.critical(self, "错误", f"读取账本失败: {str(error)}")
+    
+    def import_records(self):
+        """从 CSV/XLSX 文件批量导入记录（在后台线程执行）"""
+        path, _ = QFileDialog.getOpenFileName(self, "导入记录", "", "表格文件 (*.csv *.xlsx)")
+        if not path:
+            return
+        self.runner.submit("import", self.run_import, path,
+                           on_done=self.on_import_done, on_error=self.on_import_error)
+    
+    def run_import(self, token, path):
+        import importer
+        return importer.import_file(self.db, path)
+    
+    def on_import_done(self, result):
+        message = f"读取 {result.rows} 行，导入 {result.inserted} 条，跳过重复 {result.duplicates} 条"
+        if result.ledgers_created:
+            message += f"\n新建账本: {', '.join(result.ledgers_created)}"
+        if result.error_count:
+            message += f"\n{result.error_count} 行无法识别:\n" + "\n".join(result.errors[:10])
+        QMessageBox.information(self, "导入完成", message)
+    
+    def on_import_error(self, error):
+        QMessageBox.critical(self, "错误", f"导入失败: {str(error)}")
+    
+    def backup_database(self):
+        """在后台线程创建数据库快照，期间可以继续记账"""
+        self.backup_btn.setEnabled(False)
+        self.backup_btn.setText("正在备份...")
+        self.runner.submit("backup", self.run_backup,
+                           on_done=self.on_backup_done, on_error=self.on_backup_error)
+    
+    def run_backup(self, token):
+        import backup
+        return backup.backup(self.db.db_path, token=token)
+    
+    def on_backup_done(self, result):
+        self.backup_btn.setEnabled(True)
+        self.backup_btn.setText("备份数据库")
+        message = f"已备份到 {result.path}（{result.size / 1e6:.1f} MB，用时 {result.elapsed:.1f} 秒）"
+        if result.removed:
+            message += f"\n已删除 {len(result.removed)} 份旧快照"
+        QMessageBox.information(self, "备份完成", message)
+    
+    def on_backup_error(self, error):
+        self.backup_btn.setEnabled(True)
+        self.backup_btn.setText("备份数据库")
+        QMessageBox.critical(self, "错误", f"备份失败: {str(error)}")
+
 
+class ChartView(QLabel):
+    """显示离屏渲染好的图表图像"""
+    resized = Signal()
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAlignment(Qt.AlignCenter)
+        self.setMinimumSize(300, 250)
+        self.image = None
+    
+    def render_size(self):
+        """需要渲染的物理像素尺寸"""
+        ratio = self.devicePixelRatioF()
+        return int(self.width() * ratio), int(self.height() * ratio), ratio
+    
+    def set_image(self, image, ratio):
+        self.image = image
+        pixmap = QPixmap.fromImage(image)
+        pixmap.setDevicePixelRatio(ratio)
+        self.setPixmap(pixmap)
+    
+    def show_message(self, text):
+        self.image = None
+        self.setText(text)
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.resized.emit()
 
 
 class AssetStatisticsPage(QWidget):
-    def __init__(self, db):
+    # 趋势图的显示方式：(名称, 重采样频率)，频率为 None 时显示各账本的全部原始记录
+    TREND_MODES = [("全部记录", None), ("按日", "day"), ("按月", "month"), ("按季度", "quarter"), ("按年", "year")]
+    
+    def __init__(self, db, events):
         super().__init__()
         self.db = db
+        self.summaries = None  # 尚未加载
+        self.trends = None  # List[analytics.LedgerSeries]，或按周期重采样时为 analytics.ResampledBalances
+        self.trend_freq = None
+        self.net_worth = None  # analytics.NetWorthCurve
+        self.loaded_version = None  # 已显示数据对应的 Database.data_version
+        # 离屏渲染结果按 (图表, 数据版本, 尺寸, 格式) 缓存，界面显示和导出共用
+        self.image_cache = QueryCache(capacity=32)
+        self.renderers = {}  # 图表名 -> charts.ChartRenderer，数据变化时原地更新图元
+        events.changed.connect(self.on_data_changed)
+        self.runner = TaskRunner(parent=self)
+        self.runner.busy_changed.connect(self.on_busy_changed)
+        # 窗口尺寸变化停止一段时间后再按新尺寸重新渲染
+        self.render_timer = QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.setInterval(200)
+        self.render_timer.timeout.connect(self.render_charts)
         self.init_ui()
-        self.refresh_statistics()
     
     def init_ui(self):
         layout = QVBoxLayout(self)
         layout.setSpacing(10)
         
         # 标题
+        title_layout = QHBoxLayout()
         title_label = QLabel("资产统计")
         title_font = QFont()
         title_font.setPointSize(16)
         title_font.setBold(True)
         title_label.setFont(title_font)
-        layout.addWidget(title_label)
+        title_layout.addWidget(title_label)
+        title_layout.addStretch()
+        
+        # 导出全部图表
+        self.export_btn = QPushButton("导出图表 (PNG/SVG)")
+        self.export_btn.clicked.connect(self.export_charts)
+        title_layout.addWidget(self.export_btn)
+        layout.addLayout(title_layout)
         
         # 总资产显示
         self.total_assets_label = QLabel("总资产: ¥0.00")
@@ -466,6 +1082,9 @@ class AssetStatisticsPage(QWidget):
         
         scroll_layout.addWidget(charts_frame)
         
+        # 总资产走势图区域
+        self.create_net_worth_chart_area(scroll_layout)
+        
         # 账本详情表格
         self.create_ledger_table_area(scroll_layout)
         
@@ -477,10 +1096,11 @@ class AssetStatisticsPage(QWidget):
         chart_group = QGroupBox("资产配置饼图")
         chart_layout = QVBoxLayout(chart_group)
     
-        # 创建matplotlib图形和画布
-        self.pie_fig = Figure(figsize=(6, 5), dpi=100)
-        self.pie_canvas = FigureCanvas(self.pie_fig)
-        chart_layout.addWidget(self.pie_canvas)
+        # 图表在后台线程渲染后显示
+        self.pie_view = ChartView()
+        self.pie_view.setMinimumHeight(500)
+        self.pie_view.resized.connect(self.render_timer.start)
+        chart_layout.addWidget(self.pie_view)
     
         parent_layout.addWidget(chart_group)
     
@@ -488,157 +1108,246 @@ class AssetStatisticsPage(QWidget):
         """创建折线图区域"""
         chart_group = QGroupBox("资产变化趋势")
         chart_layout = QVBoxLayout(chart_group)
+        
+        mode_layout = QHBoxLayout()
+        mode_layout.addWidget(QLabel("显示:"))
+        self.trend_mode_combobox = QComboBox()
+        for name, freq in self.TREND_MODES:
+            self.trend_mode_combobox.addItem(name, freq)
+        self.trend_mode_combobox.currentIndexChanged.connect(self.on_trend_mode_changed)
+        mode_layout.addWidget(self.trend_mode_combobox)
+        mode_layout.addStretch()
+        chart_layout.addLayout(mode_layout)
     
-        # 创建matplotlib图形和画布
-        self.line_fig = Figure(figsize=(8, 5), dpi=100)
-        self.line_canvas = FigureCanvas(self.line_fig)
-        chart_layout.addWidget(self.line_canvas)
+        # 趋势图需要缩放/平移，直接在界面线程中绘制；matplotlib 的 Qt 后端在创建本页面时才导入
+        from trend_view import TrendView
+        self.trend_view = TrendView()
+        self.trend_view.setMinimumHeight(500)
+        chart_layout.addWidget(self.trend_view)
     
         parent_layout.addWidget(chart_group)
     
+    def create_net_worth_chart_area(self, parent_layout):
+        """创建总资产走势图区域"""
+        chart_group = QGroupBox("总资产走势")
+        chart_layout = QVBoxLayout(chart_group)
+        
+        self.net_worth_view = ChartView()
+        self.net_worth_view.setMinimumHeight(350)
+        self.net_worth_view.resized.connect(self.render_timer.start)
+        chart_layout.addWidget(self.net_worth_view)
+        
+        parent_layout.addWidget(chart_group)
+    
     def create_ledger_table_area(self, parent_layout):
         """创建账本详情表格区域"""
         table_group = QGroupBox("账本详情")
         table_layout = QVBoxLayout(table_group)
         
         self.ledger_table = QTableWidget()
-        self.ledger_table.setColumnCount(3)
-        self.ledger_table.setHorizontalHeaderLabels(["账本", "金额", "占比"])
+        self.ledger_table.setColumnCount(7)
+        self.ledger_table.setHorizontalHeaderLabels(["账本", "金额", "占比", "上次金额", "变化", "记录数", "最后更新"])
         self.ledger_table.setEditTriggers(QTableWidget.NoEditTriggers)
         self.ledger_table.horizontalHeader().setStretchLastSection(True)
         table_layout.addWidget(self.ledger_table)
         
         parent_layout.addWidget(table_group)
     
-    def refresh_statistics(self):
-        """刷新统计信息"""
-        # 获取账本统计信息
+    def refresh_statistics(self, force=False):
+        """刷新统计信息（在后台线程查询数据库）；数据版本未变化时直接返回"""
+        if not force and self.loaded_version == self.db.data_version:
+            return
+        self.runner.submit("statistics", self.load_statistics, self.trend_freq, on_done=self.apply_statistics,
+                           on_error=self.on_load_error)
+    
+    def on_trend_mode_changed(self, index):
+        self.trend_freq = self.trend_mode_combobox.itemData(index)
+        self.refresh_statistics(force=True)
+    
+    def cancel_refresh(self):
+        """放弃尚未完成的加载和渲染（正在进行的导出继续执行）"""
+        self.runner.cancel("statistics")
+        self.runner.cancel("charts")
+    
+    def on_data_changed(self, event):
+        """页面可见时数据变化立即刷新，否则等下次切换到本页时再刷新"""
+        if self.isVisible():
+            self.refresh_statistics()
+    
+    @profiling.timed()
+    def load_statistics(self, token, freq):
+        """后台线程：读取统计数据"""
+        # 先记下版本号：加载期间若有写入，下次刷新时会因版本不同而重新加载
+        version = self.db.data_version
         summaries = self.db.get_ledger_summaries()
-        total_amount = sum(s.current_amount for s in summaries)
+        token.check()
+        if freq is None:
+            trends = self.db.get_ledger_series()
+        else:
+            trends = self.db.get_resampled_balances(freq)
+        token.check()
+        net_worth = self.db.get_net_worth_curve()
+        return version, summaries, trends, net_worth
+    
+    @profiling.timed()
+    def apply_statistics(self, result):
+        """界面线程：更新总资产与表格，并开始渲染图表"""
+        self.loaded_version, self.summaries, self.trends, self.net_worth = result
+        total_amount = sum(s.current_amount for s in self.summaries)
         
         # 更新总资产
         self.total_assets_label.setText(f"总资产: ¥{total_amount:,.2f}")
         
         # 更新表格
-        self.ledger_table.setRowCount(len(summaries))
-        for row, summary in enumerate(summaries):
+        self.ledger_table.setRowCount(len(self.summaries))
+        for row, summary in enumerate(self.summaries):
             self.ledger_table.setItem(row, 0, QTableWidgetItem(summary.ledger.name))
             self.ledger_table.setItem(row, 1, QTableWidgetItem(f"¥{summary.current_amount:,.2f}"))
             self.ledger_table.setItem(row, 2, QTableWidgetItem(f"{summary.percentage:.1f}%"))
-        
-        # 绘制饼图
-        self.draw_pie_chart(summaries)
-        
-        # 绘制折线图
-        self.draw_line_chart()
+            if summary.previous_amount is None:
+                self.ledger_table.setItem(row, 3, QTableWidgetItem("-"))
+                self.ledger_table.setItem(row, 4, QTableWidgetItem("-"))
+            else:
+                self.ledger_table.setItem(row, 3, QTableWidgetItem(f"¥{summary.previous_amount:,.2f}"))
+                delta_item = QTableWidgetItem(f"{summary.delta:+,.2f}")
+                if summary.delta:
+                    delta_item.setForeground(Qt.darkGreen if summary.delta > 0 else Qt.red)
+                self.ledger_table.setItem(row, 4, delta_item)
+            self.ledger_table.setItem(row, 5, QTableWidgetItem(str(summary.record_count)))
+            last_updated = summary.last_updated.strftime("%Y-%m-%d %H:%M") if summary.last_updated else "-"
+            self.ledger_table.setItem(row, 6, QTableWidgetItem(last_updated))
+        
+        self.plot_trends()
+        self.render_charts()
     
-    def draw_pie_chart(self, summaries):
-        """绘制资产配置饼图"""
-        # 清除之前的图形
-        self.pie_fig.clear()
+    @profiling.timed()
+    def plot_trends(self):
+        """在界面线程中绘制可交互的趋势图"""
+        import charts
+        name, _, data = self.trend_chart(self.trends, self.summaries)
+        self.trend_view.plot(getattr(charts, f"draw_{name}"), *data, update=getattr(charts, f"update_{name}"))
     
-        if not summaries:
-            ax = self.pie_fig.add_subplot(111)
-            ax.text(0.5, 0.5, "暂无数据", ha='center', va='center', transform=ax.transAxes)
-            self.pie_canvas.draw()
+    def render_charts(self):
+        """按图表控件当前尺寸在后台渲染饼图和总资产走势图"""
+        self.render_timer.stop()
+        if self.summaries is None:
             return
+        pie_size = self.pie_view.render_size()
+        net_worth_size = self.net_worth_view.render_size()
+        self.runner.submit("charts", self.draw_charts, self.loaded_version, self.summaries, self.net_worth,
+                           pie_size, net_worth_size, on_done=self.apply_charts, on_error=self.on_load_error)
     
-        # 计算总金额
-        total = sum(s.current_amount for s in summaries)
-        if total <= 0:
-            ax = self.pie_fig.add_subplot(111)
-            ax.text(0.5, 0.5, "暂无数据", ha='center', va='center', transform=ax.transAxes)
-            self.pie_canvas.draw()
-            return
+    @profiling.timed()
+    def draw_charts(self, token, version, summaries, net_worth, pie_size, net_worth_size):
+        """后台线程：离屏渲染图表"""
+        pie_image = self.render_image("pie_chart", version, pie_size, summaries)
+        token.check()
+        net_worth_image = self.render_image("net_worth_chart", version, net_worth_size, net_worth)
+        return (pie_image, pie_size[2]), (net_worth_image, net_worth_size[2])
     
-        # 创建子图
-        ax = self.pie_fig.add_subplot(111)
+    @profiling.timed()
+    def apply_charts(self, result):
+        for view, (image, ratio) in zip((self.pie_view, self.net_worth_view), result):
+            view.set_image(image, ratio)
     
-        # 准备数据
-        sizes = [s.current_amount for s in summaries]
-        labels = [s.ledger.name for s in summaries]
-    
-        # 颜色列表
-        colors = ["#FF6B6B", "#4ECDC4", "#45B7D1", "#96CEB4", "#FFEAA7", "#DDA0DD", "#98D8C8", 
-                  "#FF9F68", "#A8E6CF", "#FFACAC", "#B5EAD7", "#C7CEEA"]
-    
-        # 绘制饼图
-        wedges, texts, autotexts = ax.pie(sizes, labels=labels, autopct='%1.1f%%', 
-                                          colors=colors[:len(sizes)], startangle=90)
-    
-        # 设置标题
-        ax.set_title("资产配置分布")
+    def on_busy_changed(self, key, busy):
+        """显示加载状态"""
+        if key == "export":
+            self.export_btn.setEnabled(not busy)
+            return
+        if not busy:
+            return
+        if key == "statistics":
+            self.total_assets_label.setText("总资产: 加载中...")
+        for view in (self.pie_view, self.net_worth_view):
+            if view.image is None:
+                view.show_message("加载中...")
     
-        # 调整标签字体大小
-        for text in texts:
-            text.set_fontsize(8)
-        for autotext in autotexts:
-            autotext.set_fontsize(8)
+    def on_load_error(self, error):
+        QMessageBox.critical(self, "错误", f"加载统计数据失败: {str(error)}")
     
-        # 自动调整布局并刷新画布
-        self.pie_fig.tight_layout()
-        self.pie_canvas.draw()
+    def trend_chart(self, trends, summaries):
+        """趋势图的 (图表名, 缓存用的数据标识, 绘制参数)"""
+        names = {summary.ledger.id: summary.ledger.name for summary in summaries}
+        if isinstance(trends, list):
+            return "line_chart", None, (trends, names)
+        return "balance_chart", trends.freq, (trends, names)
     
-    def draw_line_chart(self):
-        """绘制资产变化趋势折线图"""
-        # 清除之前的图形
-        self.line_fig.clear()
+    def render_image(self, name, version, size, *data, variant=None):
+        """后台线程：离屏渲染 charts 中的 draw_<name> 并转换为 QImage（QImage 可以在非界面线程中创建）
+        
+        相同数据版本和尺寸的图像直接从缓存返回；数据变化后同一个图表原地更新图元再渲染。
+        """
+        width, height, ratio = size
+        key = (name, version, variant, width, height, ratio)
+        hit, image = self.image_cache.get(key)
+        if hit:
+            return image
+        
+        # charts 不在模块顶层导入，避免启动时加载 matplotlib
+        import charts
+        renderer = self.renderers.get(name)
+        if renderer is None:
+            renderer = self.renderers[name] = charts.ChartRenderer(getattr(charts, f"draw_{name}"),
+                                                                   getattr(charts, f"update_{name}", None))
+        generation = self.image_cache.generation
+        w, h, rgba = renderer.render(*data, width=width, height=height, dpi=100 * ratio)
+        image = QImage(rgba, w, h, QImage.Format_RGBA8888).copy()
+        self.image_cache.put(key, image, ["images"], generation)
+        return image
     
-        # 获取所有账本
-        ledgers = self.db.get_all_ledgers()
-        if not ledgers:
-            ax = self.line_fig.add_subplot(111)
-            ax.text(0.5, 0.5, "暂无数据", ha='center', va='center', transform=ax.transAxes)
-            self.line_canvas.draw()
+    def export_charts(self):
+        """把当前显示的各个图表导出为 PNG 和 SVG 文件"""
+        if self.summaries is None:
+            QMessageBox.warning(self, "警告", "统计数据尚未加载")
             return
+        directory = QFileDialog.getExistingDirectory(self, "导出图表")
+        if not directory:
+            return
+        
+        ratio = self.devicePixelRatioF()
+        trend_size = (int(self.trend_view.width() * ratio), int(self.trend_view.height() * ratio), ratio)
+        self.runner.submit("export", self.save_charts, directory, self.loaded_version, self.summaries,
+                           self.trends, self.net_worth, self.pie_view.render_size(), trend_size,
+                           self.net_worth_view.render_size(),
+                           on_done=self.on_export_done, on_error=self.on_export_error)
     
-        # 创建子图
-        ax = self.line_fig.add_subplot(111)
+    @profiling.timed()
+    def save_charts(self, token, directory, version, summaries, trends, net_worth, pie_size, trend_size,
+                    net_worth_size):
+        """后台线程：导出图表，返回写入的文件路径
+        
+        PNG 直接使用（或写入）界面显示用的图像缓存；SVG 同样按数据版本缓存，数据未变时重复导出不再渲染。
+        """
+        import charts
+        trend_name, variant, trend_data = self.trend_chart(trends, summaries)
+        items = [("pie_chart", None, pie_size, (summaries,)),
+                 (trend_name, variant, trend_size, trend_data),
+                 ("net_worth_chart", None, net_worth_size, (net_worth,))]
+        paths = []
+        for name, variant, size, data in items:
+            token.check()
+            path = os.path.join(directory, f"{name}.png")
+            if not self.render_image(name, version, size, *data, variant=variant).save(path, "PNG"):
+                raise OSError(f"无法写入文件: {path}")
+            paths.append(path)
+            
+            width, height, ratio = size
+            key = (name, version, variant, width, height, ratio, "svg")
+            hit, svg = self.image_cache.get(key)
+            if not hit:
+                generation = self.image_cache.generation
+                svg = charts.render_bytes(getattr(charts, f"draw_{name}"), *data, width=width, height=height,
+                                          dpi=100 * ratio, fmt="svg")
+                self.image_cache.put(key, svg, ["images"], generation)
+            path = os.path.join(directory, f"{name}.svg")
+            with open(path, "wb") as f:
+                f.write(svg)
+            paths.append(path)
+        return paths
     
-        # 颜色列表
-        colors = ["#FF6B6B", "#4ECDC4", "#45B7D1", "#96CEB4", "#FFEAA7", "#DDA0DD", "#98D8C8", 
-                  "#FF9F68", "#A8E6CF", "#FFACAC", "#B5EAD7", "#C7CEEA"]
+    def on_export_done(self, paths):
+        QMessageBox.information(self, "导出完成", "已导出:\n" + "\n".join(paths))
     
-        # 为每个账本获取历史数据并绘制折线
-        for i, ledger in enumerate(ledgers):
-            records = self.db.get_ledger_history(ledger.id)
-            if not records:
-                continue
-        
-            # 按时间排序
-            records.sort(key=lambda x: x.created_at)
-
-            # 只取最近的8条记录
-            records = records[:8]
-        
-            # 准备数据
-            x_data = []
-            y_data = []
-        
-            for record in records:
-                # 使用 period 字段作为横坐标，如果为空则使用 created_at
-                if record.period and record.period.strip():
-                    x_data.append(record.period)
-                else:
-                    x_data.append(record.created_at.strftime("%Y-%m-%d"))
-                y_data.append(record.amount)
-        
-            # 绘制折线
-            color = colors[i % len(colors)]
-            ax.plot(x_data, y_data, marker='o', linewidth=2, label=ledger.name, color=color)
-    
-        # 设置图形属性
-        ax.set_xlabel("周期/日期")
-        ax.set_ylabel("金额 (¥)")
-        ax.set_title("资产变化趋势")
-        ax.legend(fontsize=8)
-        ax.grid(True, alpha=0.3)
-    
-        # 旋转x轴标签以避免重叠
-        for label in ax.get_xticklabels():
-            label.set_rotation(45)
-            label.set_ha('right')
-    
-        # 自动调整布局并刷新画布
-        self.line_fig.tight_layout()
-        self.line_canvas.draw()
\ No newline at end of file
+    def on_export_error(self, error):
+        QMessageBox.critical(self, "错误", f"导出图表失败: {str(error)}")
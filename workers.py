@@ -0,0 +1,175 @@
+# workers.py
+"""后台任务执行
+
+在线程池中执行数据库查询和离屏绘图，结果通过信号回到界面线程，避免界面卡顿。
+同一个 key 的请求会被合并：任务运行期间再次提交时，当前结果作废，
+只在它结束后执行最新的一次请求。
+"""
+import threading
+import time
+import traceback
+from typing import Callable, Dict, Optional
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal, Slot
+
+import profiling
+
+
+class TaskCancelled(Exception):
+    """任务已被取消"""
+
+
+class CancelToken:
+    """取消标记，任务函数可在耗时步骤之间调用 check() 提前结束"""
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise TaskCancelled()
+
+
+class _Job:
+    """一次提交的任务"""
+    def __init__(self, key, fn, args, on_done, on_error):
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.on_done = on_done
+        self.on_error = on_error
+        self.token = CancelToken()
+        self.submitted = time.perf_counter()
+
+
+class _JobSignals(QObject):
+    finished = Signal(object, object, object)  # (job, result, error)
+
+
+class _JobRunnable(QRunnable):
+    def __init__(self, job: _Job, signals: _JobSignals):
+        super().__init__()
+        self.job = job
+        self.signals = signals
+
+    def run(self):
+        result = error = None
+        try:
+            self.job.token.check()
+            result = self.job.fn(self.job.token, *self.job.args)
+        except BaseException as e:
+            error = e
+        self.signals.finished.emit(self.job, result, error)
+
+
+class TaskRunner(QObject):
+    """按 key 合并请求的后台任务执行器
+
+    任务函数的第一个参数是 CancelToken，on_done/on_error 回调在界面线程中执行，
+    已取消或已被更新请求取代的任务不会触发回调。
+    """
+    busy_changed = Signal(str, bool)  # (key, 是否有任务在执行)
+
+    def __init__(self, max_threads: Optional[int] = None, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        if max_threads:
+            self.pool.setMaxThreadCount(max_threads)
+        self._running: Dict[str, _Job] = {}
+        self._pending: Dict[str, _Job] = {}
+        self._signals = _JobSignals()
+        self._signals.finished.connect(self._on_finished)
+
+    def submit(self, key: str, fn: Callable, *args,
+               on_done: Optional[Callable] = None,
+               on_error: Optional[Callable] = None) -> CancelToken:
+        """提交任务，返回其取消标记"""
+        job = _Job(key, fn, args, on_done, on_error)
+        if key in self._running:
+            # 运行中的结果已过时，等它结束后执行最新请求
+            self._running[key].token.cancel()
+            previous = self._pending.pop(key, None)
+            if previous is not None:
+                previous.token.cancel()
+            self._pending[key] = job
+        else:
+            self._start(job)
+        return job.token
+
+    def cancel(self, key: str):
+        """取消指定 key 的运行中和排队中的任务"""
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            pending.token.cancel()
+        running = self._running.get(key)
+        if running is not None:
+            running.token.cancel()
+
+    def cancel_all(self):
+        for key in list(self._pending) + list(self._running):
+            self.cancel(key)
+
+    def is_busy(self, key: Optional[str] = None) -> bool:
+        if key is None:
+            return bool(self._running)
+        return key in self._running
+
+    def shutdown(self):
+        """取消所有任务并等待线程结束"""
+        self.cancel_all()
+        self.pool.waitForDone()
+
+    def _start(self, job: _Job):
+        self._running[job.key] = job
+        self.pool.start(_JobRunnable(job, self._signals))
+        self.busy_changed.emit(job.key, True)
+
+    @Slot(object, object, object)
+    def _on_finished(self, job: _Job, result, error):
+        if self._running.get(job.key) is job:
+            del self._running[job.key]
+        pending = self._pending.pop(job.key, None)
+        if pending is not None:
+            self._start(pending)
+        elif job.key not in self._running:
+            self.busy_changed.emit(job.key, False)
+
+        if job.token.cancelled or isinstance(error, TaskCancelled):
+            return
+        if error is not None:
+            if job.on_error is not None:
+                job.on_error(error)
+            else:
+                traceback.print_exception(type(error), error, error.__traceback__)
+            return
+        if job.on_done is not None:
+            job.on_done(result)
+        if profiling.PROFILER.enabled:
+            # 从提交到结果应用到界面的总耗时，包括排队等待和 on_done
+            profiling.PROFILER.record("stages", f"TaskRunner:{job.fn.__qualname__}",
+                                      time.perf_counter() - job.submitted)
+
+
+class DatabaseEvents(QObject):
+    """把 Database 的变更事件转为 Qt 信号
+
+    事件可能在后台线程中发布（例如批量导入），信号会被排队送到接收者所在的界面线程。
+    """
+    changed = Signal(object)  # ChangeEvent
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        db.subscribe(self._forward)
+
+    def _forward(self, event):
+        self.changed.emit(event)
+
+    def detach(self):
+        self.db.unsubscribe(self._forward)